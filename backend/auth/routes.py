@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Security, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 
 from sqlalchemy import func
 
-from sqlmodel import Session, create_engine, select
+from sqlmodel import Session, select
 import os
 from dotenv import load_dotenv
-import shutil
+from pathlib import Path
 
 from auth import utils, schemas
 from auth.schemas import TokenOut, UserOut, UserListOut, ProfilePictureOut, UserUpdateRequest, PublicUserRegister
 from auth.models import User as DBUser, Role
+from common.db import get_session
+from common.pagination import decode_cursor, encode_cursor, apply_keyset, trim_page, page_flags
+from common.uploads import save_upload
+from receipt.versioning import bump_receipts_version
 from app_logging import get_logger
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -19,16 +24,11 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 logger = get_logger(__name__)
 
 load_dotenv()
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
-engine = create_engine(DATABASE_URL)
 
 PROFILE_PIC_DIR = "profile_pics"
+PROFILE_PICTURE_MAX_BYTES = int(os.getenv("PROFILE_PICTURE_MAX_BYTES", str(5 * 1024 * 1024)))  # 5MB
 os.makedirs(PROFILE_PIC_DIR, exist_ok=True)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
-
 def authenticate_user(session: Session, username: str, password: str):
     logger.debug(f"Authenticating user: {username}")
     user = utils.get_user_by_username(session, username)
@@ -254,10 +254,13 @@ def list_users(
     username: str = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=1000),
+    cursor: str = Query(None, description="Lapozási cursor (next_cursor / prev_cursor); megadása esetén a skip figyelmen kívül marad"),
     current_user: DBUser = Depends(require_roles(["admin"]))
 ):
     logger.info(f"User list request by admin: {current_user.username}")
-    logger.debug(f"List users parameters: username_filter={username}, skip={skip}, limit={limit}")
+    logger.debug(f"List users parameters: username_filter={username}, skip={skip}, limit={limit}, cursor={cursor}")
+    
+    page_cursor = decode_cursor(cursor, "id", "asc", int) if cursor else None
     
     logger.debug("Getting total user count")
     total = session.exec(select(func.count()).select_from(DBUser)).one()
@@ -269,12 +272,17 @@ def list_users(
         statement = statement.where(DBUser.username.ilike(f"%{username}%"))
     
     logger.debug(f"Applying pagination: skip={skip}, limit={limit}")
-    statement = statement.offset(skip).limit(limit)
+    statement = apply_keyset(statement, DBUser.id, DBUser.id, False, page_cursor)
+    if page_cursor is None:
+        statement = statement.offset(skip)
+    statement = statement.limit(limit + 1)
     
     logger.debug("Executing user query")
-    users = session.exec(statement).all()
+    users, has_more = trim_page(session.exec(statement).all(), limit, page_cursor)
     logger.debug(f"Retrieved {len(users)} users")
     
+    has_next, has_previous = page_flags(has_more, page_cursor, skip)
+    
     result = UserListOut(
         users=[UserOut(
             id=u.id or 0,
@@ -287,14 +295,23 @@ def list_users(
         ) for u in users],
         skip=skip,
         page_size=limit,
-        total=total
+        total=total,
+        next_cursor=encode_cursor("id", "asc", users[-1].id, users[-1].id or 0) if users and has_next else None,
+        prev_cursor=encode_cursor("id", "asc", users[0].id, users[0].id or 0, backwards=True) if users and has_previous else None
     )
     
     logger.info(f"User list request completed - returned {len(result.users)} users")
     return result
 
+def _save_profile_picture(session: Session, user: DBUser, file_path: str):
+    user.profile_picture = file_path
+    session.add(user)
+    # A user adatai a blokk listában is szerepelnek, így a feltételes GET-ek ETag-je is változik
+    bump_receipts_version(session, user.id)
+    session.commit()
+
 @router.post("/profile-picture", response_model=ProfilePictureOut)
-def upload_profile_picture(
+async def upload_profile_picture(
     file: UploadFile = File(...),
     current_user: DBUser = Depends(get_current_user),
     session: Session = Depends(get_session)
@@ -302,26 +319,26 @@ def upload_profile_picture(
     logger.info(f"Profile picture upload request from user: {current_user.username}")
     logger.debug(f"Upload details: filename={file.filename}, content_type={file.content_type}, size={file.size}")
     
-    filename = f"{current_user.id}_{file.filename}"
-    file_path = os.path.join(PROFILE_PIC_DIR, filename)
-    logger.debug(f"Saving file to: {file_path}")
+    # A kiterjesztést a tartalom alapján a feltöltő helper adja hozzá
+    filename_stem = f"{current_user.id}_{Path(file.filename or 'profile').stem}"
+    logger.debug(f"Saving file to: {PROFILE_PIC_DIR}/{filename_stem}")
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        upload = await save_upload(file, PROFILE_PIC_DIR, filename_stem, max_bytes=PROFILE_PICTURE_MAX_BYTES)
+        file_path = upload.path
         logger.debug(f"File saved successfully: {file_path}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to save profile picture: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save profile picture")
     
-    # Update user profile_picture
-    logger.debug(f"Updating user profile picture in database: {current_user.username}")
-    current_user.profile_picture = file_path
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
+    # Update user profile_picture (a szinkron DB munka worker szálon, nem az event loopon)
+    username = current_user.username
+    logger.debug(f"Updating user profile picture in database: {username}")
+    await run_in_threadpool(_save_profile_picture, session, current_user, file_path)
     
-    logger.info(f"Profile picture upload successful for user: {current_user.username}")
+    logger.info(f"Profile picture upload successful for user: {username}")
     return ProfilePictureOut(profile_picture=file_path)
 
 @router.get("/me", response_model=UserOut)
@@ -422,6 +439,7 @@ def update_user(
     
     logger.debug("Saving user updates to database")
     session.add(user_to_update)
+    bump_receipts_version(session, user_id)
     session.commit()
     session.refresh(user_to_update)
     
@@ -56,6 +56,8 @@ class UserListOut(BaseModel):
     skip: int
     page_size: int
     total: int
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
 
 class ProfilePictureOut(BaseModel):
     profile_picture: str 
\ No newline at end of file
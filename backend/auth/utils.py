@@ -12,7 +12,7 @@ from datetime import timezone
 load_dotenv()
 
 # Load RSA keys
-KEYS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "keys")
+KEYS_DIR = os.getenv("JWT_KEYS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "keys"))
 PRIVATE_KEY_PATH = os.path.join(KEYS_DIR, "private_key.pem")
 PUBLIC_KEY_PATH = os.path.join(KEYS_DIR, "public_key.pem")
 
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tárolt összegek feltöltése
+
+SQL-ben újraszámolja a receipt.total és receiptitem.line_total értékeket (pl. kézi
+adatjavítás után). Az oszlopokat és az indexeiket a 0001-es migráció hozza létre és
+tölti fel először: meglévő adatbázison előbb `alembic upgrade head` (vagy init_db.py).
+Többször is futtatható.
+
+Használat:
+    python backfill_totals.py [DATABASE_URL]
+"""
+
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import inspect
+from sqlmodel import Session, create_engine
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from auth.models import User  # noqa: F401 - a Receipt.user kapcsolathoz
+from receipt.models import Receipt, ReceiptItem
+from receipt.utils import backfill_totals
+
+
+def main():
+    # Ha van parancssori argumentum, azt használja DATABASE_URL-ként
+    if len(sys.argv) > 1:
+        DATABASE_URL = sys.argv[1]
+        print(f"Database URL használata: {DATABASE_URL}")
+    else:
+        load_dotenv()
+        DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+        print(f"Database URL .env-ből: {DATABASE_URL}")
+
+    engine = create_engine(DATABASE_URL)
+
+    # A séma a migrációk dolga; hiányzó oszlopnál nem írunk DDL-t
+    for table, column_name in ((ReceiptItem.__table__, "line_total"), (Receipt.__table__, "total")):
+        if column_name not in {column["name"] for column in inspect(engine).get_columns(table.name)}:
+            print(f"Hiányzó oszlop: {table.name}.{column_name} - futtasd előbb: alembic upgrade head")
+            sys.exit(1)
+
+    with Session(engine) as session:
+        updated = backfill_totals(session)
+        session.commit()
+    print(f"Összegek újraszámolva: {updated} blokk")
+
+
+if __name__ == "__main__":
+    main()
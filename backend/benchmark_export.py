@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark a blokk exporthoz
+
+Ideiglenes SQLite adatbázisba (vagy a megadott DATABASE_URL-re) generált tételeken
+összeméri az export formátumokat (csv, ndjson, parquet, arrow): futásidő és fájlméret.
+A parquet / arrow formátumokhoz a pyarrow csomag szükséges, nélküle kimaradnak.
+
+Használat:
+    python benchmark_export.py [tételek száma] [DATABASE_URL]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Az export a common.db engine-jét használja, ezért az URL-t az importok előtt állítjuk be
+if len(sys.argv) > 2:
+    os.environ["DATABASE_URL"] = sys.argv[2]
+else:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark_export.db"
+
+from fastapi import HTTPException
+from sqlmodel import Session, SQLModel, select, func
+
+from auth.models import User, Role, RoleEnum
+from common.db import engine
+from receipt.export import export_query, export_stream, require_pyarrow
+from receipt.models import Market, Receipt, ReceiptItem
+
+FORMATS = ["ndjson", "csv", "parquet", "arrow"]
+ITEM_NAMES = ["Tej 2,8% 1l", "Kenyér fehér", "Trappista sajt", "Alma Jonagold", "Banán", "Vaj 82%",
+              "Joghurt natúr", "Kolbász", "Paprika", "Csokoládé", "Ásványvíz", "Kávé őrölt"]
+
+
+def populate(item_count: int) -> int:
+    """Pontosan item_count tételig tölti fel a benchmark felhasználó blokkjait; egy korábbi futás adatait újrahasználja."""
+    random.seed(42)
+    items_per_receipt = 10
+    receipts_per_batch = 5000
+    with Session(engine) as session:
+        admin = session.exec(select(User).where(User.username == "benchmark")).first()
+        if admin is None:
+            admin_role = session.exec(select(Role).where(Role.name == RoleEnum.admin)).first() or Role(name=RoleEnum.admin)
+            admin = User(username="benchmark", hashed_password="-", roles=[admin_role])
+            session.add(admin)
+        market = session.exec(select(Market).where(Market.tax_number == "00000000")).first()
+        if market is None:
+            market = Market(name="Benchmark Market", tax_number="00000000")
+            session.add(market)
+        session.flush()
+
+        existing_items = session.exec(
+            select(func.count()).select_from(ReceiptItem).join(Receipt).where(Receipt.user_id == admin.id)
+        ).one()
+        receipt_offset = session.exec(select(func.count()).select_from(Receipt).where(Receipt.user_id == admin.id)).one()
+        remaining = item_count - existing_items
+        if remaining < 0:
+            print(f"Figyelem: a benchmark felhasználónak már {existing_items} tétele van, az export mindet tartalmazza")
+        while remaining > 0:
+            # Az utolsó köteg (és benne az utolsó blokk) csak a még hiányzó tételeket kapja
+            item_counts = []
+            while remaining > 0 and len(item_counts) < receipts_per_batch:
+                item_counts.append(min(items_per_receipt, remaining))
+                remaining -= item_counts[-1]
+            receipts = [
+                Receipt(
+                    date=datetime(2024, 1, 1) + timedelta(minutes=receipt_offset + i),
+                    receipt_number=f"benchmark-{receipt_offset + i}", market_id=market.id, user_id=admin.id,
+                    image_path="-", original_filename="-", postal_code="1111", city="Budapest",
+                    street_name="Fő utca", street_number="1", total=0.0
+                )
+                for i in range(len(item_counts))
+            ]
+            receipt_offset += len(receipts)
+            session.add_all(receipts)
+            session.flush()
+            session.bulk_insert_mappings(ReceiptItem, [
+                {
+                    "name": random.choice(ITEM_NAMES),
+                    "unit_price": round(random.uniform(100, 5000), 0),
+                    "quantity": float(random.randint(1, 3)),
+                    "unit": "db",
+                    "line_total": 0.0,
+                    "receipt_id": receipt.id
+                }
+                for receipt, count in zip(receipts, item_counts)
+                for _ in range(count)
+            ])
+        session.commit()
+        return admin.id
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    print(f"Database URL: {engine.url}")
+    SQLModel.metadata.create_all(engine)
+
+    start = time.perf_counter()
+    admin_id = populate(item_count)
+    print(f"Adatok előkészítve: {time.perf_counter() - start:.1f} s")
+
+    with Session(engine) as session:
+        query = export_query(session, session.get(User, admin_id))
+
+    print(f"{'format':<10} {'seconds':>8} {'MB':>8} {'vs ndjson':>10}")
+    baseline = None
+    for export_format in FORMATS:
+        if export_format in ("parquet", "arrow"):
+            try:
+                require_pyarrow()
+            except HTTPException:
+                print(f"{export_format:<10} kimarad (nincs pyarrow)")
+                continue
+        start = time.perf_counter()
+        size = sum(len(chunk) for chunk in export_stream(query, export_format))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or (elapsed, size)
+        print(f"{export_format:<10} {elapsed:>8.1f} {size / 1e6:>8.1f} "
+              f"{elapsed / baseline[0]:>4.2f}x {size / baseline[1]:>4.2f}x")
+
+
+if __name__ == "__main__":
+    main()
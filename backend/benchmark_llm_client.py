@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark az LLM kliens registryhez
+
+Egy helyi, OpenAI-kompatibilis stub szervert indít, és összeméri a hívásonkénti
+overheadet, ha minden híváshoz új ChatOpenAI (és új HTTP kliens) készül, illetve
+ha a közös, keep-alive kapcsolatokat használó registry példányát használjuk.
+
+Használat:
+    python benchmark_llm_client.py [hívások száma]
+"""
+
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from common import ai
+
+RESPONSE = json.dumps({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        # Nagle kikapcsolása, különben a delayed ACK 40ms-os késleltetése elfedné a mérést
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def measure(label: str, call, count: int):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} avg={statistics.mean(timings):7.2f} ms  median={statistics.median(timings):7.2f} ms")
+
+
+async def measure_async(label: str, get_model, count: int):
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await get_model().ainvoke([HumanMessage(content="ping")])
+        timings.append((time.perf_counter() - start) * 1000)
+    print(f"{label:<28} avg={statistics.mean(timings):7.2f} ms  median={statistics.median(timings):7.2f} ms")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    base_url = start_stub_server()
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("AI_MODEL", "stub")
+    os.environ["OPENAI_API_KEY"] = "stub"
+    message = [HumanMessage(content="ping")]
+
+    def fresh_model():
+        return ChatOpenAI(model="stub", api_key="stub", base_url=base_url, temperature=0)
+
+    print(f"=== LLM client benchmark: {count} calls against {base_url} ===\n")
+    measure("sync, new client per call", lambda: fresh_model().invoke(message), count)
+    measure("sync, pooled registry", lambda: ai.get_llm_model().invoke(message), count)
+    asyncio.run(measure_async("async, new client per call", fresh_model, count))
+    asyncio.run(measure_async("async, pooled registry", ai.get_llm_model, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark a blokk képek előfeldolgozásához
+
+Minden preset-re megméri, hány bájt kerülne elküldésre a modellnek (base64 után)
+és mennyi ideig tart az előfeldolgozás. --llm kapcsolóval a teljes felismerési
+késleltetést is összeméri előfeldolgozás nélkül és a beállított presettel.
+
+Használat:
+    python benchmark_preprocess.py [fixture könyvtár] [--llm]
+"""
+
+import base64
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+load_dotenv()
+
+from receipt.ai import agent, preprocess
+from receipt.ai.preprocess import PRESETS, preprocess_image
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def load_fixtures(directory: str) -> list[tuple[str, bytes]]:
+    # A képtár beágyazott (hash prefix szerinti) könyvtárakból áll; a kicsinyített változatok kimaradnak
+    paths = sorted(
+        p for p in Path(directory).rglob("*")
+        if p.suffix.lower() in IMAGE_SUFFIXES and "variants" not in p.relative_to(directory).parts
+    )
+    return [(str(p), p.read_bytes()) for p in paths]
+
+
+def payload_size(image_bytes: bytes) -> int:
+    return len(base64.b64encode(image_bytes))
+
+
+def benchmark_presets(fixtures: list[tuple[str, bytes]]):
+    original = sum(payload_size(data) for _, data in fixtures)
+    print(f"{'preset':<10} {'payload bytes':>15} {'ratio':>8} {'avg ms':>8} {'p95 ms':>8}")
+    print(f"{'off':<10} {original:>15,} {1.0:>8.2f} {0.0:>8.1f} {0.0:>8.1f}")
+
+    for name, preset in PRESETS.items():
+        total = 0
+        timings = []
+        for _, data in fixtures:
+            start = time.perf_counter()
+            processed = preprocess_image(data, preset)
+            timings.append((time.perf_counter() - start) * 1000)
+            total += payload_size(processed if processed is not None else data)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        print(f"{name:<10} {total:>15,} {total / original:>8.2f} {statistics.mean(timings):>8.1f} {p95:>8.1f}")
+
+
+def benchmark_llm(fixtures: list[tuple[str, bytes]]):
+    print("\nEnd-to-end recognition latency (calls the configured model)")
+    for label, preset_name in (("before", "off"), ("after", preprocess.PREPROCESS_PRESET)):
+        preprocess.PREPROCESS_PRESET = preset_name
+        timings = []
+        for path, _ in fixtures:
+            start = time.perf_counter()
+            agent.recognize_receipt(path)
+            timings.append(time.perf_counter() - start)
+        print(f"{label:<7} preset={preset_name:<9} avg={statistics.mean(timings):.2f}s max={max(timings):.2f}s")
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    directory = args[0] if args else "receipt_images"
+    fixtures = load_fixtures(directory)
+    if not fixtures:
+        print(f"No images found in: {directory}")
+        sys.exit(1)
+
+    print(f"=== Preprocess benchmark: {len(fixtures)} images from {directory} ===\n")
+    benchmark_presets(fixtures)
+    if "--llm" in sys.argv:
+        benchmark_llm(fixtures)
+
+
+if __name__ == "__main__":
+    main()
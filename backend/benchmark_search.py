@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark a tétel- és boltnév szerinti tartalmazó kereséshez
+
+Ideiglenes SQLite adatbázisba (vagy a megadott DATABASE_URL-re) generált tételeken
+összeméri a sima ILIKE '%x%' szűrést a keresőindexes (receipt.search) változattal.
+
+Használat:
+    python benchmark_search.py [tételek száma] [DATABASE_URL]
+"""
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlmodel import Session, SQLModel, create_engine, select, func
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from auth.models import User  # noqa: F401 - a Receipt.user kapcsolathoz
+from init_db import run_migrations
+from receipt.models import Market, Receipt, ReceiptItem
+from receipt.search import ensure_search_indexes, receipt_ids_with_item_name
+
+WORDS = ["tej", "kenyér", "sajt", "alma", "banán", "vaj", "joghurt", "kolbász", "paprika", "csoki",
+         "üdítő", "kávé", "tea", "rizs", "liszt", "cukor", "tojás", "sonka", "paradicsom", "uborka"]
+TERMS = ["sajt", "ghur", "SAJT", "paprika", "nincs-ilyen"]
+REPEATS = 5
+
+
+def populate(engine, item_count: int):
+    random.seed(42)
+    with Session(engine) as session:
+        if session.exec(select(func.count()).select_from(ReceiptItem)).one() >= item_count:
+            return
+        user = User(username="benchmark", hashed_password="-")
+        market = Market(name="Benchmark Market", tax_number="00000000")
+        session.add(user)
+        session.add(market)
+        session.flush()
+        receipts_per_batch = 1000
+        items_per_receipt = 10
+        for _ in range(item_count // (receipts_per_batch * items_per_receipt) or 1):
+            receipts = [
+                Receipt(
+                    date=datetime(2024, 1, 1), receipt_number=str(i), market_id=market.id, user_id=user.id,
+                    image_path="-", original_filename="-", postal_code="-", city="-",
+                    street_name="-", street_number="-"
+                )
+                for i in range(receipts_per_batch)
+            ]
+            session.add_all(receipts)
+            session.flush()
+            session.bulk_insert_mappings(ReceiptItem, [
+                {
+                    "name": f"{random.choice(WORDS)} {random.choice(WORDS)} {random.randint(1, 999)}",
+                    "unit_price": 100.0,
+                    "quantity": 1.0,
+                    "unit": "db",
+                    "line_total": 100.0,
+                    "receipt_id": receipt.id
+                }
+                for receipt in receipts
+                for _ in range(items_per_receipt)
+            ])
+        session.commit()
+
+
+def measure(session: Session, query) -> tuple[int, list[float]]:
+    timings = []
+    count = 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        count = session.exec(query).one()
+        timings.append((time.perf_counter() - start) * 1000)
+    return count, timings
+
+
+def main():
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    if len(sys.argv) > 2:
+        database_url = sys.argv[2]
+    else:
+        database_url = f"sqlite:///{tempfile.mkdtemp()}/benchmark_search.db"
+    print(f"Database URL: {database_url}")
+
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    # Postgresen a trigram indexeket a migrációk építik
+    run_migrations(database_url)
+    ensure_search_indexes(engine)
+
+    start = time.perf_counter()
+    populate(engine, item_count)
+    print(f"Adatok előkészítve: {time.perf_counter() - start:.1f} s")
+
+    print(f"{'term':<14} {'matches':>8} {'ilike ms':>10} {'index ms':>10} {'speedup':>8}")
+    with Session(engine) as session:
+        for term in TERMS:
+            ilike = select(func.count(func.distinct(ReceiptItem.receipt_id))).where(
+                ReceiptItem.name.ilike(f"%{term}%")
+            )
+            indexed = select(func.count()).select_from(
+                receipt_ids_with_item_name(session, term).distinct().subquery()
+            )
+            ilike_count, ilike_timings = measure(session, ilike)
+            indexed_count, indexed_timings = measure(session, indexed)
+            if ilike_count != indexed_count:
+                print(f"  Eltérő találatszám: ilike={ilike_count} index={indexed_count}")
+            ilike_ms = statistics.median(ilike_timings)
+            indexed_ms = statistics.median(indexed_timings)
+            print(f"{term:<14} {indexed_count:>8} {ilike_ms:>10.1f} {indexed_ms:>10.1f} "
+                  f"{ilike_ms / max(indexed_ms, 0.001):>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark a blokk lista válasz szerializálásához
+
+Memóriában felépített (adatbázis nélküli) blokkokon összeméri a régi útvonalat
+(ReceiptOut Pydantic modellek, majd a FastAPI response_model validálás és json.dumps)
+az újjal (sima dict-ek a receipt_out_dict-ből, orjson kódolás).
+
+Használat:
+    python benchmark_serialization.py [blokkok száma] [tételek száma blokkonként]
+"""
+
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import orjson
+from pydantic import TypeAdapter
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from auth.models import User, Role, RoleEnum
+from receipt.models import Market, Receipt, ReceiptItem
+from receipt.schemas import ReceiptListOut
+from receipt.utils import build_receipt_out, receipt_out_dict
+
+REPEATS = 50
+
+
+def build_rows(receipt_count: int, item_count: int):
+    user = User(id=1, username="benchmark", hashed_password="-", fullname="Bench Mark", roles=[Role(name=RoleEnum.user)])
+    market = Market(id=1, name="Benchmark Market", tax_number="00000000")
+    rows = []
+    for receipt_id in range(1, receipt_count + 1):
+        items = [
+            ReceiptItem(
+                id=receipt_id * 1000 + i, name=f"Tétel {i}", unit_price=199.9, quantity=1.5, unit="db",
+                line_total=299.85, receipt_id=receipt_id
+            )
+            for i in range(item_count)
+        ]
+        receipt = Receipt(
+            id=receipt_id, date=datetime(2024, 1, 1) + timedelta(hours=receipt_id), receipt_number=str(receipt_id),
+            market_id=1, user_id=1, image_path="receipt_images/x.jpg", original_filename="x.jpg",
+            postal_code="1111", city="Budapest", street_name="Fő utca", street_number="1",
+            total=299.85 * item_count
+        )
+        rows.append((receipt, market, user, items))
+    return rows
+
+
+def page_fields(receipts) -> dict:
+    return {"receipts": receipts, "skip": 0, "limit": len(receipts), "total": 1000, "has_next": True,
+            "has_previous": False, "next_cursor": "abc", "prev_cursor": None}
+
+
+def pydantic_path(rows, adapter: TypeAdapter) -> bytes:
+    # Ugyanazok a lépések, amiket a FastAPI egy modellt visszaadó, response_model-es endpointnál végez
+    result = ReceiptListOut(**page_fields([build_receipt_out(*row) for row in rows]))
+    validated = adapter.validate_python(result.model_dump())
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def orjson_path(rows) -> bytes:
+    return orjson.dumps(page_fields([receipt_out_dict(*row) for row in rows]))
+
+
+def measure(function, *args) -> list[float]:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    receipt_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    item_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = build_rows(receipt_count, item_count)
+    adapter = TypeAdapter(ReceiptListOut)
+
+    old_body = pydantic_path(rows, adapter)
+    new_body = orjson_path(rows)
+    if json.loads(old_body) != json.loads(new_body):
+        print("Eltérő JSON a két útvonalon!")
+        sys.exit(1)
+
+    print(f"{receipt_count} blokk x {item_count} tétel, {len(new_body):,} bájt, {REPEATS} ismétlés")
+    print(f"{'path':<20} {'median ms':>10} {'p95 ms':>8}")
+    results = {}
+    for name, timings in (
+        ("pydantic + json", measure(pydantic_path, rows, adapter)),
+        ("dict + orjson", measure(orjson_path, rows)),
+    ):
+        results[name] = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"{name:<20} {results[name]:>10.2f} {p95:>8.2f}")
+    print(f"Gyorsulás: {results['pydantic + json'] / results['dict + orjson']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
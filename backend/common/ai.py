@@ -1,16 +1,98 @@
 import os
+import threading
+from typing import Optional
 
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.language_models import BaseChatModel
 
-def get_llm_model(temperature: int = 0) -> BaseChatModel:
+# HTTP kapcsolat pool beállítások az LLM hívásokhoz
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "60"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+
+# Folyamatonkénti registry; fork után a gyermek folyamat újat épít, a szülő socketjeit nem használja
+_lock = threading.Lock()
+_owner_pid: Optional[int] = None
+_models: dict[tuple[Optional[str], float], ChatOpenAI] = {}
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _reset_registry():
+    global _owner_pid, _http_client, _async_http_client, _lock
+    # A szülőtől örökölt klienseket nem zárjuk le, mert a kapcsolataik a szülőhöz tartoznak
+    _lock = threading.Lock()
+    _owner_pid = os.getpid()
+    _models.clear()
+    _http_client = None
+    _async_http_client = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_registry)
+
+
+def _pool_settings() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY
+        ),
+        "timeout": httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT)
+    }
+
+
+def get_llm_model(temperature: float = 0) -> BaseChatModel:
     """
     Args:
         temperature: The temperature setting for the model that affects the randomness of responses. Defaults to 0.
 
     Returns:
-        An instance of BaseChatModel specific to the LLM provider.
+        A process-wide shared instance of BaseChatModel specific to the LLM provider. It is cached per
+        (model, temperature) and uses pooled keep-alive HTTP clients for both invoke and ainvoke.
     """
+    global _http_client, _async_http_client
+
+    if _owner_pid != os.getpid():
+        _reset_registry()
+
+    model_name = os.getenv("AI_MODEL")
+    key = (model_name, float(temperature))
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            if _http_client is None:
+                _http_client = httpx.Client(**_pool_settings())
+            if _async_http_client is None:
+                _async_http_client = httpx.AsyncClient(**_pool_settings())
+            model = ChatOpenAI(
+                model=model_name,
+                api_key=os.getenv("OPENAI_API_KEY"),
+                temperature=temperature,
+                http_client=_http_client,
+                http_async_client=_async_http_client
+            )
+            _models[key] = model
+        return model
 
 
-    return ChatOpenAI(model=os.getenv("AI_MODEL"), api_key=os.getenv("OPENAI_API_KEY"), temperature=temperature)
\ No newline at end of file
+async def close_llm_clients():
+    """Close the pooled HTTP clients (called on application shutdown)."""
+    global _http_client, _async_http_client
+    with _lock:
+        http_client, async_http_client = _http_client, _async_http_client
+        _models.clear()
+        _http_client = None
+        _async_http_client = None
+    if http_client is not None:
+        http_client.close()
+    if async_http_client is not None:
+        await async_http_client.aclose()
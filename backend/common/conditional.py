@@ -0,0 +1,49 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request, Response
+
+# A válaszok felhasználónként eltérnek: a böngésző tárolhatja, de minden használat előtt újra kell validálnia
+CONDITIONAL_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag from the given (JSON serializable) parts."""
+    digest = hashlib.sha1(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def make_strong_etag(*parts: Any) -> str:
+    """Strong ETag: only for representations that are byte-for-byte identical for the same parts (e.g. files)."""
+    digest = hashlib.sha1(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def request_fingerprint(request: Request) -> tuple[str, list]:
+    """The path and the sorted query parameters: what makes two GETs return the same representation."""
+    return request.url.path, sorted(request.query_params.multi_items())
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison; weak comparison, as required for GET (RFC 9110 13.1.2)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+
+def check_not_modified(request: Request, response: Response, etag: str):
+    """
+    Answer a conditional GET: raises a 304 if the client's copy is current, otherwise sets the
+    ETag on the response being built.
+
+    Raises:
+        HTTPException: 304 Not Modified (empty body, with the ETag).
+    """
+    headers = {"ETag": etag, "Cache-Control": CONDITIONAL_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
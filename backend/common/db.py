@@ -0,0 +1,15 @@
+import os
+
+from dotenv import load_dotenv
+from sqlmodel import Session, create_engine
+
+load_dotenv()
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+# Az alkalmazás közös engine-je; a web, a recognition worker és az eszközök is innen veszik,
+# így a DB eléréshez nem kell betölteni az auth réteget (és a JWT kulcsokat)
+engine = create_engine(DATABASE_URL)
+
+
+def get_session():
+    with Session(engine) as session:
+        yield session
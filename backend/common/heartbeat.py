@@ -0,0 +1,21 @@
+import os
+import tempfile
+import time
+
+# Életjel fájl a háttér worker konténer healthcheckjéhez; ennél régebbi életjel = unhealthy
+HEARTBEAT_FILE = os.getenv("RECOGNITION_WORKER_HEARTBEAT_FILE", os.path.join(tempfile.gettempdir(), "recognition_worker.heartbeat"))
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("RECOGNITION_WORKER_HEARTBEAT_SECONDS", "15"))
+HEARTBEAT_MAX_AGE_SECONDS = float(os.getenv("RECOGNITION_WORKER_HEARTBEAT_MAX_AGE_SECONDS", "60"))
+
+
+def write_heartbeat():
+    with open(HEARTBEAT_FILE, "w") as heartbeat:
+        heartbeat.write(str(time.time()))
+
+
+def heartbeat_is_fresh(max_age_seconds: float = HEARTBEAT_MAX_AGE_SECONDS) -> bool:
+    """Whether a running worker wrote its heartbeat recently (used by the container healthcheck)."""
+    try:
+        return time.time() - os.path.getmtime(HEARTBEAT_FILE) <= max_age_seconds
+    except OSError:
+        return False
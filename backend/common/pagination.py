@@ -0,0 +1,104 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, TypeVar
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+T = TypeVar("T")
+
+
+@dataclass
+class Cursor:
+    """Decoded keyset cursor: the sort key value and id of the row next to the requested page."""
+    order_by: str
+    order_dir: str
+    value: Any
+    id: int
+    backwards: bool = False  # True: az előző oldalt kérjük (prev_cursor)
+
+
+def encode_cursor(order_by: str, order_dir: str, value: Any, row_id: int, backwards: bool = False) -> str:
+    """Encode a row's sort key as an opaque, URL-safe cursor string."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = {"o": order_by, "d": order_dir, "v": value, "i": row_id}
+    if backwards:
+        payload["b"] = 1
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, order_by: str, order_dir: str, value_type: type) -> Cursor:
+    """
+    Decode a cursor produced by encode_cursor for the given ordering.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or was issued for a different ordering.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        matches_ordering = payload["o"] == order_by and payload["d"] == order_dir
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not matches_ordering:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested ordering")
+
+    try:
+        value = payload["v"]
+        if value is not None:
+            value = datetime.fromisoformat(value) if value_type is datetime else value_type(value)
+        return Cursor(
+            order_by=order_by,
+            order_dir=order_dir,
+            value=value,
+            id=int(payload["i"]),
+            backwards=bool(payload.get("b"))
+        )
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_keyset(query, sort_column, id_column, descending: bool, cursor: Optional[Cursor] = None):
+    """
+    Order a query by (sort_column, id_column) and, given a cursor, keep only the rows after it
+    (or before it for a backwards cursor). The row-value comparison can be served by a
+    composite (sort_column, id) index, so the cost of a page does not grow with its depth.
+    """
+    # Visszafelé lapozásnál megfordítjuk a rendezést, az eredményt a hívó fordítja vissza
+    reverse = cursor is not None and cursor.backwards
+    descending_scan = descending != reverse
+
+    if cursor is not None:
+        key = tuple_(sort_column, id_column)
+        boundary = tuple_(cursor.value, cursor.id)
+        query = query.where(key < boundary if descending_scan else key > boundary)
+
+    if descending_scan:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+
+def trim_page(rows: Sequence[T], limit: int, cursor: Optional[Cursor] = None) -> tuple[List[T], bool]:
+    """
+    Cut a limit+1 row fetch down to the page. Returns the rows in the requested order and whether
+    there are more rows in the scanned direction.
+    """
+    page = list(rows[:limit])
+    has_more = len(rows) > limit
+    if cursor is not None and cursor.backwards:
+        page.reverse()
+    return page, has_more
+
+
+def page_flags(has_more: bool, cursor: Optional[Cursor], skip: int = 0) -> tuple[bool, bool]:
+    """(has_next, has_previous) for a page fetched by trim_page."""
+    if cursor is None:
+        return has_more, skip > 0
+    if cursor.backwards:
+        return True, has_more
+    return has_more, True
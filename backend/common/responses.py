@@ -0,0 +1,16 @@
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+
+def orjson_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> ORJSONResponse:
+    """
+    Encode already built plain data (dicts, lists, datetimes, enums) with orjson.
+
+    Returning a Response skips FastAPI's response_model validation and re-serialization, so the
+    content must already have the declared shape. Headers set on the injected Response by the
+    endpoint or its dependencies (e.g. ETag) are carried over.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, status_code=status_code, headers=headers)
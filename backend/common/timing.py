@@ -0,0 +1,106 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Kérésenkénti szakasz időzítések (ms), a middleware állítja be minden kérés elején
+_stage_timings: ContextVar[Optional[dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+# Hisztogram vödrök felső határai milliszekundumban
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+
+class StageHistogram:
+    """Thread-safe fixed-bucket latency histogram for one stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)  # az utolsó a +Inf vödör
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, duration_ms: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+            self.count += 1
+            self.sum_ms += duration_ms
+            self.max_ms = max(self.max_ms, duration_ms)
+
+    def _quantile(self, q: float) -> float:
+        # A vödör felső határával becsül (felülről)
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return HISTOGRAM_BUCKETS_MS[index] if index < len(HISTOGRAM_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "sum_ms": round(self.sum_ms, 3),
+                "mean_ms": round(self.sum_ms / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "p50_ms": self._quantile(0.5),
+                "p95_ms": self._quantile(0.95),
+                "p99_ms": self._quantile(0.99),
+                "buckets": {
+                    **{f"le_{bound}": count for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.counts)},
+                    "le_inf": self.counts[-1]
+                }
+            }
+
+
+_histograms_lock = threading.Lock()
+_histograms: dict[str, StageHistogram] = {}
+
+
+def start_request_timings() -> dict[str, float]:
+    """Start collecting stage timings for the current request context."""
+    timings: dict[str, float] = {}
+    _stage_timings.set(timings)
+    return timings
+
+
+def record_stage(name: str, duration_ms: float):
+    """Add a stage duration to the current request (no-op outside a request)."""
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + duration_ms
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of code as a named ingestion stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, (time.perf_counter() - start) * 1000)
+
+
+def observe_stages(timings: dict[str, float]):
+    """Feed a finished request's stage timings into the process-wide histograms."""
+    for name, duration_ms in timings.items():
+        histogram = _histograms.get(name)
+        if histogram is None:
+            with _histograms_lock:
+                histogram = _histograms.setdefault(name, StageHistogram())
+        histogram.observe(duration_ms)
+
+
+def stage_histograms() -> dict[str, dict]:
+    """Snapshot of this process' per-stage latency histograms."""
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.snapshot() for name, histogram in histograms.items()}
+
+
+def server_timing_header(timings: dict[str, float]) -> str:
+    """Format stage timings as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={duration_ms:.1f}" for name, duration_ms in timings.items())
@@ -0,0 +1,186 @@
+import contextlib
+import hashlib
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: csak a folyamaton belül zárolunk
+    fcntl = None
+
+import anyio
+from fastapi import HTTPException, UploadFile
+
+from app_logging import get_logger
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))  # 15MB
+# Tartalom szerint címzett tárolás: <könyvtár>/ab/cd/<sha256><kiterjesztés>, a hash első bájtjai szerint szétosztva
+CONTENT_STORE_SHARD_DEPTH = int(os.getenv("CONTENT_STORE_SHARD_DEPTH", "2"))
+CONTENT_STORE_SHARD_WIDTH = 2
+# A tárolt fájlok zárfájlja a shard könyvtárban (az ott lévő fájlok közösen használják)
+CONTENT_STORE_LOCK_FILENAME = ".lock"
+
+logger = get_logger(__name__)
+
+_local_store_lock = threading.Lock()
+
+# Magic byte alapú típusfelismerés: (eltolás, minta, MIME típus, kiterjesztés)
+_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg", ".jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png", ".png"),
+    (0, b"GIF87a", "image/gif", ".gif"),
+    (0, b"GIF89a", "image/gif", ".gif"),
+    (0, b"BM", "image/bmp", ".bmp"),
+    (0, b"II*\x00", "image/tiff", ".tiff"),
+    (0, b"MM\x00*", "image/tiff", ".tiff"),
+]
+_HEIF_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"mif1", b"msf1"}
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    content_hash: str  # SHA-256 hex
+    mime_type: str
+    extension: str
+    content: memoryview  # a teljes tartalom, hogy a további lépéseknek ne kelljen újraolvasni a fájlt
+    deduplicated: bool = False  # azonos tartalmú fájl már volt a tárban, az új nem került kiírásra
+
+
+def content_addressed_path(directory: str, content_hash: str, extension: str) -> str:
+    """The store path of a file with the given SHA-256 hex digest: nested shard directories from the hash prefix."""
+    shards = [
+        content_hash[level * CONTENT_STORE_SHARD_WIDTH:(level + 1) * CONTENT_STORE_SHARD_WIDTH]
+        for level in range(CONTENT_STORE_SHARD_DEPTH)
+    ]
+    return os.path.join(directory, *shards, f"{content_hash}{extension}")
+
+
+@contextlib.contextmanager
+def stored_file_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive lock for a content-addressed file, across threads and processes of the host (flock).
+    Deleting an unreferenced file and re-checking a deduplicated one after its new reference is
+    committed both run under it. The lock file is shared by the files of one shard directory.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    if fcntl is None:
+        with _local_store_lock:
+            yield
+        return
+    with open(os.path.join(directory, CONTENT_STORE_LOCK_FILENAME), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def sniff_image_type(header: bytes) -> Optional[tuple[str, str]]:
+    """Detect the real image type from its first bytes; returns (mime_type, extension) or None."""
+    for offset, signature, mime_type, extension in _SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            return mime_type, extension
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if header[4:8] == b"ftyp" and header[8:12] in _HEIF_BRANDS:
+        return "image/heic", ".heic"
+    return None
+
+
+async def save_upload(
+    file: UploadFile,
+    directory: str,
+    filename_stem: Optional[str] = None,
+    max_bytes: int = UPLOAD_MAX_BYTES
+) -> StoredUpload:
+    """
+    Stream an uploaded image to disk in chunks. In the same pass it enforces the size limit,
+    checks the real image type from the magic bytes and computes the SHA-256 hash.
+
+    Without filename_stem the file is stored content-addressed (content_addressed_path); an upload
+    identical to a stored file is not written again, the existing path is returned.
+
+    Raises:
+        HTTPException: 400 if the content is not a supported image, 413 if it is larger than max_bytes.
+    """
+    first_chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    detected = sniff_image_type(first_chunk)
+    if detected is None:
+        logger.warning(f"Rejected upload, not an image: filename={file.filename}, content_type={file.content_type}")
+        raise HTTPException(status_code=400, detail="Only image files are allowed")
+    mime_type, extension = detected
+
+    path = os.path.join(directory, f"{filename_stem or uuid.uuid4().hex}{extension}")
+    # Ideiglenes fájlba írunk, így egy elutasított feltöltés nem írhat felül meglévő fájlt
+    partial_path = f"{path}.part"
+    digest = hashlib.sha256()
+    content = bytearray()
+    chunk = first_chunk
+
+    try:
+        async with await anyio.open_file(partial_path, "wb") as buffer:
+            while chunk:
+                if len(content) + len(chunk) > max_bytes:
+                    break
+                digest.update(chunk)
+                content += chunk
+                await buffer.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+        if chunk:
+            logger.warning(f"Rejected upload, larger than {max_bytes} bytes: filename={file.filename}")
+            raise HTTPException(status_code=413, detail=f"File too large (max {max_bytes} bytes)")
+
+        deduplicated = False
+        if filename_stem is None:
+            path = content_addressed_path(directory, digest.hexdigest(), extension)
+            if await anyio.Path(path).exists():
+                # Ugyanez a tartalom már a tárban van: nem írjuk ki újra
+                await anyio.Path(partial_path).unlink(missing_ok=True)
+                deduplicated = True
+            else:
+                await anyio.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        if not deduplicated:
+            await anyio.Path(partial_path).rename(path)
+    except BaseException:
+        # Elutasított vagy megszakadt feltöltés (kliens bontott, IO hiba, megszakítás): ne maradjon .part fájl
+        with contextlib.suppress(OSError):
+            os.remove(partial_path)
+        raise
+
+    logger.debug(f"Upload stored: path={path}, size={len(content)}, type={mime_type}, deduplicated={deduplicated}")
+    return StoredUpload(
+        path=path,
+        size=len(content),
+        content_hash=digest.hexdigest(),
+        mime_type=mime_type,
+        extension=extension,
+        content=memoryview(content),
+        deduplicated=deduplicated
+    )
+
+
+def ensure_upload_stored(upload: StoredUpload):
+    """
+    Re-create a content-addressed upload if it disappeared after it was saved: a deduplicated file can be
+    removed by a concurrent delete of its last other reference. Call it once the new reference is committed.
+
+    Runs under stored_file_lock, like the reference count and removal in
+    receipt.image_store.remove_unreferenced_images: a removal either sees the committed reference or has
+    finished before this check, so the file cannot disappear after it. Blocking: call it from a worker thread.
+    """
+    with stored_file_lock(upload.path):
+        if os.path.exists(upload.path):
+            return
+        logger.warning(f"Stored upload disappeared before its reference was committed, writing it again: {upload.path}")
+        partial_path = f"{upload.path}.{uuid.uuid4().hex}.part"
+        with open(partial_path, "wb") as buffer:
+            buffer.write(upload.content)
+        os.replace(partial_path, upload.path)
@@ -156,11 +156,14 @@ def create_receipt_batch(market_ids: List[int], user_ids: List[int], batch_size:
                         unit=random.choice(UNITS),
                         receipt_id=receipt.id or 0
                     )
+                    item.line_total = item.unit_price * item.quantity
                     items_to_add.append(item)
                 
                 # Bulk insert items for this receipt
                 if items_to_add:
                     session.add_all(items_to_add)
+                    receipt.total = sum(item.line_total for item in items_to_add)
+                    session.add(receipt)
                     session.commit()
                 
                 stats.add_receipt(item_count)
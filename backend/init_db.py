@@ -1,9 +1,18 @@
 import sys
 import os
+from alembic import command
+from alembic.config import Config
 from sqlmodel import SQLModel, Session, select, create_engine
 from auth.models import Role, RoleEnum
 from dotenv import load_dotenv
 from receipt.models import *
+from receipt.search import ensure_search_indexes
+
+def run_migrations(database_url: str):
+    """Upgrade the database to the latest migration (migrations/)."""
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    config.attributes["database_url"] = database_url
+    command.upgrade(config, "head")
 
 def init_database():
     # Ha van parancssori argumentum, azt használja DATABASE_URL-ként
@@ -27,6 +36,14 @@ def init_database():
     SQLModel.metadata.create_all(engine)
     print("Database tables created")
     
+    # Migrációk: meglévő adatbázisokon pótolják az oszlopokat és indexeket, friss adatbázison csak bejegyzik magukat
+    run_migrations(DATABASE_URL)
+    print("Database migrations applied")
+    
+    # Tartalmazó keresés indexei SQLite-on (FTS5); Postgresen a pg_trgm indexeket a migrációk építik
+    ensure_search_indexes(engine)
+    print("Search indexes created")
+    
     # Create default roles if they don't exist
     with Session(engine) as session:
         # Check if admin role exists
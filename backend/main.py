@@ -1,11 +1,14 @@
 import time
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Depends
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
-from auth.routes import router as auth_router
+from auth.routes import router as auth_router, require_roles
 from receipt.routes import router as receipt_router
 from statistic.routes import router as statistic_router
+from common.ai import close_llm_clients
+from common.timing import start_request_timings, observe_stages, server_timing_header, stage_histograms
 from dotenv import load_dotenv
 import uvicorn
 
@@ -26,7 +29,9 @@ app = FastAPI(
     version="1.0.0",
     openapi_url="/openapi.json",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    # A válaszokat orjson kódolja (a response_model validálás után)
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -35,6 +40,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Más originről futó frontend csak a kifejezetten kiengedett válaszfejléceket olvashatja
+    # (a markets lista következő oldalának cursora, feltételes GET, időmérés)
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
 @app.middleware("http")
@@ -47,17 +55,25 @@ async def logging_middleware(request: Request, call_next):
     logger.info(f"Incoming request: {request.method} {request.url.path} - Client: {request.client.host if request.client else 'unknown'}")
     
     start_time = time.perf_counter()
+    stage_timings = start_request_timings()
     
     try:
         response = await call_next(request)
         process_time = time.perf_counter() - start_time
         
-        # Log response
-        logger.info(f"Response: {response.status_code} - Time: {process_time:.4f}s")
+        # Log response (a szakaszonkénti időket strukturált mezőként is átadjuk)
+        stages = ", ".join(f"{name}={duration:.1f}ms" for name, duration in stage_timings.items())
+        logger.info(
+            f"Response: {response.status_code} - Time: {process_time:.4f}s" + (f" - Stages: {stages}" if stages else ""),
+            extra={"stage_timings": dict(stage_timings), "process_time": process_time}
+        )
         
         # Add headers
         response.headers["X-Process-Time"] = str(process_time)
         response.headers["X-Request-ID"] = request_id
+        if stage_timings:
+            observe_stages(stage_timings)
+            response.headers["Server-Timing"] = server_timing_header({**stage_timings, "total": process_time * 1000})
         
         return response
     
@@ -67,6 +83,12 @@ async def logging_middleware(request: Request, call_next):
         raise
 
 
+@app.get("/metrics/stages", tags=["metrics"], dependencies=[Depends(require_roles(["admin"]))])
+async def get_stage_latency_histograms():
+    """Szakaszonkénti késleltetés hisztogramok (az aktuális worker folyamatra vonatkoznak)"""
+    return stage_histograms()
+
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("FastAPI application starting up...")
@@ -74,6 +96,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("FastAPI application shutting down...")
+    await close_llm_clients()
 
 app.include_router(auth_router)
 app.include_router(receipt_router)
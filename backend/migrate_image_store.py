@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+A blokk képek átköltöztetése a tartalom szerint címzett képtárba
+
+A régi, lapos receipt_images/<uuid>.<kit> fájlokat a helyükön (ugyanabban a könyvtárban)
+áthelyezi a receipt_images/ab/cd/<sha256>.<kit> alakú útvonalakra, az azonos tartalmú
+fájlokból egyet tart meg, és átírja a blokkok és felismerési jobok image_path mezőit.
+A fájl előbb az új helyére kerül (hard link vagy másolat), az adatbázis commit után törlődik
+a régi, így a megszakított futás újraindítható. A már a tárban lévő fájlokat kihagyja.
+
+Használat:
+    python migrate_image_store.py [--dry-run] [DATABASE_URL]
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import update
+from sqlmodel import Session, create_engine, select
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from auth.models import User  # noqa: F401 (a Receipt.user kapcsolat feloldásához)
+from common.uploads import content_addressed_path, sniff_image_type
+from receipt.images import remove_image_variants
+from receipt.models import Receipt, RecognitionJob
+
+UPLOADS_DIR = os.getenv("RECEIPT_IMAGES_DIR", "receipt_images")
+# Ennyi fájl adatbázis módosítása megy egy tranzakcióba
+COMMIT_EVERY = 200
+_CONTENT_NAME = re.compile(r"^[0-9a-f]{64}(\.[a-z0-9]+)?$")
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def target_path(path: str) -> str:
+    # A kiterjesztést a feltöltéshez hasonlóan a tartalomból határozzuk meg, így a régi és az új
+    # feltöltések azonos tartalma ugyanarra az útvonalra kerül
+    with open(path, "rb") as source:
+        detected = sniff_image_type(source.read(64))
+    extension = detected[1] if detected else os.path.splitext(path)[1].lower()
+    return content_addressed_path(UPLOADS_DIR, file_sha256(path), extension)
+
+
+def in_store(path: str) -> bool:
+    root = os.path.realpath(UPLOADS_DIR)
+    return bool(path) and os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def already_migrated(path: str) -> bool:
+    name = os.path.basename(path)
+    return bool(_CONTENT_NAME.match(name)) and path == content_addressed_path(
+        UPLOADS_DIR, name[:64], name[64:]
+    )
+
+
+def place(source: str, target: str) -> bool:
+    """Put source at target (hard link, or copy across filesystems); False if target already existed."""
+    if os.path.exists(target):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        partial_path = f"{target}.part"
+        shutil.copy2(source, partial_path)
+        os.replace(partial_path, target)
+    return True
+
+
+def main():
+    dry_run = "--dry-run" in sys.argv
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if args:
+        database_url = args[0]
+    else:
+        load_dotenv()
+        database_url = os.getenv("DATABASE_URL", "sqlite:///./test.db")
+    engine = create_engine(database_url)
+    print(f"Database URL: {engine.url}, képtár: {UPLOADS_DIR}{' (dry run)' if dry_run else ''}")
+
+    with Session(engine) as session:
+        paths = set(session.exec(select(Receipt.image_path).distinct()).all())
+        paths |= set(session.exec(select(RecognitionJob.image_path).distinct()).all())
+    pending = sorted(path for path in paths if in_store(path) and not already_migrated(path))
+    print(f"Hivatkozott képek: {len(paths)}, áthelyezendő: {len(pending)}")
+
+    moved = duplicates = missing = saved_bytes = 0
+    batch: list[tuple[str, str]] = []
+    seen_targets: set[str] = set()
+
+    def flush():
+        # Előbb az adatbázis (a fájl már az új helyén van), utána a régi fájl törlése
+        if not batch or dry_run:
+            batch.clear()
+            return
+        with Session(engine) as session:
+            for old_path, new_path in batch:
+                for model in (Receipt, RecognitionJob):
+                    session.execute(update(model).where(model.image_path == old_path).values(image_path=new_path))
+            session.commit()
+        for old_path, _ in batch:
+            remove_image_variants(old_path)
+            os.remove(old_path)
+        batch.clear()
+
+    for path in pending:
+        if not os.path.exists(path):
+            missing += 1
+            print(f"Hiányzó fájl, kihagyva: {path}")
+            continue
+        target = target_path(path)
+        size = os.path.getsize(path)
+        if dry_run:
+            created = target not in seen_targets and not os.path.exists(target)
+        else:
+            created = place(path, target)
+        seen_targets.add(target)
+        if created:
+            moved += 1
+        else:
+            duplicates += 1
+            saved_bytes += size
+        batch.append((path, target))
+        if len(batch) >= COMMIT_EVERY:
+            flush()
+    flush()
+
+    print(f"Áthelyezve: {moved}, duplikátum (törölve): {duplicates}, felszabadult: {saved_bytes / 1e6:.1f} MB, hiányzó: {missing}")
+
+    # A képtár gyökerében maradt, semmi által nem hivatkozott régi fájlok (nem töröljük őket)
+    leftovers = [
+        entry.path for entry in os.scandir(UPLOADS_DIR)
+        if entry.is_file() and entry.path not in paths and not entry.name.startswith(".")
+    ] if os.path.isdir(UPLOADS_DIR) else []
+    if leftovers:
+        print(f"Nem hivatkozott fájlok a {UPLOADS_DIR} gyökerében (érintetlenül hagyva): {len(leftovers)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import os
+import sys
+
+from alembic import context
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, pool
+from sqlmodel import SQLModel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from auth.models import *  # noqa: F401,F403 - a metadata feltöltéséhez
+from receipt.models import *  # noqa: F401,F403
+
+config = context.config
+target_metadata = SQLModel.metadata
+
+
+def get_database_url() -> str:
+    # Az init_db.py átadja a saját DATABASE_URL-jét, kézi futtatásnál a .env-ből jön
+    database_url = config.attributes.get("database_url")
+    if database_url:
+        return database_url
+    load_dotenv()
+    return os.getenv("DATABASE_URL", "sqlite:///./test.db")
+
+
+def run_migrations_offline():
+    """Generate the migration SQL without a database connection (alembic upgrade --sql)."""
+    context.configure(
+        url=get_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(get_database_url(), poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite-on az ALTER TABLE műveletek batch módban (táblamásolással) futnak
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
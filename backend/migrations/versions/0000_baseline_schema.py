@@ -0,0 +1,118 @@
+"""Baseline schema (before the migration series)
+
+A migrációk bevezetése előtti, create_all-lal létrehozott táblák: felhasználók, szerepkörök,
+refresh tokenek, boltok, blokkok és tételek. Üres adatbázison létrehozza őket, így a teljes
+lánc (alembic upgrade head) önmagában is lefut; meglévő adatbázison a már létező táblákat kihagyja.
+
+Revision ID: 0000
+Revises:
+Create Date: 2026-10-17 09:30:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0000"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str) -> bool:
+    return not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if not _has_table("user"):
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=True),
+            sa.Column("fullname", sa.String(), nullable=True),
+            sa.Column("profile_picture", sa.String(), nullable=True),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.Column("disabled", sa.Boolean(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_user_username", "user", ["username"], unique=True)
+        op.create_index("ix_user_email", "user", ["email"], unique=True)
+
+    if not _has_table("role"):
+        op.create_table(
+            "role",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.Enum("admin", "user", name="roleenum"), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_role_name", "role", ["name"], unique=True)
+
+    if not _has_table("userrolelink"):
+        op.create_table(
+            "userrolelink",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("role_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.ForeignKeyConstraint(["role_id"], ["role.id"]),
+            sa.PrimaryKeyConstraint("user_id", "role_id"),
+        )
+
+    if not _has_table("refreshtoken"):
+        op.create_table(
+            "refreshtoken",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("token", sa.String(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_refreshtoken_token", "refreshtoken", ["token"], unique=True)
+
+    if not _has_table("market"):
+        op.create_table(
+            "market",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("tax_number", sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("tax_number"),
+        )
+
+    if not _has_table("receipt"):
+        op.create_table(
+            "receipt",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("date", sa.DateTime(), nullable=False),
+            sa.Column("receipt_number", sa.String(), nullable=False),
+            sa.Column("market_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("image_path", sa.String(), nullable=False),
+            sa.Column("original_filename", sa.String(), nullable=False),
+            sa.Column("postal_code", sa.String(), nullable=False),
+            sa.Column("city", sa.String(), nullable=False),
+            sa.Column("street_name", sa.String(), nullable=False),
+            sa.Column("street_number", sa.String(), nullable=False),
+            sa.ForeignKeyConstraint(["market_id"], ["market.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+    if not _has_table("receiptitem"):
+        op.create_table(
+            "receiptitem",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("unit_price", sa.Float(), nullable=False),
+            sa.Column("quantity", sa.Float(), nullable=False),
+            sa.Column("unit", sa.String(), nullable=False),
+            sa.Column("receipt_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["receipt_id"], ["receipt.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade() -> None:
+    for table in ("receiptitem", "receipt", "market", "refreshtoken", "userrolelink", "role", "user"):
+        op.drop_table(table)
+    sa.Enum(name="roleenum").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,69 @@
+"""Stored receipt/item totals and data version counters
+
+A migrációk előtti (create_all-lal létrehozott) adatbázisokon pótolja a receipt.total és
+receiptitem.line_total oszlopokat (feltöltve), az indexeiket, valamint a dataversion táblát.
+Friss adatbázison a create_all már mindent létrehozott, ilyenkor nem csinál semmit.
+
+Revision ID: 0001
+Revises: 0000
+Create Date: 2026-10-16 10:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0001"
+down_revision: Union[str, None] = "0000"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TOTAL_COLUMNS = [
+    ("receiptitem", "line_total", "ix_receiptitem_line_total"),
+    ("receipt", "total", "ix_receipt_total"),
+]
+
+
+def _column_names(table: str) -> set:
+    if op.get_context().as_sql:
+        return set()  # offline (--sql) módban nincs mit megvizsgálni, minden lépés kiíródik
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _has_table(table: str) -> bool:
+    return not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    added = set()
+    for table, column, index in TOTAL_COLUMNS:
+        if column not in _column_names(table):
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column(column, sa.Float(), nullable=False, server_default="0"))
+            added.add(column)
+        op.create_index(index, table, [column], if_not_exists=True)
+
+    # Az új oszlopok feltöltése a meglévő tételekből
+    if "line_total" in added:
+        op.execute("UPDATE receiptitem SET line_total = unit_price * quantity")
+    if added:
+        op.execute(
+            "UPDATE receipt SET total = COALESCE("
+            "(SELECT SUM(receiptitem.line_total) FROM receiptitem WHERE receiptitem.receipt_id = receipt.id), 0)"
+        )
+
+    if not _has_table("dataversion"):
+        op.create_table(
+            "dataversion",
+            sa.Column("scope", sa.Integer(), nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint("scope"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("dataversion")
+    for table, column, index in reversed(TOTAL_COLUMNS):
+        op.drop_index(index, table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column(column)
@@ -0,0 +1,44 @@
+"""Indexes for the receipt list and item lookups
+
+- (user_id, date, id): a user blokkjai dátum szerint rendezve, keyset lapozással
+- (date, id): ugyanez admin nézetben, user szűrés nélkül
+- (user_id, total, id): összeg szerinti rendezés
+- receipt.market_id, receiptitem.receipt_id: a selectin betöltés, a szűrések és a törlések
+
+Postgresen CREATE INDEX CONCURRENTLY-vel épülnek (tranzakción kívül), így az írásokat
+nem blokkolják. A tételnév tartalmazó kereséséhez a receipt.search trigram indexe tartozik.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 10:30:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_receipt_user_id_date_id", "receipt", ["user_id", "date", "id"]),
+    ("ix_receipt_date_id", "receipt", ["date", "id"]),
+    ("ix_receipt_user_id_total_id", "receipt", ["user_id", "total", "id"]),
+    ("ix_receipt_market_id", "receipt", ["market_id"]),
+    ("ix_receiptitem_receipt_id", "receiptitem", ["receipt_id"]),
+]
+
+
+def upgrade() -> None:
+    # A CONCURRENTLY index építés nem futhat tranzakcióban; a create_all-lal létrehozott
+    # (friss) adatbázisokon az indexek már megvannak
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
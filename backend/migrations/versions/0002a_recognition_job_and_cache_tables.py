@@ -0,0 +1,71 @@
+"""Recognition job queue and recognition cache tables
+
+A háttérben futó felismerési jobok (recognitionjob) és a tartalom hash szerinti felismerési
+cache (recognitioncacheentry) táblái. Eddig csak a create_all hozta létre őket, így a 0003-as
+migráció (image_path index a jobokon) egy korábbi adatbázison nem futott le.
+Ha a tábla már létezik (create_all után), nem csinál semmit.
+
+Revision ID: 0002a
+Revises: 0002
+Create Date: 2026-10-17 09:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0002a"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str) -> bool:
+    return not op.get_context().as_sql and sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    if not _has_table("recognitionjob"):
+        op.create_table(
+            "recognitionjob",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("image_path", sa.String(), nullable=False),
+            sa.Column("original_filename", sa.String(), nullable=False),
+            sa.Column(
+                "status",
+                sa.Enum("pending", "processing", "done", "failed", name="recognitionjobstatus"),
+                nullable=False
+            ),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("error", sa.String(), nullable=True),
+            sa.Column("content_hash", sa.String(), nullable=True),
+            sa.Column("receipt_id", sa.Integer(), nullable=True),
+            sa.Column("locked_until", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        # Az image_path indexét a 0003-as migráció hozza létre
+        for column in ("user_id", "status", "created_at"):
+            op.create_index(f"ix_recognitionjob_{column}", "recognitionjob", [column])
+
+    if not _has_table("recognitioncacheentry"):
+        op.create_table(
+            "recognitioncacheentry",
+            sa.Column("content_hash", sa.String(), nullable=False),
+            sa.Column("result", sa.String(), nullable=False),
+            sa.Column("hits", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("last_used_at", sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint("content_hash"),
+        )
+        for column in ("created_at", "last_used_at"):
+            op.create_index(f"ix_recognitioncacheentry_{column}", "recognitioncacheentry", [column])
+
+
+def downgrade() -> None:
+    op.drop_table("recognitioncacheentry")
+    op.drop_table("recognitionjob")
+    sa.Enum(name="recognitionjobstatus").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,35 @@
+"""Indexes for the image store reference counts
+
+A tartalom szerint címzett képtárban egy fájlra több blokk (és felismerési job) is
+hivatkozhat; törléskor image_path szerint számoljuk meg a hivatkozásokat.
+A meglévő fájlokat a migrate_image_store.py helyezi át a tárba.
+
+Revision ID: 0003
+Revises: 0002a
+Create Date: 2026-10-16 18:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_receipt_image_path", "receipt", ["image_path"]),
+    ("ix_recognitionjob_image_path", "recognitionjob", ["image_path"]),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
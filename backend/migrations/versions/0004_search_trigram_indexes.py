@@ -0,0 +1,46 @@
+"""Trigram indexes for the substring search (Postgres)
+
+A tételnév és a bolt név tartalmazó (ILIKE '%x%') kereséséhez pg_trgm GIN index.
+CREATE INDEX CONCURRENTLY-vel, tranzakción kívül épülnek, így nagy táblán sem blokkolják az írásokat.
+SQLite-on a receipt.search FTS5 táblái szolgálják ki ugyanezt, ott ez a migráció nem csinál semmit.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 21:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_receiptitem_name_trgm", "receiptitem", "name"),
+    ("ix_market_name_trgm", "market", "name"),
+]
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name, table, [column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+                if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,55 @@
+"""Recognition cache keyed by model and preprocessing preset
+
+A felismerési cache kulcsa eddig csak a kép SHA-256 hash-e volt, így modell vagy előfeldolgozási
+preset váltás után is a régi beállításokkal készült eredményt adta vissza. Az új kulcs
+(content_hash, settings). A cache eldobható, ezért a régi táblát nem alakítja át, hanem újra létrehozza.
+Ha a settings oszlop már létezik (create_all után), nem csinál semmit.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 12:00:00
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "recognitioncacheentry"
+
+
+def _has_column(table: str, column: str) -> bool:
+    if op.get_context().as_sql:
+        return False
+    return column in {c["name"] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _create_table(key_columns: list[str]):
+    columns = [sa.Column(name, sa.String(), nullable=False) for name in key_columns]
+    op.create_table(
+        TABLE,
+        *columns,
+        sa.Column("result", sa.String(), nullable=False),
+        sa.Column("hits", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint(*key_columns),
+    )
+    for column in ("created_at", "last_used_at"):
+        op.create_index(f"ix_{TABLE}_{column}", TABLE, [column])
+
+
+def upgrade() -> None:
+    if _has_column(TABLE, "settings"):
+        return
+    op.drop_table(TABLE)
+    _create_table(["content_hash", "settings"])
+
+
+def downgrade() -> None:
+    op.drop_table(TABLE)
+    _create_table(["content_hash"])
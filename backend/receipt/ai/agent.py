@@ -1,21 +1,50 @@
+import asyncio
 import base64
 import mimetypes
+import os
+from typing import Optional
+
+import anyio
 from langchain_core.messages import HumanMessage
 
 from common.ai import get_llm_model
+from common.timing import stage
+from receipt.ai.preprocess import preprocess_image, get_preset
 from receipt.ai.structured_output import Receipt
 
 
-def recognize_receipt(image_path):
-    # Convert image to base64
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-    
+def recognition_settings() -> str:
+    """
+    What a recognition result depends on besides the image: the model and the resolved preprocessing preset.
+    Part of the recognition cache key, so changing either one does not return results made with the old one.
+    """
+    preset = get_preset()
+    preset_key = "off" if preset is None else f"{preset.max_edge}-{preset.quality}-{int(preset.grayscale)}-{int(preset.crop)}"
+    return f"{os.getenv('AI_MODEL')}:{preset_key}"
+
+
+def _prepare_image(image_bytes: bytes | memoryview, image_path: str) -> tuple[bytes | memoryview, str]:
+    """Kép előfeldolgozása küldés előtt; ha nem sikerül, az eredeti kép megy tovább"""
+    with stage("preprocess"):
+        processed = preprocess_image(image_bytes, get_preset())
+    if processed is not None:
+        return processed, "image/jpeg"
+
     # Detect image format dynamically
     mime_type, _ = mimetypes.guess_type(image_path)
     if mime_type is None:
         mime_type = "image/jpeg"  # fallback to jpeg if detection fails
-    
+
+    return image_bytes, mime_type
+
+
+def _encode_image(image_bytes: bytes | memoryview) -> str:
+    """Base64 kódolás (CPU-igényes, nem az event loopon fut)"""
+    with stage("encode"):
+        return base64.b64encode(image_bytes).decode('utf-8')
+
+
+def _build_message(encoded_string: str, mime_type: str) -> HumanMessage:
     content = [
         {"type": "text", "text": """Elemezd ezt a bolti blokkot és nyerd ki belőle az összes adatot. Fontos szabályok:
 
@@ -39,10 +68,34 @@ Elemezd most ezt a blokkot és add vissza a strukturált adatokat:"""},
         {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{encoded_string}"}}
     ]
 
-    message = HumanMessage(content=content)
+    return HumanMessage(content=content)
+
+
+def recognize_receipt(image_path):
+    # Convert image to base64
+    with open(image_path, "rb") as image_file:
+        image_bytes, mime_type = _prepare_image(image_file.read(), image_path)
+    encoded_string = _encode_image(image_bytes)
+
+    message = _build_message(encoded_string, mime_type)
 
-    result = get_llm_model().with_structured_output(Receipt).invoke([message])
+    with stage("llm"):
+        result = get_llm_model().with_structured_output(Receipt).invoke([message])
     
     return result
 
 
+async def arecognize_receipt(image_path, image_bytes: Optional[bytes | memoryview] = None):
+    """Async változat: nem blokkolja az event loopot a fájlolvasás, kódolás és LLM hívás alatt"""
+    # Ha a feltöltés tartalma már a memóriában van, nem olvassuk újra a lemezről
+    if image_bytes is None:
+        image_bytes = await anyio.Path(image_path).read_bytes()
+    image_bytes, mime_type = await asyncio.to_thread(_prepare_image, image_bytes, image_path)
+    encoded_string = await asyncio.to_thread(_encode_image, image_bytes)
+
+    message = _build_message(encoded_string, mime_type)
+
+    with stage("llm"):
+        return await get_llm_model().with_structured_output(Receipt).ainvoke([message])
+
+
@@ -0,0 +1,112 @@
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageFilter, ImageOps, ImageStat, UnidentifiedImageError
+
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class PreprocessPreset:
+    max_edge: int  # a hosszabbik oldal maximális mérete pixelben
+    quality: int  # JPEG minőség (1-95)
+    grayscale: bool = True
+    crop: bool = True
+
+
+PRESETS = {
+    "high": PreprocessPreset(max_edge=2400, quality=90),
+    "balanced": PreprocessPreset(max_edge=1600, quality=80),
+    "low": PreprocessPreset(max_edge=1024, quality=65),
+}
+
+# "off" esetén az eredeti kép kerül elküldésre
+PREPROCESS_PRESET = os.getenv("RECEIPT_PREPROCESS_PRESET", "balanced")
+PREPROCESS_MAX_EDGE = os.getenv("RECEIPT_PREPROCESS_MAX_EDGE")
+
+# A vágáshoz használt kicsinyített kép mérete és a minimális elfogadott blokk terület
+_CROP_PROBE_EDGE = 256
+_CROP_MIN_AREA_RATIO = 0.2
+_CROP_MARGIN_RATIO = 0.02
+
+
+def get_preset(name: Optional[str] = None) -> Optional[PreprocessPreset]:
+    """Resolve a preset by name (defaults to RECEIPT_PREPROCESS_PRESET); None means preprocessing is off."""
+    name = (name or PREPROCESS_PRESET).lower()
+    if name == "off":
+        return None
+    preset = PRESETS.get(name)
+    if preset is None:
+        logger.warning(f"Unknown preprocess preset: {name}, using 'balanced'")
+        preset = PRESETS["balanced"]
+    if PREPROCESS_MAX_EDGE:
+        preset = PreprocessPreset(
+            max_edge=int(PREPROCESS_MAX_EDGE),
+            quality=preset.quality,
+            grayscale=preset.grayscale,
+            crop=preset.crop
+        )
+    return preset
+
+
+def _crop_to_receipt(image: Image.Image) -> Image.Image:
+    """Crop to the bright paper area; the background around a receipt photo is usually darker."""
+    probe = image.convert("L")
+    probe.thumbnail((_CROP_PROBE_EDGE, _CROP_PROBE_EDGE))
+    threshold = ImageStat.Stat(probe).mean[0]
+    mask = probe.point(lambda p: 255 if p > threshold else 0).filter(ImageFilter.MedianFilter(5))
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) < _CROP_MIN_AREA_RATIO * probe.width * probe.height:
+        # Valószínűleg nem a blokkot találtuk meg, inkább nem vágunk
+        return image
+
+    scale_x = image.width / probe.width
+    scale_y = image.height / probe.height
+    margin_x = int(image.width * _CROP_MARGIN_RATIO)
+    margin_y = int(image.height * _CROP_MARGIN_RATIO)
+    return image.crop((
+        max(0, int(left * scale_x) - margin_x),
+        max(0, int(top * scale_y) - margin_y),
+        min(image.width, int(right * scale_x) + margin_x),
+        min(image.height, int(bottom * scale_y) + margin_y)
+    ))
+
+
+def preprocess_image(image_bytes: bytes | memoryview, preset: Optional[PreprocessPreset] = None) -> Optional[bytes]:
+    """
+    Prepare a receipt photo for the LLM: fix EXIF orientation, convert to grayscale,
+    crop to the receipt, downscale and recompress as JPEG.
+
+    Returns:
+        The JPEG bytes, or None if the image cannot be decoded (the caller then sends the original).
+    """
+    if preset is None:
+        return None
+
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+        # JPEG esetén már dekódoláskor kicsinyítünk (a vágás miatt a cél méret kétszeresére)
+        image.draft("L" if preset.grayscale else "RGB", (preset.max_edge * 2, preset.max_edge * 2))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Image preprocessing skipped, cannot decode image: {str(e)}")
+        return None
+
+    image = image.convert("L") if preset.grayscale else image.convert("RGB")
+    if preset.crop:
+        image = _crop_to_receipt(image)
+    image.thumbnail((preset.max_edge, preset.max_edge), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=preset.quality, optimize=True)
+    processed = output.getvalue()
+    logger.debug(f"Image preprocessed: {len(image_bytes)} -> {len(processed)} bytes, size={image.size}")
+    return processed
@@ -0,0 +1,91 @@
+import os
+from typing import Iterator, List, Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlmodel import Session, select
+
+from auth.models import User
+from receipt.models import Receipt, ReceiptItem
+from receipt.schemas import ReceiptBulkSelection
+from receipt.utils import apply_receipt_filters, is_admin_user
+from app_logging import get_logger
+
+# Egy IN (...) listában legfeljebb ennyi azonosító megy ki (SQLite / Postgres paraméterkorlátok alatt)
+BULK_CHUNK_SIZE = int(os.getenv("RECEIPT_BULK_CHUNK_SIZE", "500"))
+
+logger = get_logger(__name__)
+
+
+def _chunks(values: Sequence) -> Iterator[Sequence]:
+    for start in range(0, len(values), BULK_CHUNK_SIZE):
+        yield values[start:start + BULK_CHUNK_SIZE]
+
+
+def select_bulk_targets(session: Session, current_user: User, selection: ReceiptBulkSelection) -> List:
+    """
+    Resolve a bulk selection (id list or filter) to (id, user_id, image_path) rows in one query each,
+    with the same rules as the single receipt endpoints: a regular user only touches their own receipts.
+
+    Raises:
+        HTTPException: 400 for an empty or ambiguous selection, 404 for unknown ids, 403 for foreign ones.
+    """
+    if (selection.ids is None) == (selection.filter is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'ids' or 'filter'")
+
+    columns = select(Receipt.id, Receipt.user_id, Receipt.image_path)
+
+    if selection.ids is not None:
+        receipt_ids = list(dict.fromkeys(selection.ids))
+        if not receipt_ids:
+            raise HTTPException(status_code=400, detail="'ids' must not be empty")
+        rows = []
+        for chunk in _chunks(receipt_ids):
+            rows.extend(session.exec(columns.where(Receipt.id.in_(chunk))).all())
+        missing = set(receipt_ids) - {row.id for row in rows}
+        if missing:
+            logger.warning(f"Bulk selection with unknown receipts: {sorted(missing)}")
+            raise HTTPException(status_code=404, detail=f"Receipts not found: {sorted(missing)}")
+        if not is_admin_user(current_user):
+            foreign = sorted(row.id for row in rows if row.user_id != current_user.id)
+            if foreign:
+                logger.warning(f"Unauthorized bulk selection: user={current_user.username}, receipt_ids={foreign}")
+                raise HTTPException(status_code=403, detail=f"Not authorized to modify receipts: {foreign}")
+        return rows
+
+    filters = selection.filter.model_dump(exclude_none=True)
+    if not filters:
+        # Üres szűrő = minden látható blokk; ezt véletlenül se lehessen elküldeni
+        raise HTTPException(status_code=400, detail="'filter' must set at least one field")
+    query = apply_receipt_filters(session, columns, current_user, **filters)
+    return list(session.exec(query.order_by(Receipt.id)).all())
+
+
+def delete_receipts(session: Session, receipt_ids: Sequence[int]) -> int:
+    """
+    Delete the given receipts and their items with set-based DELETE ... WHERE ... IN statements.
+    Runs in the caller's transaction; returns the number of receipts deleted.
+    """
+    deleted = 0
+    for chunk in _chunks(receipt_ids):
+        session.execute(
+            delete(ReceiptItem).where(ReceiptItem.receipt_id.in_(chunk)),
+            execution_options={"synchronize_session": False}
+        )
+        deleted += session.execute(
+            delete(Receipt).where(Receipt.id.in_(chunk)),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+    return deleted
+
+
+def update_receipts(session: Session, receipt_ids: Sequence[int], values: dict) -> int:
+    """Set the same column values on the given receipts with UPDATE ... WHERE id IN; returns the row count."""
+    updated = 0
+    for chunk in _chunks(receipt_ids):
+        updated += session.execute(
+            update(Receipt).where(Receipt.id.in_(chunk)).values(**values),
+            execution_options={"synchronize_session": False}
+        ).rowcount
+    return updated
+
@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import Depends, Request, Response
+from sqlmodel import Session
+
+from auth.models import User
+from auth.routes import get_current_user
+from common.conditional import make_etag, request_fingerprint, check_not_modified
+from common.db import get_session
+from receipt.utils import visible_receipts_user_id
+from receipt.versioning import receipts_version, markets_version
+
+
+def _query_user_id(request: Request) -> Optional[int]:
+    # A user_id paramétert maga az endpoint validálja, itt csak a hatókörhöz kell
+    try:
+        return int(request.query_params["user_id"])
+    except (KeyError, ValueError):
+        return None
+
+
+def receipts_not_modified(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """
+    Conditional GET dependency for endpoints reading the visible receipts (receipt list, statistics).
+    The weak ETag covers the URL, the user and the data versions of the visible receipts and the
+    markets, so a 304 is answered before the endpoint runs any query of its own.
+    """
+    scope_user_id = visible_receipts_user_id(current_user, _query_user_id(request))
+    etag = make_etag(
+        *request_fingerprint(request),
+        current_user.id,
+        receipts_version(session, scope_user_id),
+        markets_version(session)
+    )
+    check_not_modified(request, response, etag)
+
+
+def markets_not_modified(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Conditional GET dependency for the market endpoints (the market data is shared by every user)."""
+    etag = make_etag(*request_fingerprint(request), markets_version(session))
+    check_not_modified(request, response, etag)
@@ -0,0 +1,240 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import Iterator, Optional, Sequence
+
+import orjson
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from auth.models import User
+from common.db import engine
+from receipt.models import Receipt, Market, ReceiptItem
+from receipt.utils import apply_receipt_filters
+from app_logging import get_logger
+
+# Hány sort hoz egyszerre a szerver oldali cursor; a válasz is ekkora darabokban megy ki
+EXPORT_BATCH_SIZE = int(os.getenv("RECEIPT_EXPORT_BATCH_SIZE", "2000"))
+# Parquet / Arrow exportnál ennyi sor kerül egy row groupba / record batchbe (ennyi sor van egyszerre a memóriában)
+EXPORT_COLUMNAR_BATCH_ROWS = int(os.getenv("RECEIPT_EXPORT_COLUMNAR_BATCH_ROWS", "65536"))
+
+logger = get_logger(__name__)
+
+# Az export sorai: tételenként egy sor a blokk és a bolt adataival (tétel nélküli blokk egy üres tételű sor)
+EXPORT_COLUMNS = [
+    Receipt.id.label("receipt_id"),
+    Receipt.date,
+    Receipt.receipt_number,
+    Receipt.user_id,
+    Receipt.market_id,
+    Market.name.label("market_name"),
+    Market.tax_number.label("market_tax_number"),
+    Receipt.postal_code,
+    Receipt.city,
+    Receipt.street_name,
+    Receipt.street_number,
+    Receipt.total,
+    ReceiptItem.id.label("item_id"),
+    ReceiptItem.name.label("item_name"),
+    ReceiptItem.unit_price,
+    ReceiptItem.quantity,
+    ReceiptItem.unit,
+    ReceiptItem.line_total
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+RECEIPT_FIELDS = EXPORT_FIELDS[:EXPORT_FIELDS.index("item_id")]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+EXPORT_FILE_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "parquet": "parquet", "arrow": "arrows"}
+COLUMNAR_FORMATS = {"parquet", "arrow"}
+
+
+def export_query(
+    session: Session,
+    current_user: User,
+    user_id: Optional[int] = None,
+    market_id: Optional[int] = None,
+    market_name: Optional[str] = None,
+    item_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+):
+    """
+    The export statement: every item of the receipts get_receipts_paginated would list for the same
+    filters, ordered by receipt (date, id) and item id. Built with the request's session, executed later.
+    """
+    query = (
+        select(*EXPORT_COLUMNS)
+        .join(Market, Receipt.market_id == Market.id)
+        .outerjoin(ReceiptItem, ReceiptItem.receipt_id == Receipt.id)
+    )
+    query = apply_receipt_filters(
+        session, query, current_user, user_id, market_id, market_name, item_name, date_from, date_to
+    )
+    return query.order_by(Receipt.date, Receipt.id, ReceiptItem.id)
+
+
+def stream_batches(query) -> Iterator[Sequence]:
+    """
+    Execute the export statement on its own session and yield its rows in batches of EXPORT_BATCH_SIZE,
+    fetched through a server-side cursor (yield_per), so memory does not grow with the export size.
+    """
+    with Session(engine) as session:
+        # Core szintű végrehajtás: a sorokat nem dolgozza fel az ORM réteg
+        result = session.connection().execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+
+
+def _csv_chunks(batches: Iterator[Sequence]) -> Iterator[bytes]:
+    # Tételenként egy sor; a dátumok "YYYY-MM-DD HH:MM:SS" alakban
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_FIELDS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield output.getvalue().encode()
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        yield output.getvalue().encode()
+
+
+def _ndjson_chunks(batches: Iterator[Sequence]) -> Iterator[bytes]:
+    # Blokkonként egy sor, a tételek beágyazva; a sorok blokk szerint rendezve érkeznek,
+    # egy blokk tételei két batch határán is átnyúlhatnak
+    receipt = None
+    for batch in batches:
+        lines = []
+        for row in batch:
+            if receipt is None or receipt["receipt_id"] != row.receipt_id:
+                if receipt is not None:
+                    lines.append(orjson.dumps(receipt))
+                receipt = {field: getattr(row, field) for field in RECEIPT_FIELDS}
+                receipt["items"] = []
+            if row.item_id is not None:
+                receipt["items"].append({
+                    "id": row.item_id,
+                    "name": row.item_name,
+                    "unit_price": row.unit_price,
+                    "quantity": row.quantity,
+                    "unit": row.unit,
+                    "line_total": row.line_total
+                })
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+    if receipt is not None:
+        yield orjson.dumps(receipt) + b"\n"
+
+
+def require_pyarrow():
+    """
+    Import pyarrow for the columnar formats. It is loaded only on first use, so the web workers
+    do not pay its import time and memory unless someone exports Parquet / Arrow.
+
+    Raises:
+        HTTPException: 501 if pyarrow is not installed.
+    """
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        logger.error("Columnar export requested but pyarrow is not installed")
+        raise HTTPException(status_code=501, detail="Parquet / Arrow export is not available (pyarrow is not installed)")
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    # Az oszlopok típusai az EXPORT_COLUMNS sorrendjében; a tétel oszlopok tétel nélküli blokknál null-ok
+    types = {
+        "receipt_id": pa.int64(),
+        "date": pa.timestamp("us"),
+        "user_id": pa.int64(),
+        "market_id": pa.int64(),
+        "total": pa.float64(),
+        "item_id": pa.int64(),
+        "unit_price": pa.float64(),
+        "quantity": pa.float64(),
+        "line_total": pa.float64(),
+    }
+    return pa.schema([pa.field(name, types.get(name, pa.string())) for name in EXPORT_FIELDS])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object collecting what a pyarrow writer produces, drained after every write."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _columnar_chunks(batches: Iterator[Sequence], export_format: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    schema = _arrow_schema()
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema, options=pyarrow.ipc.IpcWriteOptions(compression="zstd"))
+
+    def record_batch(rows: list) -> "pa.RecordBatch":
+        columns = zip(*rows)
+        return pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        )
+
+    # A DB batch-eket EXPORT_COLUMNAR_BATCH_ROWS soronként gyűjtjük össze egy row groupba / record batchbe
+    pending: list = []
+    for batch in batches:
+        pending.extend(batch)
+        if len(pending) >= EXPORT_COLUMNAR_BATCH_ROWS:
+            writer.write_batch(record_batch(pending))
+            pending = []
+            yield sink.drain()
+    if pending:
+        writer.write_batch(record_batch(pending))
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(query, export_format: str) -> Iterator[bytes]:
+    """
+    The response body of an export in the given format, as a lazy chunk iterator: csv and ndjson
+    send one chunk per fetched batch, parquet and arrow one per row group / record batch.
+    """
+    logger.debug(f"Receipt export started: format={export_format}")
+    batches = stream_batches(query)
+    if export_format in COLUMNAR_FORMATS:
+        yield from _columnar_chunks(batches, export_format)
+    elif export_format == "csv":
+        yield from _csv_chunks(batches)
+    else:
+        yield from _ndjson_chunks(batches)
+    logger.debug(f"Receipt export finished: format={export_format}")
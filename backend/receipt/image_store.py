@@ -0,0 +1,88 @@
+import os
+from collections import Counter
+from typing import Iterable, List
+
+from sqlmodel import Session, select, func
+
+from common.db import engine
+from common.uploads import stored_file_lock
+from receipt.images import remove_image_variants
+from receipt.models import Receipt, RecognitionJob, RecognitionJobStatus
+from app_logging import get_logger
+
+# A blokk képek tára: tartalom szerint címzett fájlok (common.uploads.content_addressed_path)
+UPLOADS_DIR = os.getenv("RECEIPT_IMAGES_DIR", "receipt_images")
+# Egy IN (...) listában legfeljebb ennyi útvonal megy ki
+IMAGE_REFERENCE_CHUNK_SIZE = 500
+
+logger = get_logger(__name__)
+
+
+def _in_store(path: str) -> bool:
+    # A kézzel felvett blokkok image_path-ja bármi lehet; csak a tárban lévő fájlokat töröljük
+    root = os.path.realpath(UPLOADS_DIR)
+    return bool(path) and os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def image_reference_counts(session: Session, image_paths: Iterable[str]) -> Counter:
+    """
+    How many receipts and unfinished recognition jobs reference each image path. An identical upload is
+    stored once, so one file can belong to several receipts; it may only be removed at zero references.
+    """
+    paths = sorted(set(image_paths))
+    counts: Counter = Counter({path: 0 for path in paths})
+    for start in range(0, len(paths), IMAGE_REFERENCE_CHUNK_SIZE):
+        chunk = paths[start:start + IMAGE_REFERENCE_CHUNK_SIZE]
+        receipts = (
+            select(Receipt.image_path, func.count())
+            .where(Receipt.image_path.in_(chunk))
+            .group_by(Receipt.image_path)
+        )
+        # A kész és a végleg sikertelen jobok már nem használják a képet
+        jobs = (
+            select(RecognitionJob.image_path, func.count())
+            .where(
+                RecognitionJob.image_path.in_(chunk),
+                RecognitionJob.status.in_([RecognitionJobStatus.pending, RecognitionJobStatus.processing])
+            )
+            .group_by(RecognitionJob.image_path)
+        )
+        for query in (receipts, jobs):
+            counts.update(dict(session.exec(query).all()))
+    return counts
+
+
+def remove_unreferenced_images(image_paths: List[str]):
+    """
+    Remove the stored image files (and their cached variants) that nothing references any more.
+    The references are counted on a fresh session right before removal, so it is safe to run after the
+    deleting transaction committed, e.g. as a background task.
+
+    An identical upload may reuse the file meanwhile: each file is counted again and removed under
+    common.uploads.stored_file_lock, the same lock ensure_upload_stored takes once the new reference
+    is committed, so one of the two always sees the other.
+    """
+    candidates = [path for path in set(image_paths) if _in_store(path)]
+    if not candidates:
+        return
+    # Előszűrés egy menetben; a nulla hivatkozásúakat a zár alatt újraszámoljuk
+    with Session(engine) as session:
+        counts = image_reference_counts(session, candidates)
+
+    removed = 0
+    for path, references in counts.items():
+        if references:
+            continue
+        try:
+            with stored_file_lock(path):
+                with Session(engine) as session:
+                    if image_reference_counts(session, [path])[path]:
+                        continue
+                remove_image_variants(path)
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to remove receipt image: path={path}, error={str(e)}")
+    logger.info(f"Removed {removed} of {len(candidates)} receipt image files ({len(candidates) - removed} still referenced or missing)")
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from common.conditional import make_strong_etag
+from receipt.versioning import VersionedCache
+from app_logging import get_logger
+
+# A kicsinyített változatok lemezes cache-e; a fájlnév a forrásfájl azonosítójából képzett hash
+IMAGE_VARIANTS_DIR = os.getenv("RECEIPT_IMAGE_VARIANTS_DIR", os.path.join("receipt_images", "variants"))
+# A legutóbb kiszolgált thumbnailek memóriában (egy thumbnail ~10-30 KB)
+THUMBNAIL_MEMORY_CACHE_ENTRIES = int(os.getenv("RECEIPT_THUMBNAIL_MEMORY_CACHE_ENTRIES", "2000"))
+# A változat URL-je a kép tartalmához kötött (a blokk képe nem cserélődik), így a kliens újravalidálás nélkül tárolhatja
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class ImageVariantSpec:
+    max_edge: int  # a hosszabbik oldal maximális mérete pixelben
+    quality: int  # JPEG minőség (1-95)
+
+
+VARIANTS = {
+    "thumb": ImageVariantSpec(max_edge=int(os.getenv("RECEIPT_THUMBNAIL_MAX_EDGE", "320")), quality=70),
+    "medium": ImageVariantSpec(max_edge=int(os.getenv("RECEIPT_MEDIUM_IMAGE_MAX_EDGE", "1280")), quality=80),
+}
+
+_memory_cache = VersionedCache(max_entries=THUMBNAIL_MEMORY_CACHE_ENTRIES)
+
+
+@dataclass
+class ImageVariant:
+    etag: str  # erős ETag: ugyanahhoz az ETag-hez mindig bájtra azonos tartalom tartozik
+    path: str  # a kiszolgálandó fájl (az eredeti vagy a cache-elt változat)
+    media_type: Optional[str]  # None: a hívó határozza meg (eredeti kép)
+    content: Optional[bytes] = None  # thumbnail esetén a memóriában tartott tartalom
+
+
+def _source_signature(image_path: str) -> str:
+    # Az eredeti fájl azonosítója: útvonal, méret, módosítási idő; változáskor új változat és új ETag készül
+    stat = os.stat(image_path)
+    return f"{os.path.realpath(image_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _variant_path(signature: str, variant: str) -> tuple[str, str]:
+    spec = VARIANTS[variant]
+    key = hashlib.sha256(f"{signature}:{variant}:{spec.max_edge}:{spec.quality}".encode()).hexdigest()
+    return key, os.path.join(IMAGE_VARIANTS_DIR, key[:2], f"{key}.jpg")
+
+
+def _render_variant(image_path: str, spec: ImageVariantSpec) -> Optional[bytes]:
+    """Downscaled JPEG of the image, or None if Pillow cannot decode it (e.g. HEIC)."""
+    try:
+        image = Image.open(image_path)
+        # JPEG esetén már dekódoláskor kicsinyítünk
+        image.draft("RGB", (spec.max_edge * 2, spec.max_edge * 2))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError) as e:
+        logger.warning(f"Cannot render image variant, serving the original: path={image_path}, error={str(e)}")
+        return None
+
+    image = image.convert("RGB")
+    image.thumbnail((spec.max_edge, spec.max_edge), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=spec.quality, optimize=True, progressive=spec.max_edge > 512)
+    return output.getvalue()
+
+
+def _write_atomic(path: str, content: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Ideiglenes fájl + átnevezés: párhuzamos generálásnál sem látszik félig kiírt változat
+    partial_path = f"{path}.{os.getpid()}.part"
+    with open(partial_path, "wb") as buffer:
+        buffer.write(content)
+    os.replace(partial_path, path)
+
+
+def get_image_variant(image_path: str, variant: str) -> ImageVariant:
+    """
+    The requested size of a receipt image: 'full' is the original file, 'thumb' and 'medium' are
+    rendered on first request and cached on disk (thumbnails also in memory).
+    Blocking (file IO and image decoding): call it from a worker thread.
+
+    Raises:
+        FileNotFoundError: if the original image does not exist.
+    """
+    signature = _source_signature(image_path)
+    if variant not in VARIANTS:
+        return ImageVariant(etag=make_strong_etag(signature), path=image_path, media_type=None)
+
+    key, path = _variant_path(signature, variant)
+    etag = make_strong_etag(key)
+    if variant == "thumb":
+        content = _memory_cache.get(image_path, key)
+        if content is not None:
+            return ImageVariant(etag=etag, path=path, media_type="image/jpeg", content=content)
+
+    content = None
+    if os.path.exists(path):
+        if variant == "thumb":
+            with open(path, "rb") as cached:
+                content = cached.read()
+    else:
+        content = _render_variant(image_path, VARIANTS[variant])
+        if content is None:
+            return ImageVariant(etag=make_strong_etag(signature), path=image_path, media_type=None)
+        _write_atomic(path, content)
+        logger.debug(f"Image variant rendered: source={image_path}, variant={variant}, size={len(content)}")
+
+    if variant == "thumb":
+        _memory_cache.set(image_path, key, content)
+        return ImageVariant(etag=etag, path=path, media_type="image/jpeg", content=content)
+    return ImageVariant(etag=etag, path=path, media_type="image/jpeg")
+
+
+def remove_image_variants(image_path: str):
+    """Remove the cached variants of an image; call it before the original is deleted."""
+    try:
+        signature = _source_signature(image_path)
+    except OSError:
+        return
+    for variant in VARIANTS:
+        _, path = _variant_path(signature, variant)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import signal
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import update, or_, and_, text
+from sqlmodel import Session, select
+
+from common.db import engine
+from common.heartbeat import write_heartbeat, HEARTBEAT_INTERVAL_SECONDS
+from common.ai import close_llm_clients
+from receipt.image_store import remove_unreferenced_images
+from receipt.models import RecognitionJob, RecognitionJobStatus
+from receipt.recognition_cache import recognize_receipt_cached
+from receipt.utils import save_recognized_receipt
+from app_logging import get_logger
+
+# Worker konfiguráció (a web workerek számától függetlenül hangolható)
+WORKER_CONCURRENCY = int(os.getenv("RECOGNITION_WORKER_CONCURRENCY", "4"))
+POLL_INTERVAL_SECONDS = float(os.getenv("RECOGNITION_WORKER_POLL_SECONDS", "2"))
+JOB_LEASE_SECONDS = int(os.getenv("RECOGNITION_JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("RECOGNITION_JOB_MAX_ATTEMPTS", "3"))
+
+logger = get_logger(__name__)
+
+
+def enqueue_recognition_job(
+    session: Session,
+    user_id: int,
+    image_path: str,
+    original_filename: str,
+    content_hash: Optional[str] = None
+) -> RecognitionJob:
+    """Create a pending recognition job for an already stored upload."""
+    job = RecognitionJob(
+        user_id=user_id,
+        image_path=image_path,
+        original_filename=original_filename,
+        content_hash=content_hash
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def _claimable(now: datetime):
+    # Függő jobok, vagy olyan feldolgozás alatt állók, amelyek workere elveszett (lejárt a bérlet)
+    return and_(
+        RecognitionJob.attempts < JOB_MAX_ATTEMPTS,
+        or_(
+            RecognitionJob.status == RecognitionJobStatus.pending,
+            and_(RecognitionJob.status == RecognitionJobStatus.processing, RecognitionJob.locked_until < now)
+        )
+    )
+
+
+def claim_next_job() -> Optional[RecognitionJob]:
+    """Atomically lease the oldest claimable job, or return None if the queue is empty."""
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        job_id = session.exec(
+            select(RecognitionJob.id)
+            .where(_claimable(now))
+            .order_by(RecognitionJob.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if job_id is None:
+            return None
+
+        # Feltételes UPDATE, hogy két worker ne vehesse fel ugyanazt a jobot (SQLite-on nincs FOR UPDATE)
+        result = session.execute(
+            update(RecognitionJob)
+            .where(RecognitionJob.id == job_id, _claimable(now))
+            .values(
+                status=RecognitionJobStatus.processing,
+                attempts=RecognitionJob.attempts + 1,
+                locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+                updated_at=now
+            )
+        )
+        session.commit()
+        if result.rowcount != 1:
+            return None
+        return session.get(RecognitionJob, job_id)
+
+
+def fail_expired_jobs() -> int:
+    """Mark jobs whose lease expired after the last allowed attempt as failed."""
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        result = session.execute(
+            update(RecognitionJob)
+            .where(
+                RecognitionJob.status == RecognitionJobStatus.processing,
+                RecognitionJob.locked_until < now,
+                RecognitionJob.attempts >= JOB_MAX_ATTEMPTS
+            )
+            .values(status=RecognitionJobStatus.failed, error="Worker lease expired", updated_at=now)
+        )
+        session.commit()
+        if result.rowcount:
+            logger.warning(f"Marked {result.rowcount} expired recognition jobs as failed")
+        return result.rowcount
+
+
+def _complete_job(job_id: int, receipt_data) -> int:
+    with Session(engine) as session:
+        job = session.get(RecognitionJob, job_id)
+        if not job:
+            raise ValueError(f"Job not found: {job_id}")
+        receipt, _, _ = save_recognized_receipt(
+            session=session,
+            receipt_data=receipt_data,
+            user_id=job.user_id,
+            image_path=job.image_path,
+            original_filename=job.original_filename
+        )
+        job.status = RecognitionJobStatus.done
+        job.receipt_id = receipt.id
+        job.error = None
+        job.locked_until = None
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        receipt_id = receipt.id or 0
+        # A blokk és a job állapota egy tranzakcióban kerül mentésre
+        session.commit()
+        return receipt_id
+
+
+def _fail_job(job_id: int, error: str):
+    with Session(engine) as session:
+        job = session.get(RecognitionJob, job_id)
+        if not job:
+            return
+        final = job.attempts >= JOB_MAX_ATTEMPTS
+        # Ha van még próbálkozás, visszakerül a sorba
+        job.status = RecognitionJobStatus.failed if final else RecognitionJobStatus.pending
+        job.error = error
+        job.locked_until = None
+        job.updated_at = datetime.utcnow()
+        session.add(job)
+        image_path = job.image_path
+        session.commit()
+    if final:
+        # A végleg sikertelen job már nem hivatkozik a képre; csak akkor törlődik, ha más sem
+        remove_unreferenced_images([image_path])
+
+
+async def process_job(job: RecognitionJob):
+    """Run recognition and the market/receipt/item upsert for a leased job."""
+    logger.info(f"Processing recognition job: job_id={job.id}, attempt={job.attempts}")
+    try:
+        receipt_data = await recognize_receipt_cached(job.image_path, job.content_hash)
+        receipt_id = await asyncio.to_thread(_complete_job, job.id, receipt_data)
+        logger.info(f"Recognition job completed: job_id={job.id}, receipt_id={receipt_id}")
+    except Exception as e:
+        logger.error(f"Recognition job failed: job_id={job.id}, error={str(e)}")
+        await asyncio.to_thread(_fail_job, job.id, str(e))
+
+
+async def _worker_slot(slot: int, stop: asyncio.Event):
+    logger.debug(f"Recognition worker slot started: {slot}")
+    while not stop.is_set():
+        job = await asyncio.to_thread(claim_next_job)
+        if job is None:
+            if slot == 0:
+                await asyncio.to_thread(fail_expired_jobs)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await process_job(job)
+
+
+def _write_heartbeat():
+    # Csak akkor jelez életet, ha az adatbázis (a job sor) elérhető
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+    write_heartbeat()
+
+
+async def _heartbeat(stop: asyncio.Event):
+    while not stop.is_set():
+        try:
+            await asyncio.to_thread(_write_heartbeat)
+        except Exception as e:
+            logger.warning(f"Recognition worker heartbeat failed: {str(e)}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=HEARTBEAT_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker(concurrency: int = WORKER_CONCURRENCY):
+    """Run `concurrency` job slots until SIGINT/SIGTERM; in-flight jobs are finished before exiting."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    logger.info(f"Recognition worker started with concurrency={concurrency}")
+    await asyncio.gather(_heartbeat(stop), *(_worker_slot(i, stop) for i in range(concurrency)))
+    await close_llm_clients()
+    logger.info("Recognition worker stopped")
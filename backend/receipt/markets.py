@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from receipt.models import Market
+from receipt.versioning import bump_markets_version, markets_version
+from app_logging import get_logger
+
+# A cache bejegyzések maximális élettartama; más workerben történt módosítás a markets verzió alapján azonnal érvényes
+MARKET_CACHE_TTL_SECONDS = int(os.getenv("MARKET_CACHE_TTL_SECONDS", "300"))
+
+# A session.info kulcsa: a tranzakcióban feloldott, még nem commitolt piacok
+_PENDING_KEY = "market_resolver_pending"
+
+logger = get_logger(__name__)
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class MarketResolver:
+    """
+    Resolves a recognized market (name, tax_number) to its row, creating it if needed.
+
+    Keeps an in-process tax_number -> market cache; misses are an INSERT ... ON CONFLICT DO NOTHING
+    on Postgres and SQLite (plus a SELECT if the market already existed), so concurrent uploads from
+    the same store never race on the unique tax_number. A newly inserted market bumps the markets
+    version in the same transaction. A resolved market only enters the cache once the session commits.
+
+    Every entry is tied to the markets data version it was resolved at: a market update or delete in
+    any worker process bumps the version, so the other processes stop using their entries right away.
+    """
+
+    def __init__(self, ttl_seconds: int = MARKET_CACHE_TTL_SECONDS):
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._by_tax_number: dict[str, tuple[int, str, int, float]] = {}
+
+    def resolve(self, session: Session, name: str, tax_number: str) -> Market:
+        """
+        Return the market for a tax number. The returned instance is a detached snapshot
+        (id, name, tax_number) and must not be modified or added to the session.
+        """
+        version = markets_version(session)
+        cached = self._by_tax_number.get(tax_number)
+        if cached is not None and cached[2] == version and cached[3] > time.monotonic():
+            return Market(id=cached[0], name=cached[1], tax_number=tax_number)
+
+        market_id, market_name, inserted = self._upsert(session, name, tax_number)
+        # A saját beszúrás a commit után eggyel emeli a verziót
+        if inserted:
+            version += 1
+        # Csak commit után kerül a cache-be: egy visszagörgetett INSERT azonosítója nem maradhat benne
+        session.info.setdefault(_PENDING_KEY, {}).setdefault(self, {})[tax_number] = (market_id, market_name, version)
+        return Market(id=market_id, name=market_name, tax_number=tax_number)
+
+    def _store(self, entries: dict[str, tuple[int, str, int]]):
+        expires_at = time.monotonic() + self._ttl_seconds
+        with self._lock:
+            for tax_number, (market_id, market_name, version) in entries.items():
+                self._by_tax_number[tax_number] = (market_id, market_name, version, expires_at)
+
+    def invalidate(self, market_id: Optional[int] = None, tax_number: Optional[str] = None):
+        """Drop cache entries for a market id and/or tax number (after update_market / delete_market)."""
+        with self._lock:
+            if tax_number is not None:
+                self._by_tax_number.pop(tax_number, None)
+            if market_id is not None:
+                for key in [key for key, value in self._by_tax_number.items() if value[0] == market_id]:
+                    del self._by_tax_number[key]
+
+    def clear(self):
+        with self._lock:
+            self._by_tax_number.clear()
+
+    def _upsert(self, session: Session, name: str, tax_number: str) -> tuple[int, str, bool]:
+        """The market's (id, name) and whether it was inserted now."""
+        insert = _UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+        if insert is not None:
+            # DO NOTHING mellett a RETURNING csak ténylegesen beszúrt sort ad vissza
+            statement = insert(Market).values(name=name, tax_number=tax_number).on_conflict_do_nothing(
+                index_elements=[Market.tax_number]
+            ).returning(Market.id, Market.name)
+            inserted = session.execute(statement).first()
+            if inserted is not None:
+                bump_markets_version(session)
+                logger.debug(f"Market created: id={inserted.id}, tax_number={tax_number}")
+                return inserted.id, inserted.name, True
+            market_id, market_name = session.execute(
+                select(Market.id, Market.name).where(Market.tax_number == tax_number)
+            ).one()
+            return market_id, market_name, False
+
+        # Egyéb adatbázisok: SELECT, majd savepointban INSERT, ütközés esetén újra SELECT
+        market = session.exec(select(Market).where(Market.tax_number == tax_number)).first()
+        if market is not None:
+            return market.id, market.name, False
+        try:
+            with session.begin_nested():
+                market = Market(name=name, tax_number=tax_number)
+                session.add(market)
+            bump_markets_version(session)
+            return market.id, market.name, True
+        except IntegrityError:
+            market = session.exec(select(Market).where(Market.tax_number == tax_number)).one()
+            return market.id, market.name, False
+
+
+@event.listens_for(Session, "after_commit")
+def _store_committed_markets(session: Session):
+    for resolver, entries in session.info.pop(_PENDING_KEY, {}).items():
+        resolver._store(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_markets(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+market_resolver = MarketResolver()
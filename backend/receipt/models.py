@@ -1,23 +1,37 @@
 from datetime import datetime
-from typing import Optional, List
+from enum import Enum
+from typing import Optional, List, TYPE_CHECKING
 
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field, Relationship
 
+if TYPE_CHECKING:
+    from auth.models import User
+
 
 class Receipt(SQLModel, table=True):
-    __table_args__ = {'extend_existing': True}
+    # A lista lekérdezések (user szűrés + rendezés, id holtverseny-feloldással) összetett indexei;
+    # meglévő adatbázisokon a migrations/ hozza létre őket
+    __table_args__ = (
+        Index("ix_receipt_user_id_date_id", "user_id", "date", "id"),
+        Index("ix_receipt_date_id", "date", "id"),
+        Index("ix_receipt_user_id_total_id", "user_id", "total", "id"),
+        {'extend_existing': True},
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     date: datetime = Field()
     receipt_number: str = Field()
-    market_id: int = Field(foreign_key="market.id")
+    market_id: int = Field(foreign_key="market.id", index=True)
     user_id: int = Field(foreign_key="user.id")
-    image_path: str = Field(description="A blokk képének fájlrendszerbeli elérési útja")
+    image_path: str = Field(index=True, description="A blokk képének fájlrendszerbeli elérési útja (a képtárban több blokk is hivatkozhat ugyanarra)")
     original_filename: str = Field(description="A feltöltött fájl eredeti neve")
     postal_code: str = Field()
     city: str = Field()
     street_name: str = Field()
     street_number: str = Field()
+    total: float = Field(default=0.0, index=True, description="A tételek line_total értékeinek összege, íráskor karbantartva")
     market: "Market" = Relationship(back_populates="receipts")
+    user: "User" = Relationship()
     items: List["ReceiptItem"] = Relationship(back_populates="receipt")
 
 class Market(SQLModel, table=True):
@@ -35,5 +49,46 @@ class ReceiptItem(SQLModel, table=True):
     unit_price: float = Field()
     quantity: float = Field()
     unit: str = Field()
-    receipt_id: int = Field(foreign_key="receipt.id")
-    receipt: Receipt = Relationship(back_populates="items")
\ No newline at end of file
+    line_total: float = Field(default=0.0, index=True, description="unit_price * quantity, íráskor karbantartva")
+    receipt_id: int = Field(foreign_key="receipt.id", index=True)
+    receipt: Receipt = Relationship(back_populates="items")
+
+
+class RecognitionJobStatus(str, Enum):
+    pending = "pending"
+    processing = "processing"
+    done = "done"
+    failed = "failed"
+
+
+class RecognitionJob(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    image_path: str = Field(index=True, description="A feltöltött blokk képének elérési útja")
+    original_filename: str = Field(description="A feltöltött fájl eredeti neve")
+    status: RecognitionJobStatus = Field(default=RecognitionJobStatus.pending, index=True)
+    attempts: int = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    content_hash: Optional[str] = Field(default=None, description="A feltöltött kép SHA-256 hash-e")
+    receipt_id: Optional[int] = Field(default=None, description="A sikeres feldolgozás során létrejött blokk")
+    locked_until: Optional[datetime] = Field(default=None, description="A feldolgozó worker bérletének lejárata")
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RecognitionCacheEntry(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+    content_hash: str = Field(primary_key=True, description="A kép SHA-256 hash-e")
+    settings: str = Field(primary_key=True, description="A modell és az előfeldolgozási preset, amellyel az eredmény készült")
+    result: str = Field(description="A strukturált felismerési eredmény JSON-ként")
+    hits: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+# Változásszámláló hatókörönként: pozitív scope = user_id, negatív = globális hatókör (pl. marketek)
+class DataVersion(SQLModel, table=True):
+    __table_args__ = {'extend_existing': True}
+    scope: int = Field(primary_key=True)
+    version: int = Field(default=0)
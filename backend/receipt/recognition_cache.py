@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select, func
+
+from common.db import engine
+from common.timing import stage
+from receipt.ai.agent import arecognize_receipt, recognition_settings
+from receipt.ai.structured_output import Receipt
+from receipt.models import RecognitionCacheEntry
+from app_logging import get_logger
+
+# Cache konfiguráció: maximális bejegyzésszám és élettartam
+CACHE_MAX_ENTRIES = int(os.getenv("RECOGNITION_CACHE_MAX_ENTRIES", "10000"))
+CACHE_TTL_HOURS = int(os.getenv("RECOGNITION_CACHE_TTL_HOURS", "720"))
+# Találatkor a last_used_at (LRU) csak ennél régebbi érték esetén íródik, így a találatok nagy része csak olvasás
+CACHE_TOUCH_INTERVAL_MINUTES = int(os.getenv("RECOGNITION_CACHE_TOUCH_INTERVAL_MINUTES", "60"))
+# A lejárt és a méretkorláton felüli bejegyzések törlése csak minden N-edik írás után fut (a darabszám teljes táblát olvas)
+CACHE_EVICT_EVERY_WRITES = int(os.getenv("RECOGNITION_CACHE_EVICT_EVERY_WRITES", "100"))
+
+logger = get_logger(__name__)
+
+# Folyamatonkénti számlálók (gunicorn alatt workerenként)
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+_writes_since_eviction = 0
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def cache_stats() -> dict:
+    """Snapshot of this process' cache counters."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _eviction_due() -> bool:
+    global _writes_since_eviction
+    with _stats_lock:
+        _writes_since_eviction += 1
+        if _writes_since_eviction < CACHE_EVICT_EVERY_WRITES:
+            return False
+        _writes_since_eviction = 0
+        return True
+
+
+def get_cached_recognition(session: Session, content_hash: str, settings: str) -> Optional[Receipt]:
+    """
+    Return the cached structured result for an image hash recognized with the given settings
+    (recognition_settings), or None on a miss or expired entry.
+    """
+    entry = session.get(RecognitionCacheEntry, (content_hash, settings))
+    now = datetime.utcnow()
+    if entry is None or entry.created_at < now - timedelta(hours=CACHE_TTL_HOURS):
+        _count("misses")
+        return None
+
+    if entry.last_used_at < now - timedelta(minutes=CACHE_TOUCH_INTERVAL_MINUTES):
+        # Durva felbontású LRU: a hits is csak ilyenkor nő (a pontos találatszám a folyamat számlálóiban van)
+        entry.last_used_at = now
+        entry.hits += 1
+        session.add(entry)
+        session.commit()
+    _count("hits")
+    return Receipt.model_validate_json(entry.result)
+
+
+def store_recognition(session: Session, content_hash: str, settings: str, result: Receipt):
+    """Store a recognition result; every CACHE_EVICT_EVERY_WRITES writes also evicts expired and least recently used entries."""
+    now = datetime.utcnow()
+    entry = session.get(RecognitionCacheEntry, (content_hash, settings))
+    if entry is None:
+        entry = RecognitionCacheEntry(
+            content_hash=content_hash, settings=settings, result=result.model_dump_json(), created_at=now, last_used_at=now
+        )
+    else:
+        entry.result = result.model_dump_json()
+        entry.created_at = now
+        entry.last_used_at = now
+    session.add(entry)
+    session.commit()
+    _count("stores")
+    if _eviction_due():
+        evict_expired(session)
+
+
+def evict_expired(session: Session) -> int:
+    """Delete entries older than the TTL and trim the cache to CACHE_MAX_ENTRIES."""
+    evicted = session.execute(
+        delete(RecognitionCacheEntry).where(
+            RecognitionCacheEntry.created_at < datetime.utcnow() - timedelta(hours=CACHE_TTL_HOURS)
+        )
+    ).rowcount
+
+    overflow = session.exec(select(func.count()).select_from(RecognitionCacheEntry)).one() - CACHE_MAX_ENTRIES
+    if overflow > 0:
+        # A legrégebben használtak törlése: a last_used_at határ alatti (és azon a határon lévő) bejegyzések
+        cutoff = session.exec(
+            select(RecognitionCacheEntry.last_used_at)
+            .order_by(RecognitionCacheEntry.last_used_at)
+            .offset(overflow - 1)
+            .limit(1)
+        ).one()
+        evicted += session.execute(
+            delete(RecognitionCacheEntry).where(RecognitionCacheEntry.last_used_at <= cutoff)
+        ).rowcount
+
+    session.commit()
+    if evicted:
+        _count("evictions", evicted)
+        logger.debug(f"Evicted {evicted} recognition cache entries")
+    return evicted
+
+
+def _lookup(content_hash: str, settings: str) -> Optional[Receipt]:
+    with Session(engine) as session:
+        return get_cached_recognition(session, content_hash, settings)
+
+
+def _store(content_hash: str, settings: str, result: Receipt):
+    with Session(engine) as session:
+        store_recognition(session, content_hash, settings, result)
+
+
+async def recognize_receipt_cached(
+    image_path: str,
+    content_hash: Optional[str],
+    image_bytes: Optional[bytes | memoryview] = None
+) -> Receipt:
+    """
+    Recognize a receipt image, answering from the cache when the same image was recognized before
+    with the same model and preprocessing preset.
+    """
+    settings = recognition_settings()
+    if content_hash:
+        cached = None
+        try:
+            with stage("cache_lookup"):
+                cached = await asyncio.to_thread(_lookup, content_hash, settings)
+        except Exception as e:
+            # A cache hibája nem akadályozhatja meg a felismerést: a modellhez fordulunk
+            logger.warning(f"Recognition cache lookup failed, recognizing without cache: {str(e)}")
+        if cached is not None:
+            logger.info(f"Recognition cache hit: {content_hash[:12]}")
+            return cached
+
+    result = await arecognize_receipt(image_path, image_bytes)
+    if content_hash:
+        try:
+            await asyncio.to_thread(_store, content_hash, settings, result)
+        except Exception as e:
+            # A cache hibája nem akadályozhatja meg a felismerést
+            logger.warning(f"Failed to store recognition result in cache: {str(e)}")
+    return result
@@ -1,202 +1,291 @@
-import uuid
+import asyncio
 from pathlib import Path
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
-from fastapi.responses import FileResponse
+import anyio
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request, Response, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse, ORJSONResponse
+from sqlalchemy import update, delete
 from sqlmodel import Session, select, func
-import shutil
 import os
 import mimetypes
 from typing import List, Optional
 from datetime import datetime
-from sqlalchemy import text
 
 from auth.models import User
-from auth.routes import get_current_user, engine, get_session
-from auth.schemas import Role
-from receipt.ai.agent import recognize_receipt
-from receipt.models import Market, Receipt, ReceiptItem
-from receipt.schemas import ReceiptOut, MarketOut, ReceiptItemOut, UserOut, ReceiptListOut, \
-    ReceiptUpdateRequest, MarketUpdateRequest, ReceiptCreateRequest
-from receipt.utils import is_admin_user, get_receipts_count, get_receipts_paginated
+from auth.routes import get_current_user
+from receipt.bulk import select_bulk_targets, delete_receipts, update_receipts
+from receipt.conditional import receipts_not_modified, markets_not_modified
+from receipt.images import get_image_variant, IMMUTABLE_CACHE_CONTROL
+from receipt.image_store import UPLOADS_DIR, remove_unreferenced_images
+from receipt.export import export_query, export_stream, require_pyarrow, EXPORT_MEDIA_TYPES, EXPORT_FILE_EXTENSIONS, \
+    COLUMNAR_FORMATS
+from receipt.jobs import enqueue_recognition_job
+from receipt.markets import market_resolver
+from receipt.recognition_cache import recognize_receipt_cached, cache_stats
+from receipt.models import Market, Receipt, ReceiptItem, RecognitionJob, RecognitionJobStatus, RecognitionCacheEntry
+from receipt.schemas import ReceiptOut, MarketOut, ReceiptListOut, ReceiptListView, ReceiptExportFormat, ReceiptImageSize, \
+    ReceiptUpdateRequest, MarketUpdateRequest, ReceiptCreateRequest, RecognitionJobOut, BatchRecognitionResult, \
+    RecognitionCacheStatsOut, ReceiptBulkSelection, ReceiptBulkUpdateRequest, ReceiptBulkResult
+from receipt.utils import is_admin_user, get_receipts_count, get_receipts_paginated, save_recognized_receipt, \
+    build_receipt_out, receipt_out_dict, receipt_summary_dict, insert_receipt_items, line_total, receipt_total, RECEIPT_SORT_TYPES, receipts_count_cache, \
+    receipts_count_cache_key, receipts_data_version
+from receipt.versioning import bump_receipts_version, bump_markets_version
+from common.conditional import etag_matches
+from common.db import engine, get_session
+from common.responses import orjson_response
+from common.pagination import decode_cursor, encode_cursor, apply_keyset, trim_page, page_flags
+from common.timing import stage
+from common.uploads import save_upload, ensure_upload_stored, StoredUpload
 from app_logging import get_logger
 
 # Központi konfiguráció
-UPLOADS_DIR = "receipt_images"
+RECOGNITION_BATCH_CONCURRENCY = int(os.getenv("RECOGNITION_BATCH_CONCURRENCY", "4"))
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 router = APIRouter(prefix="/receipt", tags=["receipt"])
 
 # Initialize logger
 logger = get_logger(__name__)
 
-@router.post("/recognize", response_model=ReceiptOut)
-async def create_receipt(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
-):
-    logger.info(f"Receipt recognition started for user: {current_user.username}, file: {file.filename}")
+
+async def _save_receipt_upload(file: UploadFile) -> StoredUpload:
+    """Validate an uploaded receipt image and stream it into the content-addressed image store."""
     logger.debug(f"File details: content_type={file.content_type}, size={file.size}")
     
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith('image/'):
-        logger.warning(f"Invalid file type uploaded: {file.content_type}")
-        raise HTTPException(status_code=400, detail="Only image files are allowed")
-    
     # Validate filename
     if not file.filename:
         logger.warning("File uploaded without filename")
         raise HTTPException(status_code=400, detail="Filename is required")
     
-    # Generate UUID filename with original extension
-    file_extension = os.path.splitext(file.filename)[-1]
-    uuid_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOADS_DIR, uuid_filename)
-    
-    logger.debug(f"Saving uploaded file to: {file_path}")
-    
+    # A fájl típusát és kiterjesztését a tartalom alapján határozzuk meg
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        logger.debug(f"File saved successfully: {file_path}")
+        with stage("save"):
+            upload = await save_upload(file, UPLOADS_DIR)
+        logger.debug(f"File saved successfully: {upload.path}, sha256={upload.content_hash}, deduplicated={upload.deduplicated}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to save uploaded file: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to save uploaded file")
 
-    # 2. Recognize receipt
+    return upload
+
+
+@router.post("/recognize", response_model=ReceiptOut)
+async def create_receipt(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    logger.info(f"Receipt recognition started for user: {current_user.username}, file: {file.filename}")
+    upload = await _save_receipt_upload(file)
+    file_path = upload.path
+
+    # 2. Recognize receipt (az azonos kép korábbi eredménye a cache-ből jön)
     logger.debug("Starting AI receipt recognition")
     try:
-        receipt_data = recognize_receipt(file_path)
+        receipt_data = await recognize_receipt_cached(file_path, upload.content_hash, upload.content)
         logger.debug(f"Receipt recognition successful: {receipt_data}")
     except Exception as e:
         logger.error(f"Receipt recognition failed: {str(e)}")
-        # Clean up file if recognition fails
-        try:
-            os.remove(file_path)
-            logger.debug(f"Cleaned up file after recognition failure: {file_path}")
-        except:
-            pass
+        # Clean up file if recognition fails (ha más blokk nem hivatkozik ugyanerre a tartalomra)
+        await run_in_threadpool(remove_unreferenced_images, [file_path])
+        logger.debug(f"Cleaned up file after recognition failure: {file_path}")
         raise HTTPException(status_code=500, detail=f"Receipt recognition failed: {str(e)}")
 
-    # 3. Upsert Market and Address
-    logger.debug("Processing market and address data")
-    # Market
-    market_data = receipt_data.market  # type: ignore
-    logger.debug(f"Market data: name={market_data.name}, tax_number={market_data.tax_number}")
-    
-    market = session.exec(select(Market).where(
-        Market.name == market_data.name, 
-        Market.tax_number == market_data.tax_number
-    )).first()
-    
-    if not market:
-        logger.debug("Market not found, creating new market")
-        market = Market(name=market_data.name, tax_number=market_data.tax_number)
-        session.add(market)
-        session.commit()
-        session.refresh(market)
-        logger.debug(f"New market created with ID: {market.id}")
-    else:
-        logger.debug(f"Existing market found with ID: {market.id}")
-    
-    # 4. Save Receipt with user and file info
-    if not market.id or not current_user.id:
-        logger.error("Failed to create required entities - missing market or user ID")
+    # 3. Upsert Market, save Receipt and ReceiptItems
+    if not current_user.id:
+        logger.error("Failed to create required entities - missing user ID")
         raise HTTPException(status_code=500, detail="Failed to create required entities")
-    
-    # Get address data from AI recognition
-    address_data = receipt_data.address  # type: ignore
-    logger.debug(f"Address data: postal_code={address_data.postal_code}, city={address_data.city}, street={address_data.street_name} {address_data.street_number}")
 
-    logger.debug("Creating receipt record")
-    receipt = Receipt(
-        date=receipt_data.date,  # type: ignore
-        receipt_number=receipt_data.receipt_number,  # type: ignore
-        market_id=market.id,
-        user_id=current_user.id,
-        image_path=file_path,
-        original_filename=file.filename,
-        postal_code=address_data.postal_code,
-        city=address_data.city,
-        street_name=address_data.street_name,
-        street_number=address_data.street_number
-    )
-    session.add(receipt)
-    session.commit()
-    session.refresh(receipt)
-    logger.debug(f"Receipt created with ID: {receipt.id}")
-    
-    # 5. Save ReceiptItems
-    if not receipt.id:
-        logger.error("Failed to create receipt - missing receipt ID")
-        raise HTTPException(status_code=500, detail="Failed to create receipt")
-    
-    logger.debug(f"Processing {len(receipt_data.items)} receipt items")
-    for i, item in enumerate(receipt_data.items):  # type: ignore
-        logger.debug(f"Processing item {i+1}: name={item.name}, unit_price={item.unit_price}, quantity={item.quantity}, unit={item.unit}")
-        receipt_item = ReceiptItem(
-            name=item.name,
-            unit_price=item.unit_price,
-            quantity=item.quantity,
-            unit=item.unit,
-            receipt_id=receipt.id
+    try:
+        # A szinkron DB munka worker szálon fut, mint a batch útvonalon, így nem blokkolja az event loopot
+        receipt, market, items = await run_in_threadpool(
+            save_recognized_receipt,
+            session=session,
+            receipt_data=receipt_data,  # type: ignore
+            user_id=current_user.id,
+            image_path=file_path,
+            original_filename=file.filename or ""
         )
-        session.add(receipt_item)
-    session.commit()
-    logger.debug("All receipt items saved successfully")
-    
-    # 6. Return the created receipt (with items, market, and address)
-    logger.debug("Fetching receipt items for response")
-    items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt.id)).all()
-    
-    # Calculate total
-    total = sum(item.unit_price * item.quantity for item in items)
-    logger.debug(f"Receipt total calculated: {total}")
-    
-    # Create a complete response using the schema
-    response = ReceiptOut(
-        id=receipt.id,
-        date=receipt.date,
-        receipt_number=receipt.receipt_number,
-        image_path=receipt.image_path,
-        original_filename=receipt.original_filename,
-        user=UserOut(
-            id=current_user.id or 0,
-            username=current_user.username,
-            email=current_user.email,
-            fullname=current_user.fullname,
-            profile_picture=current_user.profile_picture,
-            disabled=current_user.disabled,
-            roles=[Role(role.name.value) for role in current_user.roles]
-        ),
-        market=MarketOut(
-            id=market.id or 0,
-            name=market.name,
-            tax_number=market.tax_number
-        ),
-        postal_code=receipt.postal_code,
-        city=receipt.city,
-        street_name=receipt.street_name,
-        street_number=receipt.street_number,
-        items=[
-            ReceiptItemOut(
-                id=item.id or 0,
-                name=item.name,
-                price=item.quantity * item.unit_price,
-                unit_price=item.unit_price,
-                quantity=item.quantity,
-                unit=item.unit
-            )
-            for item in items
-        ],
-        total=total
-    )
+    except ValueError as e:
+        logger.error(f"Failed to save recognized receipt: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # 4. Return the created receipt (with items, market, and address)
+    # A választ a commit előtt, a memóriában lévő objektumokból építjük, így nem kell újra lekérdezni
+    with stage("response_build"):
+        response = build_receipt_out(receipt, market, current_user, items)
+    logger.debug(f"Receipt total calculated: {response.total}")
+
+    with stage("commit"):
+        await run_in_threadpool(session.commit)
+    await run_in_threadpool(ensure_upload_stored, upload)
     
-    logger.info(f"Receipt recognition completed successfully for user: {current_user.username}, receipt_id: {receipt.id}")
+    logger.info(f"Receipt recognition completed successfully for user: {response.user.username}, receipt_id: {response.id}")
     return response
 
-@router.get("/", response_model=ReceiptListOut)
+
+@router.post(
+    "/recognize/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "Soronként egy BatchRecognitionResult, a befejezés sorrendjében"}}
+)
+async def create_receipts_batch(
+    files: List[UploadFile] = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Több blokk felismerése egyszerre, korlátozott párhuzamossággal; az eredmények NDJSON-ként, elkészülési sorrendben érkeznek"""
+    logger.info(f"Batch receipt recognition started for user: {current_user.username}, files: {len(files)}")
+    user_id = int(current_user.id or 0)
+
+    # A fájlokat még a válasz megkezdése előtt mentjük, mert a feltöltések a kérés végén lezárulnak
+    saved: List[tuple[int, str, StoredUpload]] = []
+    rejected: List[BatchRecognitionResult] = []
+    for index, file in enumerate(files):
+        try:
+            saved.append((index, file.filename or "", await _save_receipt_upload(file)))
+        except HTTPException as e:
+            rejected.append(BatchRecognitionResult(index=index, filename=file.filename or "", error=str(e.detail)))
+
+    semaphore = asyncio.Semaphore(RECOGNITION_BATCH_CONCURRENCY)
+
+    async def recognize_one(index: int, filename: str, upload: StoredUpload):
+        file_path = upload.path
+        async with semaphore:
+            try:
+                receipt_data = await recognize_receipt_cached(file_path, upload.content_hash, upload.content)
+                return index, filename, upload, receipt_data, None
+            except Exception as e:
+                logger.error(f"Batch receipt recognition failed for file {filename}: {str(e)}")
+                await run_in_threadpool(remove_unreferenced_images, [file_path])
+                return index, filename, upload, None, f"Receipt recognition failed: {str(e)}"
+
+    async def results():
+        for result in rejected:
+            yield result.model_dump_json() + "\n"
+
+        tasks = [asyncio.create_task(recognize_one(*entry)) for entry in saved]
+        # A még blokkhoz nem mentett feltöltések: hiba vagy megszakadt kapcsolat esetén a végén töröljük őket
+        unreferenced = {upload.path for _, _, upload in saved}
+        try:
+            with Session(engine) as session:
+                user = await run_in_threadpool(session.get, User, user_id)
+                for next_done in asyncio.as_completed(tasks):
+                    index, filename, upload, receipt_data, error = await next_done
+                    file_path = upload.path
+                    result = BatchRecognitionResult(index=index, filename=filename, error=error)
+                    if receipt_data is not None and user is not None:
+                        try:
+                            receipt, market, items = await run_in_threadpool(
+                                save_recognized_receipt, session, receipt_data, user_id, file_path, filename
+                            )
+                            result.receipt = build_receipt_out(receipt, market, user, items)
+                            await run_in_threadpool(session.commit)
+                            unreferenced.discard(file_path)
+                            await run_in_threadpool(ensure_upload_stored, upload)
+                        except Exception as e:
+                            logger.error(f"Failed to save recognized receipt {filename}: {str(e)}")
+                            await run_in_threadpool(session.rollback)
+                            result.error = f"Failed to save receipt: {str(e)}"
+                    yield result.model_dump_json() + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            if unreferenced:
+                # A kliens bontása után (megszakított task) is le kell futnia
+                with anyio.CancelScope(shield=True):
+                    await run_in_threadpool(remove_unreferenced_images, sorted(unreferenced))
+
+        logger.info(f"Batch receipt recognition completed for user: {current_user.username}, files: {len(files)}")
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.get("/recognize/cache/stats", response_model=RecognitionCacheStatsOut)
+async def get_recognition_cache_stats(
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Felismerési cache találati statisztikái (csak adminoknak, a számlálók worker folyamatonként értendők)"""
+    if not is_admin_user(current_user):
+        logger.warning(f"Unauthorized cache stats request: user={current_user.username}")
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    stats = cache_stats()
+    lookups = stats["hits"] + stats["misses"]
+    return RecognitionCacheStatsOut(
+        **stats,
+        hit_ratio=stats["hits"] / lookups if lookups else 0.0,
+        entries=session.exec(select(func.count()).select_from(RecognitionCacheEntry)).one()
+    )
+
+
+def _job_out(job: RecognitionJob) -> RecognitionJobOut:
+    return RecognitionJobOut(
+        id=job.id or 0,
+        status=job.status,
+        attempts=job.attempts,
+        error=job.error,
+        receipt_id=job.receipt_id,
+        original_filename=job.original_filename,
+        created_at=job.created_at,
+        updated_at=job.updated_at
+    )
+
+
+@router.post("/jobs", response_model=RecognitionJobOut, status_code=202)
+async def create_recognition_job(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Blokk felismerés háttérben: a feltöltés után azonnal 202-vel tér vissza, az állapot a job ID-val kérdezhető le"""
+    logger.info(f"Recognition job requested by user: {current_user.username}, file: {file.filename}")
+    upload = await _save_receipt_upload(file)
+
+    job = enqueue_recognition_job(
+        session=session,
+        user_id=int(current_user.id or 0),
+        image_path=upload.path,
+        original_filename=file.filename or "",
+        content_hash=upload.content_hash
+    )
+    await run_in_threadpool(ensure_upload_stored, upload)
+
+    logger.info(f"Recognition job queued: job_id={job.id}")
+    return _job_out(job)
+
+
+@router.get("/jobs/{job_id}", response_model=RecognitionJobOut)
+async def get_recognition_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Felismerési job állapotának lekérdezése (mezei user csak a sajátját, admin mindent)"""
+    logger.debug(f"Recognition job status request: job_id={job_id}, user={current_user.username}")
+
+    job = session.get(RecognitionJob, job_id)
+    if not job or (job.user_id != current_user.id and not is_admin_user(current_user)):
+        logger.warning(f"Recognition job not found: {job_id}")
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    result = _job_out(job)
+    if job.status == RecognitionJobStatus.done and job.receipt_id is not None:
+        receipt = session.get(Receipt, job.receipt_id)
+        if receipt:
+            items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt.id)).all()
+            user = session.get(User, receipt.user_id)
+            if receipt.market and user:
+                result.receipt = build_receipt_out(receipt, receipt.market, user, list(items))
+
+    return result
+
+@router.get("/", response_model=ReceiptListOut, response_class=ORJSONResponse, dependencies=[Depends(receipts_not_modified)])
 async def get_receipts(
+    response: Response,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
     skip: int = Query(0, ge=0, description="Kihagyandó rekordok száma"),
@@ -207,21 +296,24 @@ async def get_receipts(
     item_name: Optional[str] = Query(None, description="Szűrés tétel neve alapján (tartalmazó keresés)"),
     date_from: Optional[datetime] = Query(None, description="Szűrés kezdő dátum alapján"),
     date_to: Optional[datetime] = Query(None, description="Szűrés vég dátum alapján"),
-    order_by: str = Query("date", description="Rendezés oszlop szerint: 'date', 'receipt_number', 'id'"),
-    order_dir: str = Query("desc", description="Rendezés iránya: 'asc' vagy 'desc'")
+    order_by: str = Query("date", description="Rendezés oszlop szerint: 'date', 'receipt_number', 'id', 'total'"),
+    order_dir: str = Query("desc", description="Rendezés iránya: 'asc' vagy 'desc'"),
+    cursor: Optional[str] = Query(None, description="Lapozási cursor (next_cursor / prev_cursor); megadása esetén a skip figyelmen kívül marad"),
+    include_total: bool = Query(True, description="Teljes találatszám visszaadása; false esetén a total null, csak has_next/has_previous van"),
+    view: ReceiptListView = Query(ReceiptListView.full, description="Válasz formája: 'full' (tételekkel, userrel) vagy 'summary' (dátum, bolt, összeg)")
 ):
     """Get receipts with optional filtering and sorting - admin users see all, regular users see only their own"""
     logger.info(f"Receipt list request from user: {current_user.username}")
-    logger.debug(f"Query parameters: skip={skip}, limit={limit}, user_id={user_id}, market_id={market_id}, market_name={market_name}, item_name={item_name}, date_from={date_from}, date_to={date_to}, order_by={order_by}, order_dir={order_dir}")
+    logger.debug(f"Query parameters: skip={skip}, limit={limit}, user_id={user_id}, market_id={market_id}, market_name={market_name}, item_name={item_name}, date_from={date_from}, date_to={date_to}, order_by={order_by}, order_dir={order_dir}, cursor={cursor}, include_total={include_total}, view={view.value}")
     
     is_admin = is_admin_user(current_user)
     logger.debug(f"User admin status: {is_admin}")
     
-    # Get total count for pagination
-    logger.debug("Getting total receipt count")
-    total_count = get_receipts_count(
-        session=session,
-        current_user=current_user,
+    page_cursor = None
+    if cursor:
+        page_cursor = decode_cursor(cursor, order_by, order_dir, RECEIPT_SORT_TYPES.get(order_by, datetime))
+    
+    filters = dict(
         user_id=user_id,
         market_id=market_id,
         market_name=market_name,
@@ -229,98 +321,191 @@ async def get_receipts(
         date_from=date_from,
         date_to=date_to
     )
-    logger.debug(f"Total receipts found: {total_count}")
+    
+    # Total count: először a verzióhoz kötött cache, egyébként az oldal lekérdezés ablakfüggvénye
+    total_count: Optional[int] = None
+    if include_total:
+        count_key = receipts_count_cache_key(current_user, **filters)
+        data_version = receipts_data_version(session, current_user, user_id, market_name)
+        total_count = receipts_count_cache.get(count_key, data_version)
+        logger.debug(f"Receipt count cache {'hit' if total_count is not None else 'miss'}: {total_count}")
+    window_count = include_total and total_count is None and page_cursor is None
     
     # Get paginated receipts
     logger.debug("Fetching paginated receipts")
-    receipts = get_receipts_paginated(
+    # Eggyel több sort kérünk, így a következő oldal létezése külön lekérdezés nélkül kiderül
+    rows = get_receipts_paginated(
         session=session,
         current_user=current_user,
-        user_id=user_id,
-        market_id=market_id,
-        market_name=market_name,
-        item_name=item_name,
-        date_from=date_from,
-        date_to=date_to,
+        **filters,
         skip=skip,
-        limit=limit,
+        limit=limit + 1,
         order_by=order_by,
-        order_dir=order_dir
+        order_dir=order_dir,
+        cursor=page_cursor,
+        with_total=window_count,
+        summary=view == ReceiptListView.summary
     )
+    rows, has_more = trim_page(rows, limit, page_cursor)
+    receipts = [row[0] for row in rows]
     logger.debug(f"Retrieved {len(receipts)} receipts")
     
-    # Build complete response for each receipt
+    if include_total and total_count is None:
+        if window_count and rows:
+            total_count = rows[0][2]
+        else:
+            # Cursoros lapozásnál, illetve a végén túli oldalnál nincs ablakos darabszám
+            total_count = get_receipts_count(session=session, current_user=current_user, **filters)
+        receipts_count_cache.set(count_key, data_version, total_count)
+        logger.debug(f"Total receipts found: {total_count}")
+    
+    has_next, has_previous = page_flags(has_more, page_cursor, skip)
+    
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(order_by, order_dir, rows[-1][1], rows[-1][0].id or 0)
+        if has_previous:
+            prev_cursor = encode_cursor(order_by, order_dir, rows[0][1], rows[0][0].id or 0, backwards=True)
+    
+    # Build complete response for each receipt (market, user, roles és items már be vannak töltve)
     logger.debug("Building response data for receipts")
+    # A ReceiptListOut alakú választ sima dict-ekből építjük és orjson-nal kódoljuk (nincs Pydantic validálás soronként)
     response_receipts = []
-    for i, receipt in enumerate(receipts):
-        logger.debug(f"Processing receipt {i+1}/{len(receipts)}: ID={receipt.id}")
-        
-        # Get market and user
-        market = session.exec(select(Market).where(Market.id == receipt.market_id)).first()
-        user = session.exec(select(User).where(User.id == receipt.user_id)).first()
-        items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt.id)).all()
-        
-        # Skip if market or user not found
-        if not market or not user:
-            logger.warning(f"Skipping receipt {receipt.id} - missing market or user data")
-            continue
-        
-        # Calculate total for this receipt
-        total = sum(item.unit_price * item.quantity for item in items)
-        logger.debug(f"Receipt {receipt.id} total: {total}, items count: {len(items)}")
-        
-        # Create response object
-        response = ReceiptOut(
-            id=receipt.id or 0,
-            date=receipt.date,
-            receipt_number=receipt.receipt_number,
-            image_path=receipt.image_path,
-            original_filename=receipt.original_filename,
-            user=UserOut(
-                id=user.id or 0,
-                username=user.username,
-                email=user.email,
-                fullname=user.fullname,
-                profile_picture=user.profile_picture,
-                disabled=user.disabled,
-                roles=[]  # Note: roles are not loaded here for performance
-            ),
-            market=MarketOut(
-                id=market.id or 0,
-                name=market.name,
-                tax_number=market.tax_number
-            ),
-            postal_code=receipt.postal_code,
-            city=receipt.city,
-            street_name=receipt.street_name,
-            street_number=receipt.street_number,
-            items=[
-                ReceiptItemOut(
-                    id=item.id or 0,
-                    name=item.name,
-                    price=item.unit_price * item.quantity,
-                    unit_price=item.unit_price,
-                    quantity=item.quantity,
-                    unit=item.unit
-                )
-                for item in items
-            ],
-            total=total
-        )
-        response_receipts.append(response)
+    if view == ReceiptListView.summary:
+        # Összefoglaló nézet: a sorok már csak a szükséges oszlopokat tartalmazzák
+        response_receipts = [receipt_summary_dict(receipt) for receipt in receipts]
+    else:
+        for receipt in receipts:
+            # Skip if market or user not found
+            if not receipt.market or not receipt.user:
+                logger.warning(f"Skipping receipt {receipt.id} - missing market or user data")
+                continue
+            response_receipts.append(receipt_out_dict(receipt, receipt.market, receipt.user, receipt.items))
     
     # Create paginated response
-    result = ReceiptListOut(
-        receipts=response_receipts,
-        skip=skip,
-        limit=limit,
-        total=total_count,
-        has_next=skip + limit < total_count,
-        has_previous=skip > 0
-    )
+    result = {
+        "receipts": response_receipts,
+        "skip": skip,
+        "limit": limit,
+        "total": total_count,
+        "has_next": has_next,
+        "has_previous": has_previous,
+        "next_cursor": next_cursor,
+        "prev_cursor": prev_cursor
+    }
     
     logger.info(f"Receipt list request completed - returned {len(response_receipts)} receipts out of {total_count} total")
-    return result
+    return orjson_response(result, response)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {media_type.split(";")[0]: {} for media_type in EXPORT_MEDIA_TYPES.values()},
+            "description": "CSV, Parquet, Arrow: tételenként egy sor; NDJSON: blokkonként egy sor, beágyazott tételekkel"
+        },
+        501: {"description": "Parquet / Arrow export nem elérhető (nincs telepítve a pyarrow)"}
+    }
+)
+async def export_receipts(
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session),
+    export_format: ReceiptExportFormat = Query(ReceiptExportFormat.csv, alias="format", description="Export formátuma: 'csv', 'ndjson', 'parquet' vagy 'arrow' (Arrow IPC stream)"),
+    user_id: Optional[int] = Query(None, description="Szűrés felhasználó ID alapján (csak adminoknak)"),
+    market_id: Optional[int] = Query(None, description="Szűrés market ID alapján"),
+    market_name: Optional[str] = Query(None, description="Szűrés market név alapján (tartalmazó keresés)"),
+    item_name: Optional[str] = Query(None, description="Szűrés tétel neve alapján (tartalmazó keresés)"),
+    date_from: Optional[datetime] = Query(None, description="Szűrés kezdő dátum alapján"),
+    date_to: Optional[datetime] = Query(None, description="Szűrés vég dátum alapján")
+):
+    """Export every receipt and item matching the filters (same permissions as the list), streamed from a server-side cursor"""
+    logger.info(f"Receipt export request from user: {current_user.username}, format: {export_format.value}")
+    logger.debug(f"Export filters: user_id={user_id}, market_id={market_id}, market_name={market_name}, item_name={item_name}, date_from={date_from}, date_to={date_to}")
+    
+    if export_format.value in COLUMNAR_FORMATS:
+        require_pyarrow()
+    
+    # A lekérdezést még a kérés sessionjével építjük fel; a streamelés saját sessiont nyit
+    query = export_query(
+        session=session,
+        current_user=current_user,
+        user_id=user_id,
+        market_id=market_id,
+        market_name=market_name,
+        item_name=item_name,
+        date_from=date_from,
+        date_to=date_to
+    )
+    
+    filename = f"receipts-{datetime.now():%Y%m%d-%H%M%S}.{EXPORT_FILE_EXTENSIONS[export_format.value]}"
+    return StreamingResponse(
+        export_stream(query, export_format.value),
+        media_type=EXPORT_MEDIA_TYPES[export_format.value],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.post("/bulk-delete", response_model=ReceiptBulkResult)
+async def bulk_delete_receipts(
+    selection: ReceiptBulkSelection,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Delete many receipts at once, by id list or by list filter (mezei user csak a sajátjait, admin mindent)"""
+    logger.info(f"Bulk receipt deletion request from user: {current_user.username}")
+    logger.debug(f"Bulk selection: {selection.model_dump(exclude_none=True)}")
+    
+    targets = select_bulk_targets(session, current_user, selection)
+    receipt_ids = [row.id for row in targets]
+    logger.debug(f"Receipts selected for deletion: {len(receipt_ids)}")
+    
+    # Tételek és blokkok halmazalapú DELETE-tel, a verziókkal együtt egy tranzakcióban
+    deleted = delete_receipts(session, receipt_ids)
+    if targets:
+        bump_receipts_version(session, *(row.user_id for row in targets))
+    session.commit()
+    # A képfájlokat a commit után, háttérfeladatként töröljük (csak amelyekre már semmi nem hivatkozik)
+    image_paths = [row.image_path for row in targets]
+    background_tasks.add_task(remove_unreferenced_images, image_paths)
+    
+    logger.info(f"Bulk receipt deletion completed: {deleted} receipts, {len(set(image_paths))} image files queued for removal")
+    return ReceiptBulkResult(count=deleted, receipt_ids=receipt_ids)
+
+
+@router.patch("/bulk", response_model=ReceiptBulkResult)
+async def bulk_update_receipts(
+    update_data: ReceiptBulkUpdateRequest,
+    current_user: User = Depends(get_current_user),
+    session: Session = Depends(get_session)
+):
+    """Set the same fields (date, market, address) on many receipts at once, by id list or by list filter"""
+    logger.info(f"Bulk receipt update request from user: {current_user.username}")
+    logger.debug(f"Bulk update data: {update_data.model_dump(exclude_none=True)}")
+    
+    values = update_data.values.model_dump(exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="'values' must set at least one field")
+    
+    if "market_id" in values and session.get(Market, values["market_id"]) is None:
+        logger.warning(f"Market not found: {values['market_id']}")
+        raise HTTPException(status_code=404, detail="Market not found")
+    
+    targets = select_bulk_targets(session, current_user, update_data)
+    receipt_ids = [row.id for row in targets]
+    logger.debug(f"Receipts selected for update: {len(receipt_ids)}")
+    
+    # Egy UPDATE ... WHERE id IN (...) darabonként, a verziókkal együtt egy tranzakcióban
+    updated = update_receipts(session, receipt_ids, values)
+    if targets:
+        bump_receipts_version(session, *(row.user_id for row in targets))
+    session.commit()
+    
+    logger.info(f"Bulk receipt update completed: {updated} receipts")
+    return ReceiptBulkResult(count=updated, receipt_ids=receipt_ids)
 
 
 @router.put("/{receipt_id}", response_model=ReceiptOut)
@@ -353,6 +538,7 @@ async def update_receipt(
         raise HTTPException(status_code=403, detail="Not authorized to update this receipt")
     
     # Update market if market_id is provided
+    market: Optional[Market] = None
     if update_data.market_id is not None:
         logger.debug(f"Updating market to: {update_data.market_id}")
         market = session.exec(select(Market).where(Market.id == update_data.market_id)).first()
@@ -382,112 +568,82 @@ async def update_receipt(
         receipt.street_number = update_data.street_number
     
     # Handle items update if provided
+    items: List[ReceiptItem] = []
     if update_data.items is not None:
         logger.debug(f"Updating receipt items: {len(update_data.items)} items provided")
         
-        # Get existing items
-        existing_items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt_id)).all()
-        existing_item_ids = {item.id for item in existing_items if item.id}
-        logger.debug(f"Existing items: {len(existing_items)}, IDs: {existing_item_ids}")
+        # A meglévő tételek azonosítói egy lekérdezéssel; a diff memóriában készül
+        existing_item_ids = set(session.exec(select(ReceiptItem.id).where(ReceiptItem.receipt_id == receipt_id)).all())
+        logger.debug(f"Existing items: {len(existing_item_ids)}, IDs: {existing_item_ids}")
         
         # Track items to keep
         items_to_keep = set()
+        item_updates = []
+        new_items_data = []
         
         # Process each item in the update request
         for i, item_data in enumerate(update_data.items):
             logger.debug(f"Processing item {i+1}: id={item_data.id}, name={item_data.name}")
             
             if item_data.id is not None:
-                # Update existing item
-                existing_item = session.exec(select(ReceiptItem).where(ReceiptItem.id == item_data.id)).first()
-                if existing_item and existing_item.receipt_id == receipt_id:
-                    logger.debug(f"Updating existing item: {item_data.id}")
-                    existing_item.name = item_data.name
-                    existing_item.unit_price = item_data.unit_price
-                    existing_item.quantity = item_data.quantity
-                    existing_item.unit = item_data.unit
-                    items_to_keep.add(item_data.id)
-                else:
+                if item_data.id not in existing_item_ids or item_data.id in items_to_keep:
                     logger.error(f"Item not found or doesn't belong to receipt: {item_data.id}")
                     raise HTTPException(status_code=400, detail=f"Item with id {item_data.id} not found or doesn't belong to this receipt")
+                # Update existing item (a végén egyetlen executemany UPDATE-tel)
+                logger.debug(f"Updating existing item: {item_data.id}")
+                values = {
+                    "id": item_data.id,
+                    "name": item_data.name,
+                    "unit_price": item_data.unit_price,
+                    "quantity": item_data.quantity,
+                    "unit": item_data.unit,
+                    "line_total": line_total(item_data.unit_price, item_data.quantity)
+                }
+                item_updates.append(values)
+                items_to_keep.add(item_data.id)
+                # A válaszhoz: a frissített tétel a sessionen kívül, a kiírt értékekkel
+                items.append(ReceiptItem(receipt_id=receipt_id, **values))
             else:
-                # Add new item
+                # Add new item (a végén egyetlen bulk INSERT-tel)
                 logger.debug(f"Adding new item: {item_data.name}")
-                new_item = ReceiptItem(
-                    name=item_data.name,
-                    unit_price=item_data.unit_price,
-                    quantity=item_data.quantity,
-                    unit=item_data.unit,
-                    receipt_id=receipt_id
-                )
-                session.add(new_item)
+                new_items_data.append(item_data)
         
         # Delete items that are not in the update request
         items_to_delete = existing_item_ids - items_to_keep
         logger.debug(f"Items to delete: {items_to_delete}")
         
-        for item_id in items_to_delete:
-            item_to_delete = session.exec(select(ReceiptItem).where(ReceiptItem.id == item_id)).first()
-            if item_to_delete:
-                logger.debug(f"Deleting item: {item_id}")
-                session.delete(item_to_delete)
+        # Tételenként egy-egy lekérdezés helyett: egy UPDATE (executemany), egy DELETE ... IN és egy INSERT
+        if item_updates:
+            session.execute(update(ReceiptItem), item_updates)
+        if items_to_delete:
+            session.execute(
+                delete(ReceiptItem).where(ReceiptItem.id.in_(items_to_delete)),
+                execution_options={"synchronize_session": False}
+            )
+        items.extend(insert_receipt_items(session, receipt_id, new_items_data))
+        receipt.total = sum(item.line_total for item in items)
     
-    logger.debug("Saving receipt updates to database")
-    session.commit()
-    session.refresh(receipt)
+    logger.debug("Flushing receipt updates to database")
+    # Egy flush: a módosítások és a törlések kötegelve mennek ki
+    session.flush()
     
-    # Get updated data for response
-    logger.debug("Fetching updated data for response")
-    market = session.exec(select(Market).where(Market.id == receipt.market_id)).first()
-    user = session.exec(select(User).where(User.id == receipt.user_id)).first()
-    items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt_id)).all()
+    # A válaszhoz szükséges adatok: ami már a sessionben van, azt nem kérdezzük le újra
+    if market is None:
+        market = session.get(Market, receipt.market_id)
+    user = current_user if receipt.user_id == current_user.id else session.get(User, receipt.user_id)
+    if update_data.items is None:
+        items = list(session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt_id)).all())
     
     if not market or not user:
         logger.error("Failed to retrieve related data after update")
         raise HTTPException(status_code=500, detail="Failed to retrieve related data")
     
-    # Calculate total
-    total = sum(item.unit_price * item.quantity for item in items)
-    logger.debug(f"Updated receipt total: {total}")
-    
     # Create response
-    response = ReceiptOut(
-        id=receipt.id or 0,
-        date=receipt.date,
-        receipt_number=receipt.receipt_number,
-        image_path=receipt.image_path,
-        original_filename=receipt.original_filename,
-        user=UserOut(
-            id=user.id or 0,
-            username=user.username,
-            email=user.email,
-            fullname=user.fullname,
-            profile_picture=user.profile_picture,
-            disabled=user.disabled,
-            roles=[Role(role.name.value) for role in user.roles]
-        ),
-        market=MarketOut(
-            id=market.id or 0,
-            name=market.name,
-            tax_number=market.tax_number
-        ),
-        postal_code=receipt.postal_code,
-        city=receipt.city,
-        street_name=receipt.street_name,
-        street_number=receipt.street_number,
-        items=[
-            ReceiptItemOut(
-                id=item.id or 0,
-                name=item.name,
-                price=item.unit_price * item.quantity,
-                unit_price=item.unit_price,
-                quantity=item.quantity,
-                unit=item.unit
-            )
-            for item in items
-        ],
-        total=total
-    )
+    response = build_receipt_out(receipt, market, user, items)
+    logger.debug(f"Updated receipt total: {response.total}")
+    
+    bump_receipts_version(session, receipt.user_id)
+    session.commit()
     
     logger.info(f"Receipt update completed successfully: receipt_id={receipt_id}")
     return response
@@ -515,11 +671,14 @@ async def update_market(
     
     # Update market fields
     logger.debug("Updating market fields")
+    old_tax_number = market.tax_number
     market.name = market_data.name
     market.tax_number = market_data.tax_number
     
+    bump_markets_version(session)
     session.commit()
     session.refresh(market)
+    market_resolver.invalidate(market_id=market_id, tax_number=old_tax_number)
     
     logger.info(f"Market update completed successfully: market_id={market_id}")
     return MarketOut(
@@ -529,7 +688,7 @@ async def update_market(
     )
 
 
-@router.get("/market/{market_id}", response_model=MarketOut)
+@router.get("/market/{market_id}", response_model=MarketOut, dependencies=[Depends(markets_not_modified)])
 async def get_market(
     market_id: int,
     current_user: User = Depends(get_current_user),
@@ -554,37 +713,46 @@ async def get_market(
     )
 
 
-@router.get("/markets", response_model=List[MarketOut])
+@router.get("/markets", response_model=List[MarketOut], dependencies=[Depends(markets_not_modified)])
 async def get_markets(
+    response: Response,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
     skip: int = Query(0, ge=0, description="Kihagyandó rekordok száma"),
     limit: int = Query(100, ge=1, le=1000, description="Visszaadandó rekordok száma (max 1000)"),
     name: Optional[str] = Query(None, description="Szűrés név alapján (tartalmazó keresés)"),
-    tax_number: Optional[str] = Query(None, description="Szűrés adószám alapján (tartalmazó keresés)")
+    tax_number: Optional[str] = Query(None, description="Szűrés adószám alapján (tartalmazó keresés)"),
+    cursor: Optional[str] = Query(None, description="Lapozási cursor (az X-Next-Cursor fejlécből); megadása esetén a skip figyelmen kívül marad")
 ):
-    """Get all markets with optional filtering"""
+    """Get all markets with optional filtering (id szerint rendezve; a következő oldal cursora az X-Next-Cursor fejlécben)"""
     logger.info(f"Markets list request from user: {current_user.username}")
-    logger.debug(f"Query parameters: skip={skip}, limit={limit}, name={name}, tax_number={tax_number}")
+    logger.debug(f"Query parameters: skip={skip}, limit={limit}, name={name}, tax_number={tax_number}, cursor={cursor}")
     
+    page_cursor = decode_cursor(cursor, "id", "asc", int) if cursor else None
     query = select(Market)
     
     # Apply filters
     if name:
         logger.debug(f"Applying name filter: {name}")
-        query = query.where(text(f"markets.name LIKE '%{name}%'"))
+        query = query.where(Market.name.ilike(f"%{name}%"))
     if tax_number:
         logger.debug(f"Applying tax number filter: {tax_number}")
-        query = query.where(text(f"markets.tax_number LIKE '%{tax_number}%'"))
+        query = query.where(Market.tax_number.ilike(f"%{tax_number}%"))
     
     # Apply pagination
     logger.debug(f"Applying pagination: skip={skip}, limit={limit}")
-    query = query.offset(skip).limit(limit)
+    query = apply_keyset(query, Market.id, Market.id, False, page_cursor)
+    if page_cursor is None:
+        query = query.offset(skip)
+    query = query.limit(limit + 1)
     
     logger.debug("Executing markets query")
-    markets = session.exec(query).all()
+    markets, has_more = trim_page(session.exec(query).all(), limit, page_cursor)
     logger.debug(f"Retrieved {len(markets)} markets")
     
+    if has_more and markets:
+        response.headers["X-Next-Cursor"] = encode_cursor("id", "asc", markets[-1].id, markets[-1].id or 0)
+    
     result = [
         MarketOut(
             id=market.id or 0,
@@ -627,6 +795,7 @@ async def create_market(
     )
     
     session.add(new_market)
+    bump_markets_version(session)
     session.commit()
     session.refresh(new_market)
     
@@ -671,7 +840,9 @@ async def delete_market(
     # Delete the market
     logger.debug("Deleting market")
     session.delete(market)
+    bump_markets_version(session)
     session.commit()
+    market_resolver.invalidate(market_id=market_id)
     
     logger.info(f"Market deleted successfully: market_id={market_id}")
     return {"message": "Market deleted successfully"}
@@ -726,82 +897,34 @@ async def create_receipt_manual(
         postal_code=receipt_data.postal_code,
         city=receipt_data.city,
         street_name=receipt_data.street_name,
-        street_number=receipt_data.street_number
+        street_number=receipt_data.street_number,
+        total=receipt_total(receipt_data.items or [])
     )
     session.add(receipt)
-    session.commit()
-    session.refresh(receipt)
+    session.flush()  # az id az INSERT ... RETURNING-ből jön, commit csak a végén
     logger.debug(f"Receipt created with ID: {receipt.id}")
     
-    # Items kezelése
-    items = []
-    total = 0.0
-    
+    # Items kezelése: egyetlen bulk INSERT
+    items: List[ReceiptItem] = []
     if receipt_data.items and receipt.id:
         logger.debug(f"Processing {len(receipt_data.items)} receipt items")
-        for i, item_data in enumerate(receipt_data.items):
-            logger.debug(f"Processing item {i+1}: name={item_data.name}, unit_price={item_data.unit_price}, quantity={item_data.quantity}")
-            receipt_item = ReceiptItem(
-                name=item_data.name,
-                receipt_id=receipt.id,
-                unit_price=item_data.unit_price,
-                quantity=item_data.quantity,
-                unit=item_data.unit
-            )
-            session.add(receipt_item)
-            items.append(receipt_item)
-        session.commit()
+        items = insert_receipt_items(session, receipt.id, receipt_data.items)
         logger.debug("All receipt items saved successfully")
-        
-        # Calculate total
-        total = sum(item.unit_price * item.quantity for item in items)
-        logger.debug(f"Receipt total calculated: {total}")
-    
-    response = ReceiptOut(
-        id=receipt.id or 0,
-        date=receipt.date,
-        receipt_number=receipt.receipt_number,
-        image_path=receipt.image_path,
-        original_filename=receipt.original_filename,
-        user=UserOut(
-            id=user.id or 0,
-            username=user.username,
-            email=user.email,
-            fullname=user.fullname,
-            profile_picture=user.profile_picture,
-            disabled=user.disabled,
-            roles=[Role(role.name.value) for role in user.roles]
-        ),
-        market=MarketOut(
-            id=market.id or 0,
-            name=market.name,
-            tax_number=market.tax_number
-        ),
-        postal_code=receipt.postal_code,
-        city=receipt.city,
-        street_name=receipt.street_name,
-        street_number=receipt.street_number,
-        items=[
-            ReceiptItemOut(
-                id=item.id or 0,
-                name=item.name,
-                unit_price=item.unit_price,
-                quantity=item.quantity,
-                unit=item.unit,
-                price=item.unit_price * item.quantity,
-            )
-            for item in items
-        ],
-        total=total
-    )
     
-    logger.info(f"Manual receipt creation completed successfully: receipt_id={receipt.id}")
+    response = build_receipt_out(receipt, market, user, items)
+    logger.debug(f"Receipt total calculated: {response.total}")
+    
+    bump_receipts_version(session, user_id)
+    session.commit()
+    
+    logger.info(f"Manual receipt creation completed successfully: receipt_id={response.id}")
     return response
 
 
 @router.delete("/receipt/{receipt_id}")
 async def delete_receipt(
     receipt_id: int,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
@@ -824,16 +947,13 @@ async def delete_receipt(
         logger.warning(f"Unauthorized receipt deletion attempt: user={current_user.username}, receipt_id={receipt_id}")
         raise HTTPException(status_code=403, detail="Not authorized to delete this receipt")
     
-    # Törlés előtt töröljük a hozzá tartozó tételeket is
-    logger.debug("Deleting associated receipt items")
-    items = session.exec(select(ReceiptItem).where(ReceiptItem.receipt_id == receipt_id)).all()
-    for item in items:
-        session.delete(item)
-    logger.debug(f"Deleted {len(items)} receipt items")
-    
-    logger.debug("Deleting receipt")
-    session.delete(receipt)
+    # A tételek és a blokk két DELETE utasítással (ugyanaz, mint a tömeges törlésnél)
+    logger.debug("Deleting receipt and its items")
+    owner_id, image_path = receipt.user_id, receipt.image_path
+    delete_receipts(session, [receipt_id])
+    bump_receipts_version(session, owner_id)
     session.commit()
+    background_tasks.add_task(remove_unreferenced_images, [image_path])
     
     logger.info(f"Receipt deleted successfully: receipt_id={receipt_id}")
     return {"message": "Receipt deleted successfully"}
@@ -842,11 +962,13 @@ async def delete_receipt(
 @router.get("/receipt/{receipt_id}/image")
 async def download_receipt_image(
     receipt_id: int,
+    request: Request,
+    size: ReceiptImageSize = Query(ReceiptImageSize.full, description="Kép mérete: 'thumb' (lista), 'medium' (képernyő) vagy 'full' (eredeti)"),
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session)
 ):
     """Receipt képének letöltése (mezei user csak a sajátját, admin mindent)"""
-    logger.info(f"Receipt image download request: receipt_id={receipt_id}, user={current_user.username}")
+    logger.info(f"Receipt image download request: receipt_id={receipt_id}, size={size.value}, user={current_user.username}")
     
     logger.debug(f"Looking for receipt: {receipt_id}")
     receipt = session.exec(select(Receipt).where(Receipt.id == receipt_id)).first()
@@ -865,10 +987,28 @@ async def download_receipt_image(
         logger.warning(f"Unauthorized receipt image download attempt: user={current_user.username}, receipt_id={receipt_id}")
         raise HTTPException(status_code=403, detail="Not authorized to download this receipt image")
     
-    # Ellenőrizzük, hogy a képfájl létezik-e
-    if not receipt.image_path or not os.path.exists(receipt.image_path):
+    # Ellenőrizzük, hogy a képfájl létezik-e; a kicsinyített változat első kéréskor készül el (lemezre és thumbnail esetén memóriába)
+    try:
+        variant = await run_in_threadpool(get_image_variant, receipt.image_path, size.value) if receipt.image_path else None
+    except FileNotFoundError:
+        variant = None
+    if variant is None:
         logger.warning(f"Receipt image file not found: {receipt.image_path}")
         raise HTTPException(status_code=404, detail="Receipt image file not found")
+    
+    headers = {"ETag": variant.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), variant.etag):
+        logger.debug(f"Receipt image not modified: receipt_id={receipt_id}, size={size.value}")
+        raise HTTPException(status_code=304, headers=headers)
+
+    # Memóriában lévő thumbnail: Range kérés nélkül közvetlenül, egyébként fájlból (a FileResponse kezeli a Range-et)
+    if variant.content is not None and "range" not in request.headers:
+        logger.info(f"Receipt image download completed from memory: receipt_id={receipt_id}, size={size.value}")
+        return Response(content=variant.content, media_type=variant.media_type, headers={**headers, "Accept-Ranges": "bytes"})
+
+    if variant.media_type is not None:
+        logger.info(f"Receipt image download completed: receipt_id={receipt_id}, size={size.value}")
+        return FileResponse(path=variant.path, media_type=variant.media_type, headers=headers)
 
     filename = receipt.original_filename
     if not Path(filename).suffix:
@@ -884,7 +1024,8 @@ async def download_receipt_image(
     # Visszaadjuk a fájlt a megfelelő Content-Type-dal
     logger.info(f"Receipt image download completed: receipt_id={receipt_id}")
     return FileResponse(
-        path=receipt.image_path,
+        path=variant.path,
         filename=filename,
-        media_type=media_type
+        media_type=media_type,
+        headers=headers
     )
@@ -1,7 +1,9 @@
 from datetime import datetime, date
-from typing import List, Optional
+from enum import Enum
+from typing import List, Optional, Union
 from pydantic import BaseModel
 from auth.schemas import UserOut
+from receipt.models import RecognitionJobStatus
 
 
 class MarketOut(BaseModel):
@@ -49,6 +51,34 @@ class ReceiptOut(BaseModel):
     total: float
 
 
+class ReceiptListView(str, Enum):
+    full = "full"
+    summary = "summary"
+
+
+class ReceiptExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
+    arrow = "arrow"  # Arrow IPC stream
+
+
+class ReceiptImageSize(str, Enum):
+    thumb = "thumb"
+    medium = "medium"
+    full = "full"  # az eredeti feltöltött kép
+
+
+class ReceiptSummaryOut(BaseModel):
+    """Receipt list row for view=summary: no items, no user, only what a list screen shows."""
+    id: int
+    date: datetime
+    receipt_number: str
+    market_id: int
+    market_name: str
+    total: float
+
+
 class ReceiptItemCreateRequest(BaseModel):
     name: str
     unit_price: float
@@ -81,11 +111,73 @@ class ReceiptUpdateRequest(BaseModel):
     items: Optional[List[ReceiptItemUpdateRequest]] = None
 
 
+class ReceiptBulkFilter(BaseModel):
+    """The receipt list filters; a bulk request with a filter covers every receipt the list would show."""
+    user_id: Optional[int] = None  # csak adminoknak
+    market_id: Optional[int] = None
+    market_name: Optional[str] = None
+    item_name: Optional[str] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+
+
+class ReceiptBulkSelection(BaseModel):
+    ids: Optional[List[int]] = None  # vagy ids, vagy filter
+    filter: Optional[ReceiptBulkFilter] = None
+
+
+class ReceiptBulkUpdateValues(BaseModel):
+    date: Optional[datetime] = None
+    market_id: Optional[int] = None
+    postal_code: Optional[str] = None
+    city: Optional[str] = None
+    street_name: Optional[str] = None
+    street_number: Optional[str] = None
+
+
+class ReceiptBulkUpdateRequest(ReceiptBulkSelection):
+    values: ReceiptBulkUpdateValues
+
+
+class ReceiptBulkResult(BaseModel):
+    count: int
+    receipt_ids: List[int]
+
+
 class ReceiptListOut(BaseModel):
-    receipts: List[ReceiptOut]
+    receipts: List[Union[ReceiptOut, ReceiptSummaryOut]]  # view=summary esetén ReceiptSummaryOut
     skip: int
     limit: int
-    total: int
+    total: Optional[int] = None  # include_total=false esetén nincs számolva
     has_next: bool
     has_previous: bool
+    next_cursor: Optional[str] = None  # a következő oldal keyset cursora
+    prev_cursor: Optional[str] = None  # az előző oldal keyset cursora
+
+
+class RecognitionJobOut(BaseModel):
+    id: int
+    status: RecognitionJobStatus
+    attempts: int
+    error: Optional[str] = None
+    receipt_id: Optional[int] = None
+    original_filename: str
+    created_at: datetime
+    updated_at: datetime
+    receipt: Optional[ReceiptOut] = None  # csak sikeres feldolgozás után
+
+
+class BatchRecognitionResult(BaseModel):
+    index: int  # a fájl sorszáma a kérésben
+    filename: str
+    receipt: Optional[ReceiptOut] = None
+    error: Optional[str] = None
+
 
+class RecognitionCacheStatsOut(BaseModel):
+    hits: int
+    misses: int
+    stores: int
+    evictions: int
+    hit_ratio: float
+    entries: int
@@ -0,0 +1,112 @@
+import threading
+
+from sqlalchemy import text, literal_column, select
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session
+
+from receipt.models import Market, ReceiptItem
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Tartalmazó (%x%) keresés indexe tábla.oszloponként:
+# Postgresen pg_trgm GIN index (az ILIKE magától használja), ezt a 0004-es migráció építi,
+# SQLite-on trigram FTS5 "shadow" tábla, amit triggerek tartanak szinkronban
+_SEARCHED_COLUMNS = [
+    ("receiptitem", "name"),
+    ("market", "name"),
+]
+
+_fts_lock = threading.Lock()
+_fts_ready: dict[str, bool] = {}
+
+
+def _fts_table(table: str, column: str = "name") -> str:
+    return f"{table}_{column}_fts"
+
+
+def _ensure_sqlite(connection: Connection):
+    for table, column in _SEARCHED_COLUMNS:
+        fts = _fts_table(table, column)
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": fts}
+        ).first()
+        connection.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} "
+            f"USING fts5({column}, content='{table}', content_rowid='id', tokenize='trigram')"
+        ))
+        # External content tábla: a triggerek tükrözik a forrástábla változásait
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END"
+        ))
+        connection.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {column} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+            f"INSERT INTO {fts}(rowid, {column}) VALUES (new.id, new.{column}); END"
+        ))
+        if not exists:
+            # Az index létrehozása előtt meglévő sorok betöltése
+            connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            logger.info(f"Search index built: {fts}")
+
+
+def ensure_search_indexes(engine: Engine):
+    """
+    Create (idempotently) the SQLite FTS5 substring search tables. On Postgres the trigram
+    indexes are built by the migrations (CREATE INDEX CONCURRENTLY), so nothing runs here.
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        return
+    if dialect != "sqlite":
+        logger.warning(f"No substring search index support for dialect: {dialect}")
+        return
+    with engine.begin() as connection:
+        _ensure_sqlite(connection)
+    with _fts_lock:
+        _fts_ready.pop(str(engine.url), None)
+    logger.info(f"Search indexes ensured for dialect: {dialect}")
+
+
+def _sqlite_fts_available(session: Session) -> bool:
+    bind = session.get_bind()
+    key = str(bind.url)
+    ready = _fts_ready.get(key)
+    if ready is None:
+        ready = session.execute(
+            text("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN (:items, :markets)"),
+            {"items": _fts_table("receiptitem"), "markets": _fts_table("market")}
+        ).scalar_one() == len(_SEARCHED_COLUMNS)
+        with _fts_lock:
+            _fts_ready[key] = ready
+        if not ready:
+            logger.warning("SQLite search index missing, falling back to ILIKE (run init_db.py)")
+    return ready
+
+
+def _contains(session: Session, table: str, id_column, name_column, term: str):
+    if session.get_bind().dialect.name == "sqlite" and _sqlite_fts_available(session):
+        fts = _fts_table(table)
+        matching_ids = select(literal_column("rowid")).select_from(text(fts)).where(
+            literal_column(f"{fts}.name").like(f"%{term}%")
+        )
+        return id_column.in_(matching_ids)
+    # Postgresen a pg_trgm GIN index (0004-es migráció) ezt a feltételt szolgálja ki
+    return name_column.ilike(f"%{term}%")
+
+
+def receipt_ids_with_item_name(session: Session, term: str):
+    """Subquery of receipt ids having an item whose name contains term (case-insensitive), via the search index."""
+    return select(ReceiptItem.receipt_id).where(
+        _contains(session, "receiptitem", ReceiptItem.id, ReceiptItem.name, term)
+    )
+
+
+def market_ids_with_name(session: Session, term: str):
+    """Subquery of market ids whose name contains term (case-insensitive), via the search index."""
+    return select(Market.id).where(_contains(session, "market", Market.id, Market.name, term))
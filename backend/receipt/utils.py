@@ -1,8 +1,20 @@
 from datetime import datetime
 from typing import Optional, List
+from sqlalchemy import insert, update
+from sqlalchemy.orm import selectinload, Bundle
 from sqlmodel import Session, select, func
 from auth.models import User, RoleEnum
+from receipt.ai import structured_output
+from receipt.markets import market_resolver
+from receipt.search import receipt_ids_with_item_name, market_ids_with_name
+from receipt.versioning import VersionedCache, receipts_version, markets_version, bump_receipts_version
 from receipt.models import Receipt, Market, ReceiptItem
+from receipt.schemas import ReceiptOut
+from common.pagination import Cursor, apply_keyset
+from common.timing import stage
+from app_logging import get_logger
+
+logger = get_logger(__name__)
 
 
 def is_admin_user(user: User) -> bool:
@@ -10,8 +22,175 @@ def is_admin_user(user: User) -> bool:
     return any(role.name == RoleEnum.admin for role in user.roles)
 
 
-def get_receipts_count(
+def line_total(unit_price: float, quantity: float) -> float:
+    """Stored ReceiptItem.line_total value."""
+    return unit_price * quantity
+
+
+def receipt_total(items_data) -> float:
+    """Stored Receipt.total value: the sum of the items' line totals."""
+    return sum(line_total(item.unit_price, item.quantity) for item in items_data)
+
+
+def insert_receipt_items(session: Session, receipt_id: int, items_data) -> List[ReceiptItem]:
+    """
+    Insert all items of a receipt with INSERT ... RETURNING; the rows come back in the order of items_data.
+    On Postgres it is one batched statement, SQLite (no implicit insert sentinel) gets one per row.
+    items_data elements need name, unit_price, quantity and unit attributes.
+    """
+    if not items_data:
+        return []
+    rows = [
+        {
+            "name": item.name,
+            "unit_price": item.unit_price,
+            "quantity": item.quantity,
+            "unit": item.unit,
+            "line_total": line_total(item.unit_price, item.quantity),
+            "receipt_id": receipt_id
+        }
+        for item in items_data
+    ]
+    # Egy többsoros INSERT ... VALUES ... RETURNING; a visszakapott sorok a bemenet sorrendjében jönnek
+    return list(session.scalars(insert(ReceiptItem).returning(ReceiptItem, sort_by_parameter_order=True), rows))
+
+
+def backfill_totals(session: Session, receipt_ids: Optional[List[int]] = None) -> int:
+    """
+    Recompute the stored line_total and total columns in SQL (all receipts, or only the given ones).
+    Returns the number of receipts updated; the caller commits.
+    """
+    item_update = update(ReceiptItem).values(line_total=ReceiptItem.unit_price * ReceiptItem.quantity)
+    items_sum = (
+        select(func.coalesce(func.sum(ReceiptItem.line_total), 0.0))
+        .where(ReceiptItem.receipt_id == Receipt.id)
+        .scalar_subquery()
+    )
+    receipt_update = update(Receipt).values(total=items_sum)
+    if receipt_ids is not None:
+        item_update = item_update.where(ReceiptItem.receipt_id.in_(receipt_ids))
+        receipt_update = receipt_update.where(Receipt.id.in_(receipt_ids))
+
+    session.execute(item_update)
+    return session.execute(receipt_update).rowcount
+
+
+def save_recognized_receipt(
     session: Session,
+    receipt_data: structured_output.Receipt,
+    user_id: int,
+    image_path: str,
+    original_filename: str
+) -> tuple[Receipt, Market, List[ReceiptItem]]:
+    """
+    Persist an AI-recognized receipt: upsert the market, then insert the receipt and its items.
+
+    Only flushes, the caller commits (after building the response, so nothing has to be reloaded).
+    """
+    # Market
+    market_data = receipt_data.market
+    logger.debug(f"Market data: name={market_data.name}, tax_number={market_data.tax_number}")
+
+    with stage("market_upsert"):
+        market = market_resolver.resolve(session, market_data.name, market_data.tax_number)
+    logger.debug(f"Market resolved with ID: {market.id}")
+
+    if not market.id:
+        raise ValueError("Failed to create market")
+
+    # Get address data from AI recognition
+    address_data = receipt_data.address
+    logger.debug(f"Address data: postal_code={address_data.postal_code}, city={address_data.city}, street={address_data.street_name} {address_data.street_number}")
+
+    logger.debug("Creating receipt record")
+    receipt = Receipt(
+        date=receipt_data.date,
+        receipt_number=receipt_data.receipt_number,
+        market_id=market.id,
+        user_id=user_id,
+        image_path=image_path,
+        original_filename=original_filename,
+        postal_code=address_data.postal_code,
+        city=address_data.city,
+        street_name=address_data.street_name,
+        street_number=address_data.street_number,
+        total=receipt_total(receipt_data.items)
+    )
+    with stage("receipt_insert"):
+        session.add(receipt)
+        session.flush()  # az id az INSERT ... RETURNING-ből jön
+    logger.debug(f"Receipt created with ID: {receipt.id}")
+
+    if not receipt.id:
+        raise ValueError("Failed to create receipt")
+
+    logger.debug(f"Processing {len(receipt_data.items)} receipt items")
+    with stage("item_insert"):
+        items = insert_receipt_items(session, receipt.id, receipt_data.items)
+    logger.debug("All receipt items saved successfully")
+    bump_receipts_version(session, user_id)
+    return receipt, market, items
+
+
+def receipt_out_dict(receipt: Receipt, market: Market, user: User, items: List[ReceiptItem]) -> dict:
+    """
+    The ReceiptOut representation of a receipt as plain data, built from already loaded rows.
+    This is the single place defining the receipt JSON; list pages encode it directly (orjson).
+    """
+    return {
+        "id": receipt.id or 0,
+        "date": receipt.date,
+        "receipt_number": receipt.receipt_number,
+        "image_path": receipt.image_path,
+        "original_filename": receipt.original_filename,
+        "user": {
+            "id": user.id or 0,
+            "username": user.username,
+            "email": user.email,
+            "fullname": user.fullname,
+            "profile_picture": user.profile_picture,
+            "disabled": user.disabled,
+            "roles": [role.name.value for role in user.roles]
+        },
+        "market": {
+            "id": market.id or 0,
+            "name": market.name,
+            "tax_number": market.tax_number
+        },
+        "postal_code": receipt.postal_code,
+        "city": receipt.city,
+        "street_name": receipt.street_name,
+        "street_number": receipt.street_number,
+        "items": [
+            {
+                "id": item.id or 0,
+                "name": item.name,
+                "price": float(item.line_total),
+                "unit_price": float(item.unit_price),
+                "quantity": float(item.quantity),
+                "unit": item.unit
+            }
+            for item in items
+        ],
+        "total": float(receipt.total)
+    }
+
+
+def build_receipt_out(receipt: Receipt, market: Market, user: User, items: List[ReceiptItem]) -> ReceiptOut:
+    """Build the API representation of a receipt from already loaded rows."""
+    return ReceiptOut.model_validate(receipt_out_dict(receipt, market, user, items))
+
+
+def visible_receipts_user_id(current_user: User, user_id: Optional[int] = None) -> Optional[int]:
+    """The user whose receipts a list request covers, or None if it covers every user (admin)."""
+    if not is_admin_user(current_user):
+        return current_user.id
+    return user_id
+
+
+def apply_receipt_filters(
+    session: Session,
+    query,
     current_user: User,
     user_id: Optional[int] = None,
     market_id: Optional[int] = None,
@@ -19,64 +198,101 @@ def get_receipts_count(
     item_name: Optional[str] = None,
     date_from: Optional[datetime] = None,
     date_to: Optional[datetime] = None
-) -> int:
-    """Get count of receipts matching the filters."""
-    
-    # For item name filtering, we need a different approach to avoid GROUP BY issues
-    if item_name is not None:
-        # Use subquery to get distinct receipt IDs first
-        subquery = select(Receipt.id).distinct()
-        if not is_admin_user(current_user):
-            subquery = subquery.where(Receipt.user_id == current_user.id)
-        
-        # Apply other filters to subquery
-        if user_id is not None and is_admin_user(current_user):
-            subquery = subquery.where(Receipt.user_id == user_id)
-        if market_id is not None:
-            subquery = subquery.where(Receipt.market_id == market_id)
-        if market_name is not None:
-            subquery = subquery.join(Market).where(Market.__table__.c.name.like(f"%{market_name}%"))
-        if date_from is not None:
-            subquery = subquery.where(Receipt.date >= date_from)
-        if date_to is not None:
-            subquery = subquery.where(Receipt.date <= date_to)
-        
-        # Join with ReceiptItem for item name filtering
-        subquery = subquery.join(ReceiptItem).where(ReceiptItem.name.ilike(f"%{item_name}%"))
-        
-        # Count the distinct receipt IDs
-        count_query = select(func.count()).select_from(subquery.subquery())
-        return session.exec(count_query).one()
-    
-    # Build count query based on user permissions (for non-item filtering)
-    query = select(func.count()).select_from(Receipt)
-    if not is_admin_user(current_user):
-        # Regular users can only see their own receipts
-        query = query.where(Receipt.user_id == current_user.id)
-    
-    # Apply filters
-    # User ID filter (only for admins)
-    if user_id is not None and is_admin_user(current_user):
-        query = query.where(Receipt.user_id == user_id)
-    
+):
+    """Apply the receipt list permission check and filters to a query selecting from Receipt."""
+    # Jogosultság: mezei user csak a sajátjait, admin opcionálisan user_id szerint szűrve
+    scope_user_id = visible_receipts_user_id(current_user, user_id)
+    if scope_user_id is not None:
+        query = query.where(Receipt.user_id == scope_user_id)
+
     if market_id is not None:
         query = query.where(Receipt.market_id == market_id)
-    
+
+    # Név szerinti szűrések a keresőindexen keresztül (receipt.search), join és DISTINCT nélkül
     if market_name is not None:
-        # Join with Market table for name filtering
-        query = query.join(Market).where(Market.name.ilike(f"%{market_name}%"))
-    
+        query = query.where(Receipt.market_id.in_(market_ids_with_name(session, market_name)))
+
     if date_from is not None:
         query = query.where(Receipt.date >= date_from)
-    
+
     if date_to is not None:
         query = query.where(Receipt.date <= date_to)
-    
+
+    if item_name is not None:
+        query = query.where(Receipt.id.in_(receipt_ids_with_item_name(session, item_name)))
+
+    return query
+
+
+def get_receipts_count(
+    session: Session,
+    current_user: User,
+    user_id: Optional[int] = None,
+    market_id: Optional[int] = None,
+    market_name: Optional[str] = None,
+    item_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> int:
+    """Get count of receipts matching the filters."""
+    query = apply_receipt_filters(
+        session,
+        select(func.count()).select_from(Receipt),
+        current_user, user_id, market_id, market_name, item_name, date_from, date_to
+    )
     return session.exec(query).one()
 
 
-from sqlmodel import select, func
-from sqlalchemy import case
+# Találatszám cache: a kulcs a látható hatókör és a szűrők, az érték a hatókör adatverziójához kötött
+receipts_count_cache = VersionedCache()
+
+
+def receipts_count_cache_key(
+    current_user: User,
+    user_id: Optional[int] = None,
+    market_id: Optional[int] = None,
+    market_name: Optional[str] = None,
+    item_name: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None
+) -> tuple:
+    return (
+        visible_receipts_user_id(current_user, user_id),
+        market_id, market_name, item_name, date_from, date_to
+    )
+
+
+def receipts_data_version(session: Session, current_user: User, user_id: Optional[int] = None,
+                          market_name: Optional[str] = None) -> tuple[int, int]:
+    """Version of the data a receipt list depends on (the visible receipts, plus markets when filtering by name)."""
+    version = receipts_version(session, visible_receipts_user_id(current_user, user_id))
+    return version, markets_version(session) if market_name is not None else 0
+
+
+# Rendezési kulcsok és a cursor értékük típusa
+RECEIPT_SORT_COLUMNS = {
+    "date": Receipt.date,
+    "receipt_number": Receipt.receipt_number,
+    "id": Receipt.id,
+    "total": Receipt.total
+}
+RECEIPT_SORT_TYPES = {"date": datetime, "receipt_number": str, "id": int, "total": float}
+
+# view=summary oszlopai: csak a receipt és market sor, tételek és user nélkül (a total a tárolt összeg)
+RECEIPT_SUMMARY_COLUMNS = Bundle(
+    "receipt",
+    Receipt.id,
+    Receipt.date,
+    Receipt.receipt_number,
+    Receipt.market_id,
+    Market.name.label("market_name"),
+    Receipt.total
+)
+
+
+def receipt_summary_dict(row) -> dict:
+    """The ReceiptSummaryOut representation of a RECEIPT_SUMMARY_COLUMNS row as plain data."""
+    return row._asdict()
 
 
 def get_receipts_paginated(
@@ -91,82 +307,46 @@ def get_receipts_paginated(
         skip: int = 0,
         limit: int = 10,
         order_by: str = "date",
-        order_dir: str = "desc"
+        order_dir: str = "desc",
+        cursor: Optional[Cursor] = None,
+        with_total: bool = False,
+        summary: bool = False
 ):
-    """Get paginated receipts matching the filters, with sorting."""
-
-    # Ha összeg szerint rendezünk, akkor subquery-t használunk
-    if order_by == "total":
-        # Subquery az összeg kiszámításához
-        total_subquery = (
-            select(
-                ReceiptItem.receipt_id,
-                func.sum(ReceiptItem.unit_price * ReceiptItem.quantity).label("total_amount")
-            )
-            .group_by(ReceiptItem.receipt_id)
-            .subquery()
-        )
+    """
+    Get paginated receipts matching the filters, with sorting (id as tie-breaker).
 
-        # Fő query a Receipt táblából, left join a total_subquery-vel
-        query = (
-            select(Receipt)
-            .outerjoin(total_subquery, Receipt.id == total_subquery.c.receipt_id)
-        )
-    else:
-        # Alap query Receipt táblából
-        query = select(Receipt)
-
-    # Jogosultság ellenőrzés
-    if not is_admin_user(current_user):
-        # Regular users can only see their own receipts
-        query = query.where(Receipt.user_id == current_user.id)
-
-    # Szűrők alkalmazása
-    # User ID filter (only for admins)
-    if user_id is not None and is_admin_user(current_user):
-        query = query.where(Receipt.user_id == user_id)
-
-    if market_id is not None:
-        query = query.where(Receipt.market_id == market_id)
+    With a cursor the page is selected by keyset (skip is ignored), otherwise by OFFSET.
+    Returns (receipt, sort_value) rows; the sort value is what the next/prev cursor is built from.
+    With with_total each row also carries the total match count (only meaningful without a cursor).
+    With summary the receipt is a RECEIPT_SUMMARY_COLUMNS row instead of a Receipt with its relationships.
+    """
 
-    if market_name is not None:
-        # Join with Market table for name filtering
-        query = query.join(Market).where(Market.name.like(f"%{market_name}%"))
+    # Rendezési kulcs; az összeg a tárolt Receipt.total oszlop, így az is indexből olvasható
+    sort_col = RECEIPT_SORT_COLUMNS.get(order_by, Receipt.date)
+    entity = RECEIPT_SUMMARY_COLUMNS if summary else Receipt
+    if with_total:
+        # Ablakfüggvényes darabszám: a teljes találatszám külön COUNT lekérdezés nélkül, minden sorban
+        query = select(entity, sort_col, func.count().over())
+    else:
+        query = select(entity, sort_col)
+    if summary:
+        query = query.join(Market, Receipt.market_id == Market.id)
 
-    if date_from is not None:
-        query = query.where(Receipt.date >= date_from)
+    query = apply_receipt_filters(
+        session, query, current_user, user_id, market_id, market_name, item_name, date_from, date_to
+    )
 
-    if date_to is not None:
-        query = query.where(Receipt.date <= date_to)
+    # Rendezés (id a holtversenyek feloldására), cursor esetén keyset szűrés
+    query = apply_keyset(query, sort_col, Receipt.id, order_dir != "asc", cursor)
+    if cursor is None:
+        query = query.offset(skip)
 
-    # For item name filtering, we need to join with ReceiptItem and use DISTINCT to avoid duplicates
-    if item_name is not None:
-        if order_by == "total":
-            # Ha már van subquery, akkor másképp kell join-olni
-            query = query.join(ReceiptItem, Receipt.id == ReceiptItem.receipt_id).where(
-                ReceiptItem.name.ilike(f"%{item_name}%")
-            ).distinct()
-        else:
-            query = query.join(ReceiptItem).where(ReceiptItem.name.ilike(f"%{item_name}%")).distinct()
-
-    # Rendezés
-    if order_by == "total":
-        # Összeg szerinti rendezés
-        if order_dir == "asc":
-            query = query.order_by(total_subquery.c.total_amount.asc().nulls_last())
-        else:
-            query = query.order_by(total_subquery.c.total_amount.desc().nulls_last())
-    else:
-        # Egyéb mezők szerinti rendezés
-        allowed_columns = {
-            "date": Receipt.date,
-            "receipt_number": Receipt.receipt_number,
-            "id": Receipt.id
-        }
-        sort_col = allowed_columns.get(order_by, Receipt.date)
-        if order_dir == "asc":
-            query = query.order_by(sort_col.asc())
-        else:
-            query = query.order_by(sort_col.desc())
+    # A kapcsolódó adatokat kötegelten töltjük be (selectin), így a lekérdezések száma nem függ az oldalmérettől
+    if not summary:
+        query = query.options(
+            selectinload(Receipt.market),
+            selectinload(Receipt.user).selectinload(User.roles),
+            selectinload(Receipt.items)
+        )
 
-    return session.exec(query.offset(skip).limit(limit)).all()
\ No newline at end of file
+    return session.exec(query.limit(limit)).all()
\ No newline at end of file
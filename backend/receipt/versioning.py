@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select, func
+
+from receipt.models import DataVersion
+from app_logging import get_logger
+
+# A verzióhoz kötött, folyamaton belüli cache-ek (pl. találatszámok) maximális mérete
+VERSIONED_CACHE_MAX_ENTRIES = int(os.getenv("VERSIONED_CACHE_MAX_ENTRIES", "10000"))
+
+# Globális hatókörök; a pozitív scope értékek user_id-k
+MARKETS_SCOPE = -1
+
+logger = get_logger(__name__)
+
+_UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _bump(session: Session, scope: int):
+    insert = _UPSERT_DIALECTS.get(session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(DataVersion).values(scope=scope, version=1)
+        statement = statement.on_conflict_do_update(
+            index_elements=[DataVersion.scope],
+            set_={"version": DataVersion.version + 1}
+        )
+        session.execute(statement)
+        return
+
+    # Egyéb adatbázisok: UPDATE, ha nincs még sor, savepointban INSERT
+    if session.execute(
+        update(DataVersion).where(DataVersion.scope == scope).values(version=DataVersion.version + 1)
+    ).rowcount:
+        return
+    try:
+        with session.begin_nested():
+            session.add(DataVersion(scope=scope, version=1))
+    except IntegrityError:
+        session.execute(
+            update(DataVersion).where(DataVersion.scope == scope).values(version=DataVersion.version + 1)
+        )
+
+
+def bump_receipts_version(session: Session, *user_ids: int):
+    """
+    Mark the receipts (and items) of the given users as changed. Runs in the caller's transaction,
+    so the new version becomes visible together with the change itself.
+    """
+    for user_id in sorted(set(user_ids)):
+        _bump(session, user_id)
+
+
+def bump_markets_version(session: Session):
+    """Mark the market table as changed (names and tax numbers are used by receipt filters)."""
+    _bump(session, MARKETS_SCOPE)
+
+
+def receipts_version(session: Session, user_id: Optional[int]) -> int:
+    """
+    Current version of one user's receipts, or of all receipts if user_id is None.
+    The all-users version is the sum of the per-user counters, so writers never contend on a shared row.
+    """
+    if user_id is None:
+        query = select(func.coalesce(func.sum(DataVersion.version), 0)).where(DataVersion.scope > 0)
+    else:
+        query = select(DataVersion.version).where(DataVersion.scope == user_id)
+    return session.exec(query).first() or 0
+
+
+def markets_version(session: Session) -> int:
+    return session.exec(select(DataVersion.version).where(DataVersion.scope == MARKETS_SCOPE)).first() or 0
+
+
+class VersionedCache:
+    """
+    Thread-safe in-process LRU cache whose entries are valid only for the data version they were
+    computed at. Since the versions live in the database, every worker process sees a write from
+    any other process on its next lookup.
+    """
+
+    def __init__(self, max_entries: int = VERSIONED_CACHE_MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Hashable, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, version: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Háttér worker a blokk felismerési jobokhoz (POST /receipt/jobs)
+
+Használat:
+    python recognition_worker.py [párhuzamos jobok száma]
+    python recognition_worker.py --healthcheck   (0-s kilépési kód, ha a futó worker életjele friss)
+
+A párhuzamosság a RECOGNITION_WORKER_CONCURRENCY környezeti változóval is megadható.
+Több worker folyamat is futtatható, a jobokat az adatbázison keresztül osztják el egymás között.
+"""
+
+import asyncio
+import sys
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app_logging import configure_from_env
+from common.heartbeat import heartbeat_is_fresh
+
+
+def main():
+    if "--healthcheck" in sys.argv:
+        sys.exit(0 if heartbeat_is_fresh() else 1)
+    # A job modul (LLM kliensek) importja lassú, a healthchecknek nincs rá szüksége
+    from receipt.jobs import run_worker, WORKER_CONCURRENCY
+
+    configure_from_env()
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else WORKER_CONCURRENCY
+    asyncio.run(run_worker(concurrency))
+
+
+if __name__ == "__main__":
+    main()
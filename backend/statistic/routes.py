@@ -2,11 +2,13 @@ from fastapi import APIRouter, Depends, Query
 from sqlmodel import Session, select, func
 from typing import List, Optional
 from datetime import datetime
-from sqlalchemy import text, distinct
+from sqlalchemy import text
 
 from auth.models import User
-from auth.routes import engine, get_current_user, get_session
+from auth.routes import get_current_user
+from common.db import get_session
 from receipt.models import ReceiptItem, Receipt, Market
+from receipt.conditional import receipts_not_modified
 from receipt.utils import is_admin_user
 from statistic.models import TotalSpentKPI, TotalReceiptsKPI, AverageReceiptValueKPI, TimeSeriesData, \
     TopItemsKPI, WordCloudItem, TopItem, AggregationType, \
@@ -19,7 +21,7 @@ router = APIRouter(prefix="/statistic", tags=["statistic"])
 logger = get_logger(__name__)
 
 
-@router.get("/kpi/total-spent", response_model=TotalSpentKPI)
+@router.get("/kpi/total-spent", response_model=TotalSpentKPI, dependencies=[Depends(receipts_not_modified)])
 async def get_total_spent_kpi(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -33,9 +35,7 @@ async def get_total_spent_kpi(
     
     # Build query with JOIN to get total spent directly from database
     logger.debug("Building total spent query")
-    query = select(func.sum(ReceiptItem.unit_price * ReceiptItem.quantity)).select_from(
-        ReceiptItem.__table__.join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
-    )
+    query = select(func.sum(Receipt.total)).select_from(Receipt)
 
     # Apply user filter
     is_admin = is_admin_user(current_user)
@@ -69,7 +69,7 @@ async def get_total_spent_kpi(
     return result
 
 
-@router.get("/kpi/total-receipts", response_model=TotalReceiptsKPI)
+@router.get("/kpi/total-receipts", response_model=TotalReceiptsKPI, dependencies=[Depends(receipts_not_modified)])
 async def get_total_receipts_kpi(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -117,7 +117,7 @@ async def get_total_receipts_kpi(
     return result
 
 
-@router.get("/kpi/average-receipt-value", response_model=AverageReceiptValueKPI)
+@router.get("/kpi/average-receipt-value", response_model=AverageReceiptValueKPI, dependencies=[Depends(receipts_not_modified)])
 async def get_average_receipt_value_kpi(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -132,9 +132,7 @@ async def get_average_receipt_value_kpi(
     # Build query to calculate average receipt value
     # First get total spent
     logger.debug("Building total spent query for average calculation")
-    total_query = select(func.sum(ReceiptItem.unit_price * ReceiptItem.quantity)).select_from(
-        ReceiptItem.__table__.join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
-    )
+    total_query = select(func.sum(Receipt.total)).select_from(Receipt)
 
     # Apply user filter
     is_admin = is_admin_user(current_user)
@@ -192,7 +190,7 @@ async def get_average_receipt_value_kpi(
     return result
 
 
-@router.get("/kpi/top-items", response_model=TopItemsKPI)
+@router.get("/kpi/top-items", response_model=TopItemsKPI, dependencies=[Depends(receipts_not_modified)])
 async def get_top_items_kpi(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -210,7 +208,7 @@ async def get_top_items_kpi(
     query = select(
         ReceiptItem.name,
         func.sum(ReceiptItem.quantity).label("count"),
-        func.sum(ReceiptItem.unit_price * ReceiptItem.quantity).label("total_spent")
+        func.sum(ReceiptItem.line_total).label("total_spent")
     ).select_from(
         ReceiptItem.__table__.join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
     ).group_by(ReceiptItem.name)
@@ -260,7 +258,7 @@ async def get_top_items_kpi(
     logger.info(f"Top items KPI request completed: {len(result.items)} items")
     return result
 
-@router.get("/timeseries/receipts", response_model=List[TimeSeriesData])
+@router.get("/timeseries/receipts", response_model=List[TimeSeriesData], dependencies=[Depends(receipts_not_modified)])
 async def get_receipts_timeseries(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
@@ -327,7 +325,7 @@ async def get_receipts_timeseries(
     logger.info(f"Receipts timeseries request completed: {len(timeseries_data)} data points")
     return timeseries_data
 
-@router.get("/timeseries/amounts", response_model=List[TimeSeriesData])
+@router.get("/timeseries/amounts", response_model=List[TimeSeriesData], dependencies=[Depends(receipts_not_modified)])
 async def get_amounts_timeseries(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -353,8 +351,8 @@ async def get_amounts_timeseries(
     logger.debug("Building amounts timeseries query")
     stmt = select(
         date_expr.label("date"),
-        func.sum(ReceiptItem.unit_price * ReceiptItem.quantity).label("total_amount")
-    ).select_from(Receipt).join(ReceiptItem)
+        func.sum(Receipt.total).label("total_amount")
+    ).select_from(Receipt)
 
     # Filtering
     conditions = []
@@ -395,7 +393,7 @@ async def get_amounts_timeseries(
     logger.info(f"Amounts timeseries request completed: {len(timeseries_data)} data points")
     return timeseries_data
 
-@router.get("/wordcloud", response_model=List[WordCloudItem])
+@router.get("/wordcloud", response_model=List[WordCloudItem], dependencies=[Depends(receipts_not_modified)])
 async def get_wordcloud_data(
         current_user: User = Depends(get_current_user),
         session: Session = Depends(get_session),
@@ -413,7 +411,7 @@ async def get_wordcloud_data(
     query = select(
         ReceiptItem.name,
         func.count().label("count"),
-        func.sum(ReceiptItem.unit_price * ReceiptItem.quantity).label("total_spent")
+        func.sum(ReceiptItem.line_total).label("total_spent")
     ).select_from(
         ReceiptItem.__table__.join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
     ).group_by(ReceiptItem.name)
@@ -462,7 +460,7 @@ async def get_wordcloud_data(
     logger.info(f"Wordcloud data request completed: {len(wordcloud_data)} items")
     return wordcloud_data
     
-@router.get("/market/total-spent", response_model=MarketTotalSpentList)
+@router.get("/market/total-spent", response_model=MarketTotalSpentList, dependencies=[Depends(receipts_not_modified)])
 async def get_market_total_spent(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
@@ -477,11 +475,9 @@ async def get_market_total_spent(
     logger.debug("Building market total spent query")
     query = select(
         Market.name,
-        func.sum(ReceiptItem.unit_price * ReceiptItem.quantity).label("total_spent")
+        func.sum(Receipt.total).label("total_spent")
     ).select_from(
-        ReceiptItem.__table__
-        .join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
-        .join(Market.__table__, Receipt.market_id == Market.id)
+        Receipt.__table__.join(Market.__table__, Receipt.market_id == Market.id)
     )
 
     # User filter
@@ -521,7 +517,7 @@ async def get_market_total_spent(
     logger.info(f"Market total spent request completed: {len(result.markets)} markets")
     return result
 
-@router.get("/market/total-receipts", response_model=MarketTotalReceiptsList)
+@router.get("/market/total-receipts", response_model=MarketTotalReceiptsList, dependencies=[Depends(receipts_not_modified)])
 async def get_market_total_receipts(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
@@ -578,7 +574,7 @@ async def get_market_total_receipts(
     logger.info(f"Market total receipts request completed: {len(result.markets)} markets")
     return result
 
-@router.get("/market/average-spent", response_model=MarketAverageSpentList)
+@router.get("/market/average-spent", response_model=MarketAverageSpentList, dependencies=[Depends(receipts_not_modified)])
 async def get_market_average_spent(
     current_user: User = Depends(get_current_user),
     session: Session = Depends(get_session),
@@ -591,15 +587,13 @@ async def get_market_average_spent(
     logger.debug(f"Query parameters: date_from={date_from}, date_to={date_to}, user_id={user_id}")
     
     logger.debug("Building market average spent query")
-    avg_expr = func.sum(ReceiptItem.unit_price * ReceiptItem.quantity) / func.count(distinct(Receipt.id))
+    avg_expr = func.avg(Receipt.total)
 
     query = select(
         Market.name,
         avg_expr.label("average_spent")
     ).select_from(
-        ReceiptItem.__table__
-        .join(Receipt.__table__, ReceiptItem.receipt_id == Receipt.id)
-        .join(Market.__table__, Receipt.market_id == Market.id)
+        Receipt.__table__.join(Market.__table__, Receipt.market_id == Market.id)
     )
 
     # User filter
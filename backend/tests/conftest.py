@@ -0,0 +1,139 @@
+"""
+Közös pytest fixture-ök: ideiglenes könyvtárban futó SQLite adatbázis, generált JWT kulcsok,
+TestClient és két felhasználó (admin / user) tokennel.
+"""
+
+import os
+import sys
+import tempfile
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+# Az alkalmazás modulok importálás közben olvassák a környezetet, ezért ez minden import előtt fut
+TEST_DIR = tempfile.mkdtemp(prefix="receipt-tests-")
+DATABASE_URL = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ["JWT_KEYS_DIR"] = os.path.join(TEST_DIR, "keys")
+os.environ["RECEIPT_IMAGES_DIR"] = os.path.join(TEST_DIR, "receipt_images")
+os.environ["RECEIPT_IMAGE_VARIANTS_DIR"] = os.path.join(TEST_DIR, "receipt_images", "variants")
+os.environ["LOG_TO_FILE"] = "false"
+os.environ["LOG_LEVEL"] = "WARNING"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _generate_keys(keys_dir: str):
+    os.makedirs(keys_dir, exist_ok=True)
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(os.path.join(keys_dir, "private_key.pem"), "wb") as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    with open(os.path.join(keys_dir, "public_key.pem"), "wb") as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+
+
+_generate_keys(os.environ["JWT_KEYS_DIR"])
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlmodel import Session, select  # noqa: E402
+
+import init_db  # noqa: E402
+from auth.models import Role, RoleEnum, User  # noqa: E402
+from auth.utils import get_password_hash  # noqa: E402
+from common.db import engine  # noqa: E402
+from receipt.markets import market_resolver  # noqa: E402
+
+PASSWORD = "test-password"
+# Érvényes 1x1-es PNG; a feltöltés a tartalom alapján ellenőrzi a típust
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d49484452000000010000000108060000001f15c489"
+    "0000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+
+def create_user(username: str, role_name: RoleEnum) -> int:
+    with Session(engine) as session:
+        role = session.exec(select(Role).where(Role.name == role_name)).one()
+        user = User(username=username, hashed_password=get_password_hash(PASSWORD), roles=[role])
+        session.add(user)
+        session.commit()
+        return user.id
+
+
+def login(client: TestClient, username: str) -> dict[str, str]:
+    response = client.post("/auth/login", data={"username": username, "password": PASSWORD})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture(scope="session")
+def database():
+    # Az init_db a parancssori argumentumot használja DATABASE_URL-ként
+    argv, sys.argv = sys.argv, [sys.argv[0], DATABASE_URL]
+    try:
+        init_db.init_database()
+    finally:
+        sys.argv = argv
+    return engine
+
+
+@pytest.fixture(scope="session")
+def users(database) -> dict[str, int]:
+    return {
+        "admin": create_user("admin", RoleEnum.admin),
+        "user": create_user("user", RoleEnum.user),
+    }
+
+
+@pytest.fixture(scope="session")
+def client(users) -> TestClient:
+    import main
+
+    return TestClient(main.app)
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client) -> dict[str, dict[str, str]]:
+    return {username: login(client, username) for username in ("admin", "user")}
+
+
+@pytest.fixture(autouse=True)
+def clear_market_cache():
+    market_resolver.clear()
+    yield
+    market_resolver.clear()
+
+
+class StatementCounter:
+    """Counts the SQL statements the engine executes inside the with block."""
+
+    def __init__(self, engine):
+        self._engine = engine
+        self.statements: list[str] = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self._engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self._engine, "before_cursor_execute", self._record)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements(database):
+    return lambda: StatementCounter(database)
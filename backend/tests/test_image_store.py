@@ -0,0 +1,72 @@
+import datetime
+import hashlib
+import os
+import threading
+
+from sqlmodel import Session
+
+from common.uploads import StoredUpload, content_addressed_path, ensure_upload_stored, stored_file_lock
+from receipt.image_store import UPLOADS_DIR, remove_unreferenced_images
+from receipt.models import Market, Receipt
+
+
+def _stored_upload(content: bytes) -> StoredUpload:
+    content_hash = hashlib.sha256(content).hexdigest()
+    path = content_addressed_path(UPLOADS_DIR, content_hash, ".png")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return StoredUpload(
+        path=path, size=len(content), content_hash=content_hash, mime_type="image/png", extension=".png",
+        content=memoryview(content), deduplicated=True
+    )
+
+
+def _add_receipt(database, user_id: int, image_path: str):
+    with Session(database) as session:
+        market = Market(name="Kép Bolt", tax_number=f"kep-{image_path[-20:]}")
+        session.add(market)
+        session.flush()
+        session.add(Receipt(
+            date=datetime.datetime(2024, 1, 1), receipt_number="K-1", market_id=market.id, user_id=user_id,
+            image_path=image_path, original_filename="blokk.png", postal_code="1111", city="Budapest",
+            street_name="Fő utca", street_number="1"
+        ))
+        session.commit()
+
+
+def test_removal_waiting_for_the_lock_sees_a_committed_reference(database, users):
+    upload = _stored_upload(b"\x89PNG\r\n\x1a\n committed while removal waits")
+
+    # A törlés előszűrése nulla hivatkozást lát, majd a zárra vár, amíg az új blokk commitol
+    with stored_file_lock(upload.path):
+        remover = threading.Thread(target=remove_unreferenced_images, args=([upload.path],))
+        remover.start()
+        remover.join(timeout=0.5)
+        assert remover.is_alive()
+        _add_receipt(database, users["user"], upload.path)
+    remover.join(timeout=5)
+
+    assert not remover.is_alive()
+    assert os.path.exists(upload.path)
+
+
+def test_upload_removed_before_its_commit_is_stored_again(database, users):
+    upload = _stored_upload(b"\x89PNG\r\n\x1a\n removed before the commit")
+
+    remove_unreferenced_images([upload.path])
+    assert not os.path.exists(upload.path)
+
+    _add_receipt(database, users["user"], upload.path)
+    ensure_upload_stored(upload)
+
+    with open(upload.path, "rb") as f:
+        assert f.read() == bytes(upload.content)
+
+
+def test_unreferenced_image_is_removed(database):
+    upload = _stored_upload(b"\x89PNG\r\n\x1a\n nobody uses this")
+
+    remove_unreferenced_images([upload.path])
+
+    assert not os.path.exists(upload.path)
@@ -0,0 +1,121 @@
+import datetime
+import io
+
+from sqlmodel import Session, select
+
+import receipt.routes
+from receipt.ai import structured_output
+from receipt.markets import MarketResolver
+from receipt.models import Market
+from receipt.versioning import bump_markets_version
+from tests.conftest import PNG
+
+
+def test_resolve_caches_market_after_commit(database):
+    resolver = MarketResolver()
+    with Session(database) as session:
+        market = resolver.resolve(session, "Spar", "11111111-1-11")
+        assert resolver._by_tax_number == {}
+        session.commit()
+
+    assert resolver._by_tax_number["11111111-1-11"][0] == market.id
+
+
+def test_resolve_after_rollback_creates_market_again(database):
+    resolver = MarketResolver()
+    with Session(database) as session:
+        rolled_back = resolver.resolve(session, "Aldi", "22222222-2-22")
+        session.rollback()
+
+    assert "22222222-2-22" not in resolver._by_tax_number
+
+    # A visszagörgetett azonosítót közben egy másik piac kapja meg
+    with Session(database) as session:
+        other = Market(name="Penny", tax_number="44444444-4-44")
+        session.add(other)
+        session.commit()
+        assert other.id == rolled_back.id
+
+    with Session(database) as session:
+        market = resolver.resolve(session, "Aldi", "22222222-2-22")
+        session.commit()
+        stored = session.exec(select(Market).where(Market.tax_number == "22222222-2-22")).one()
+
+    assert market.id == stored.id != other.id
+    assert resolver._by_tax_number["22222222-2-22"][0] == stored.id
+
+
+def test_resolve_in_closed_uncommitted_session_is_not_cached(database):
+    resolver = MarketResolver()
+    with Session(database) as session:
+        resolver.resolve(session, "Lidl", "33333333-3-33")
+
+    assert "33333333-3-33" not in resolver._by_tax_number
+
+
+def test_market_deleted_in_another_process_is_not_served_from_cache(database):
+    resolver = MarketResolver()
+    with Session(database) as session:
+        cached = resolver.resolve(session, "Tesco", "99999999-9-99")
+        session.commit()
+    with Session(database) as session:
+        assert resolver.resolve(session, "Tesco", "99999999-9-99").id == cached.id
+
+    # Egy másik worker törli a piacot: a helyi cache-ről nem tud, csak a verzió emelkedik
+    with Session(database) as session:
+        session.delete(session.get(Market, cached.id))
+        bump_markets_version(session)
+        session.commit()
+    # A felszabadult azonosítót egy másik piac kapja meg
+    with Session(database) as session:
+        other = Market(name="Auchan", tax_number="10101010-1-10")
+        session.add(other)
+        session.commit()
+        assert other.id == cached.id
+
+    with Session(database) as session:
+        market = resolver.resolve(session, "Tesco", "99999999-9-99")
+        session.commit()
+        assert session.get(Market, market.id).tax_number == "99999999-9-99"
+
+
+def test_recognition_creating_a_market_changes_the_markets_etag(client, auth_headers, monkeypatch):
+    async def fake_recognize(image_path, content_hash, content):
+        return structured_output.Receipt(
+            date=datetime.datetime(2024, 1, 2, 10, 0),
+            receipt_number="E-1",
+            market=structured_output.Market(name="Új Bolt", tax_number="88888888-8-88"),
+            address=structured_output.Address(postal_code="1111", city="Budapest", street_name="Fő utca", street_number="1"),
+            items=[structured_output.ReceiptItem(name="Tej", quantity=1, unit_price=300, unit="l")]
+        )
+
+    monkeypatch.setattr(receipt.routes, "recognize_receipt_cached", fake_recognize)
+    headers = auth_headers["user"]
+    listed = client.get("/receipt/markets", headers=headers)
+    assert listed.status_code == 200
+    etag = listed.headers["ETag"]
+    assert client.get("/receipt/markets", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    response = client.post(
+        "/receipt/recognize", headers=headers, files={"file": ("blokk.png", io.BytesIO(PNG), "image/png")}
+    )
+    assert response.status_code == 200, response.text
+
+    relisted = client.get("/receipt/markets", headers={**headers, "If-None-Match": etag})
+    assert relisted.status_code == 200
+    assert "88888888-8-88" in {market["tax_number"] for market in relisted.json()}
+
+
+def test_cross_origin_client_can_read_the_markets_cursor(client, auth_headers, database):
+    with Session(database) as session:
+        session.add_all([Market(name="Cursor Bolt A", tax_number="cursor-a"), Market(name="Cursor Bolt B", tax_number="cursor-b")])
+        session.commit()
+
+    response = client.get(
+        "/receipt/markets", params={"limit": 1}, headers={**auth_headers["user"], "Origin": "http://frontend.example"}
+    )
+
+    assert response.status_code == 200
+    assert "X-Next-Cursor" in response.headers
+    exposed = {header.strip().lower() for header in response.headers["Access-Control-Expose-Headers"].split(",")}
+    assert {"x-next-cursor", "etag"} <= exposed
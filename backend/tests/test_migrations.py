@@ -0,0 +1,29 @@
+import os
+
+import sqlalchemy as sa
+from sqlmodel import SQLModel
+
+from tests.conftest import TEST_DIR
+from init_db import run_migrations
+
+
+def _schema(engine) -> dict:
+    inspector = sa.inspect(engine)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table == "alembic_version":
+            continue
+        columns = sorted((column["name"], str(column["type"]), column["nullable"]) for column in inspector.get_columns(table))
+        indexes = sorted((index["name"], tuple(index["column_names"]), bool(index["unique"])) for index in inspector.get_indexes(table))
+        schema[table] = (columns, indexes)
+    return schema
+
+
+def test_migrations_alone_build_the_model_schema():
+    migrated_url = f"sqlite:///{os.path.join(TEST_DIR, 'migrated.db')}"
+    run_migrations(migrated_url)
+
+    expected = sa.create_engine(f"sqlite:///{os.path.join(TEST_DIR, 'create_all.db')}")
+    SQLModel.metadata.create_all(expected)
+
+    assert _schema(sa.create_engine(migrated_url)) == _schema(expected)
@@ -0,0 +1,64 @@
+import asyncio
+import datetime
+import hashlib
+import io
+import os
+
+from PIL import Image
+from fastapi import UploadFile
+from sqlmodel import Session
+from starlette.datastructures import Headers
+
+import receipt.routes
+from auth.models import User
+from receipt.ai import structured_output
+
+
+def _png(seed: int) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (8, 8), (seed, 0, 0)).save(output, "PNG")
+    return output.getvalue()
+
+
+def _upload(filename: str, content: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": "image/png"}))
+
+
+def _stored_hashes() -> set:
+    return {name[:64] for _, _, names in os.walk(receipt.routes.UPLOADS_DIR) for name in names}
+
+
+def test_disconnected_batch_removes_uploads_without_a_receipt(database, users, monkeypatch):
+    fast, slow = _png(201), _png(202)
+    slow_hash = hashlib.sha256(slow).hexdigest()
+    recognized = structured_output.Receipt(
+        date=datetime.datetime(2024, 1, 2, 10, 0),
+        receipt_number="B-1",
+        market=structured_output.Market(name="Batch Bolt", tax_number="12121212-1-12"),
+        address=structured_output.Address(postal_code="1111", city="Budapest", street_name="Fő utca", street_number="1"),
+        items=[structured_output.ReceiptItem(name="Tej", quantity=1, unit_price=300, unit="l")]
+    )
+
+    async def fake_recognize(image_path, content_hash, content):
+        if content_hash == slow_hash:
+            await asyncio.Event().wait()  # a kliens ennek befejezése előtt bont
+        return recognized
+
+    monkeypatch.setattr(receipt.routes, "recognize_receipt_cached", fake_recognize)
+    with Session(database) as session:
+        user = session.get(User, users["user"])
+
+    async def first_line_then_disconnect() -> str:
+        response = await receipt.routes.create_receipts_batch(
+            files=[_upload("fast.png", fast), _upload("slow.png", slow)], current_user=user
+        )
+        first = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+        return first
+
+    first = asyncio.run(first_line_then_disconnect())
+
+    assert '"error":null' in first
+    stored = _stored_hashes()
+    assert hashlib.sha256(fast).hexdigest() in stored
+    assert slow_hash not in stored
@@ -0,0 +1,61 @@
+import datetime
+
+import pytest
+from sqlmodel import Session
+
+from auth.models import RoleEnum
+from receipt.models import Market, Receipt, ReceiptItem
+from receipt.utils import receipts_count_cache
+from tests.conftest import create_user, login
+
+RECEIPT_COUNT = 60
+ITEMS_PER_RECEIPT = 3
+
+
+@pytest.fixture(scope="module")
+def list_headers(client, database) -> dict[str, str]:
+    # Saját felhasználó, hogy a többi teszt blokkjai ne számítsanak bele
+    user_id = create_user("lister", RoleEnum.user)
+    with Session(database) as session:
+        market = Market(name="Lista Bolt", tax_number="77777777-7-77")
+        session.add(market)
+        session.flush()
+        for index in range(RECEIPT_COUNT):
+            receipt = Receipt(
+                date=datetime.datetime(2024, 1, 1) + datetime.timedelta(days=index),
+                receipt_number=f"L-{index}",
+                market_id=market.id,
+                user_id=user_id,
+                image_path="",
+                original_filename="",
+                postal_code="1111",
+                city="Budapest",
+                street_name="Fő utca",
+                street_number="1",
+                total=ITEMS_PER_RECEIPT * 100.0
+            )
+            session.add(receipt)
+            session.flush()
+            session.add_all(
+                ReceiptItem(name=f"Tétel {i}", unit_price=100, quantity=1, unit="db", line_total=100, receipt_id=receipt.id)
+                for i in range(ITEMS_PER_RECEIPT)
+            )
+        session.commit()
+    return login(client, "lister")
+
+
+@pytest.mark.parametrize("view", ["full", "summary"])
+def test_list_statement_count_does_not_depend_on_limit(client, list_headers, count_statements, view):
+    counts = {}
+    for limit in (1, 50):
+        receipts_count_cache.clear()
+        with count_statements() as counter:
+            response = client.get("/receipt/", headers=list_headers, params={"limit": limit, "view": view})
+        assert response.status_code == 200, response.text
+        receipts = response.json()["receipts"]
+        assert len(receipts) == limit
+        if view == "full":
+            assert all(len(receipt["items"]) == ITEMS_PER_RECEIPT for receipt in receipts)
+        counts[limit] = counter.count
+
+    assert counts[1] == counts[50], counts
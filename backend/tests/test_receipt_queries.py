@@ -0,0 +1,111 @@
+import datetime
+import io
+
+import pytest
+from sqlalchemy.sql.compiler import InsertmanyvaluesSentinelOpts
+from sqlmodel import Session
+
+import receipt.routes
+from receipt.ai import structured_output
+from receipt.models import Market
+from tests.conftest import PNG
+
+ITEM_COUNTS = [1, 25]
+# Kérésenként futó SQL utasítások (hitelesítés, piac, blokk, tételek egy INSERT-ben, DataVersion, commit);
+# a felismerésnél a markets verzió lekérdezése és a piac INSERT-je után vagy a verzió emelése, vagy a meglévő piac SELECT-je jön
+RECOGNIZE_STATEMENTS = 8
+MANUAL_CREATE_STATEMENTS = 6
+UPDATE_STATEMENTS = 10
+
+
+def _check_statements(counter, expected: int, inserted_items: int, database):
+    """
+    The statement count must not depend on the item count. The items go in one INSERT ... RETURNING with
+    the input order guaranteed; without an implicit insert sentinel (SQLite) SQLAlchemy sends it row by row.
+    """
+    item_inserts = sum(statement.startswith("INSERT INTO receiptitem") for statement in counter.statements)
+    batched = database.dialect.insertmanyvalues_implicit_sentinel & InsertmanyvaluesSentinelOpts.ANY_AUTOINCREMENT
+    assert item_inserts == (1 if batched else inserted_items), counter.statements
+    assert counter.count - item_inserts == expected - 1, counter.statements
+
+
+def _recognized(item_count: int) -> structured_output.Receipt:
+    return structured_output.Receipt(
+        date=datetime.datetime(2024, 1, 2, 10, 0),
+        receipt_number=f"R-{item_count}",
+        market=structured_output.Market(name="Tesco", tax_number="55555555-5-55"),
+        address=structured_output.Address(postal_code="1111", city="Budapest", street_name="Fő utca", street_number="1"),
+        items=[
+            structured_output.ReceiptItem(name=f"Tétel {i}", quantity=1, unit_price=100 + i, unit="db")
+            for i in range(item_count)
+        ]
+    )
+
+
+def _items(item_count: int) -> list[dict]:
+    return [{"name": f"Tétel {i}", "unit_price": 100 + i, "quantity": 1, "unit": "db"} for i in range(item_count)]
+
+
+@pytest.fixture(scope="module")
+def market_id(database) -> int:
+    with Session(database) as session:
+        market = Market(name="Spar", tax_number="66666666-6-66")
+        session.add(market)
+        session.commit()
+        return market.id
+
+
+def _create_manual(client, headers, market_id: int, item_count: int) -> dict:
+    response = client.post("/receipt/receipt", headers=headers, json={
+        "date": "2024-01-02T10:00:00",
+        "receipt_number": f"M-{item_count}",
+        "market_id": market_id,
+        "image_path": "",
+        "original_filename": "",
+        "postal_code": "1111",
+        "city": "Budapest",
+        "street_name": "Fő utca",
+        "street_number": "1",
+        "items": _items(item_count)
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("item_count", ITEM_COUNTS)
+def test_recognize_statement_count_does_not_depend_on_items(client, auth_headers, count_statements, database, monkeypatch, item_count):
+    async def fake_recognize(image_path, content_hash, content):
+        return _recognized(item_count)
+
+    monkeypatch.setattr(receipt.routes, "recognize_receipt_cached", fake_recognize)
+    with count_statements() as counter:
+        response = client.post(
+            "/receipt/recognize", headers=auth_headers["user"], files={"file": ("blokk.png", io.BytesIO(PNG), "image/png")}
+        )
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == item_count
+    _check_statements(counter, RECOGNIZE_STATEMENTS, item_count, database)
+
+
+@pytest.mark.parametrize("item_count", ITEM_COUNTS)
+def test_manual_create_statement_count_does_not_depend_on_items(client, auth_headers, count_statements, database, market_id, item_count):
+    with count_statements() as counter:
+        created = _create_manual(client, auth_headers["user"], market_id, item_count)
+    assert len(created["items"]) == item_count
+    _check_statements(counter, MANUAL_CREATE_STATEMENTS, item_count, database)
+
+
+@pytest.mark.parametrize("item_count", ITEM_COUNTS)
+def test_update_statement_count_does_not_depend_on_items(client, auth_headers, count_statements, database, market_id, item_count):
+    created = _create_manual(client, auth_headers["user"], market_id, item_count)
+    # Minden meglévő tétel módosul, és ugyanennyi új kerül mellé
+    items = [dict(item, id=existing["id"], unit_price=existing["unit_price"] + 1)
+             for item, existing in zip(_items(item_count), created["items"])]
+    items += _items(item_count)
+    with count_statements() as counter:
+        response = client.put(
+            f"/receipt/{created['id']}", headers=auth_headers["user"], json={"city": "Szeged", "items": items}
+        )
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == 2 * item_count
+    _check_statements(counter, UPDATE_STATEMENTS, item_count, database)
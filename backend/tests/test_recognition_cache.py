@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlmodel import Session
+
+from receipt import recognition_cache
+from receipt.ai import preprocess
+from receipt.ai.agent import recognition_settings
+from receipt.ai.structured_output import Receipt
+from receipt.recognition_cache import get_cached_recognition, store_recognition
+
+RESULT = Receipt.model_validate({
+    "date": datetime(2026, 10, 1, 12, 0),
+    "receipt_number": "CACHE-1",
+    "market": {"name": "Cache Bolt", "tax_number": "55555555-2-42"},
+    "address": {"postal_code": "1111", "city": "Budapest", "street_name": "Fő utca", "street_number": "1"},
+    "items": [{"name": "Kenyér", "quantity": 1, "unit_price": 500, "unit": "db"}],
+})
+
+
+def test_changed_model_or_preset_is_a_cache_miss(database, monkeypatch):
+    monkeypatch.setenv("AI_MODEL", "model-a")
+    monkeypatch.setattr(preprocess, "PREPROCESS_PRESET", "balanced")
+    original = recognition_settings()
+
+    with Session(database) as session:
+        store_recognition(session, "a" * 64, original, RESULT)
+        assert get_cached_recognition(session, "a" * 64, original) == RESULT
+
+        monkeypatch.setenv("AI_MODEL", "model-b")
+        assert get_cached_recognition(session, "a" * 64, recognition_settings()) is None
+
+        monkeypatch.setenv("AI_MODEL", "model-a")
+        monkeypatch.setattr(preprocess, "PREPROCESS_PRESET", "high")
+        assert get_cached_recognition(session, "a" * 64, recognition_settings()) is None
+
+        monkeypatch.setattr(preprocess, "PREPROCESS_PRESET", "balanced")
+        assert recognition_settings() == original
+
+
+def test_store_counts_the_cache_only_every_n_writes(database, count_statements, monkeypatch):
+    writes = 3
+    monkeypatch.setattr(recognition_cache, "CACHE_EVICT_EVERY_WRITES", writes)
+    monkeypatch.setattr(recognition_cache, "_writes_since_eviction", 0)
+
+    with Session(database) as session:
+        with count_statements() as counter:
+            for i in range(writes * 2):
+                store_recognition(session, f"{i:064x}", "model:preset", RESULT)
+
+    counts = [statement for statement in counter.statements if "count(" in statement.lower()]
+    assert len(counts) == 2